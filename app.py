@@ -328,8 +328,13 @@ class StopwatchApp:
         self.canvas.pack(side="left", fill="both", expand=True, padx=(3, 0))
         self.scrollbar.pack(side="right", fill="y")
     
-    def start_all_stopwatches(self):
-        """Запускает все секундомеры одновременно"""
+    def start_all_stopwatches(self, at=None):
+        """
+        Запускает все секундомеры одновременно
+        
+        Args:
+            at: Момент старта (datetime), по умолчанию - текущее время
+        """
         if not self.stopwatches:
             self.show_message("Нет лыжников", "Добавьте лыжников для запуска")
             return
@@ -343,7 +348,7 @@ class StopwatchApp:
                 return
         
         # Запоминаем текущее время для синхронного старта
-        start_time = datetime.now()
+        start_time = at or datetime.now()
         
         # Запускаем всех лыжников
         started_count = 0
@@ -373,8 +378,13 @@ class StopwatchApp:
         # Показываем сообщение
         self.show_message("Старт всех", f"Одновременно запущено {started_count} лыжников")
     
-    def stop_all_stopwatches(self):
-        """Останавливает все секундомеры"""
+    def stop_all_stopwatches(self, at=None):
+        """
+        Останавливает все секундомеры
+        
+        Args:
+            at: Момент остановки (datetime), по умолчанию - текущее время
+        """
         if not self.stopwatches:
             return
         
@@ -390,7 +400,7 @@ class StopwatchApp:
             if stopwatch.running:
                 stopwatch.running = False
                 if stopwatch.start_time:
-                    stopwatch.elapsed_time += (datetime.now() - stopwatch.start_time).total_seconds()
+                    stopwatch.elapsed_time += stopwatch.seconds_since_start(at)
                 
                 # Обновляем состояние кнопок
                 stopwatch.start_btn.config(state="normal", bg="#4CAF50")
@@ -408,6 +418,22 @@ class StopwatchApp:
         # Показываем сообщение
         self.show_message("Стоп всех", f"Остановлено {stopped_count} лыжников")
     
+    def restore_race_state(self, states):
+        """
+        Загружает восстановленное состояние всех секундомеров одним обновлением
+        
+        Args:
+            states: Состояния в порядке секундомеров (объекты с полями running,
+                start_time, elapsed_time, lap_times)
+        """
+        for stopwatch, state in zip(self.stopwatches, states):
+            stopwatch.load_state(state.running, state.start_time, state.elapsed_time, state.lap_times)
+        
+        # Таблицы и увеличенный вид пересчитываются один раз на все восстановление
+        self.update_all_laps_display()
+        if self.current_large_view:
+            self.show_large_view(self.current_large_view)
+    
     def reset_all_stopwatches(self):
         """Сбрасывает все секундомеры"""
         if not self.stopwatches:
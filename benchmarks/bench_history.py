@@ -0,0 +1,148 @@
+"""
+Микро-бенчмарк истории сообщений и статистики по местоположениям
+
+Сравнивает SFTPChatMonitor.update_stats + save_to_history (кольцевые
+буферы, одно время обработки на сообщение) с исходной реализацией на
+списках, которые срезаются до предела на каждом сообщении. Исходная
+реализация перенесена сюда без изменений.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_history.py [--messages 200000] [--locations 50]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsing import SFTPChatMonitor, LocalFileLogSource, CommandBlockMessage, LOCATIONS
+
+
+class BaselineHistory:
+    """Исходные update_stats и save_to_history (списки со срезами)"""
+    
+    def __init__(self):
+        self.stats = {
+            'locations': {},
+            'total_messages': 0,
+            'start_time': None,
+            'last_message_time': None
+        }
+        self.chat_history = []
+        self.max_history = 1000
+    
+    def update_stats(self, message):
+        location = message['location']
+        
+        self.stats['total_messages'] += 1
+        self.stats['last_message_time'] = datetime.now()
+        
+        if location not in self.stats['locations']:
+            self.stats['locations'][location] = {
+                'message_count': 0,
+                'first_seen': datetime.now(),
+                'last_seen': datetime.now(),
+                'messages': []
+            }
+        
+        self.stats['locations'][location]['message_count'] += 1
+        self.stats['locations'][location]['last_seen'] = datetime.now()
+        
+        self.stats['locations'][location]['messages'].append({
+            'timestamp': message['timestamp'],
+            'message': message['message']
+        })
+        if len(self.stats['locations'][location]['messages']) > 10:
+            self.stats['locations'][location]['messages'] = \
+                self.stats['locations'][location]['messages'][-10:]
+    
+    def save_to_history(self, message):
+        self.chat_history.append({
+            'timestamp': message['timestamp'],
+            'location': message['location'],
+            'message': message['message'],
+            'type': 'command_block',
+            'processed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+        
+        if len(self.chat_history) > self.max_history:
+            self.chat_history = self.chat_history[-self.max_history:]
+
+
+def make_messages(count, locations):
+    """Сообщения в обоих форматах: словари (исходный) и CommandBlockMessage"""
+    dicts = []
+    records = []
+    for i in range(count):
+        x = i % locations
+        timestamp = f"12:00:{i % 60:02d}"
+        text = f"Slend37 прошел {i}"
+        dicts.append({
+            'type': 'command_block',
+            'timestamp': timestamp,
+            'location': f"X{x}Y64Z0",
+            'message': text,
+            'raw': ''
+        })
+        records.append(CommandBlockMessage(timestamp, LOCATIONS.intern(x, 64, 0), text))
+    return dicts, records
+
+
+def run_baseline(messages):
+    """Исходная обработка: время обработки берется внутри каждого вызова"""
+    history = BaselineHistory()
+    for message in messages:
+        history.update_stats(message)
+        history.save_to_history(message)
+    return history
+
+
+def run_current(messages):
+    """Текущая обработка: одно время обработки на сообщение, как в monitor()"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor = SFTPChatMonitor(source=LocalFileLogSource('latest.log'), use_checkpoint=False)
+    for message in messages:
+        now = datetime.now()
+        monitor.update_stats(message, now)
+        monitor.save_to_history(message, now)
+    return monitor
+
+
+def measure(label, function, messages, memory_sample):
+    """Печатает пропускную способность и память, удерживаемую после memory_sample сообщений"""
+    started = time.perf_counter()
+    function(messages)
+    elapsed = time.perf_counter() - started
+    
+    tracemalloc.start()
+    kept = function(messages[:memory_sample])
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    
+    print(f"{label:>8}: {len(messages) / elapsed:>10,.0f} msg/s ({elapsed * 1e6 / len(messages):.2f} us/msg), "
+          f"удержано после {memory_sample} сообщений ~{retained / 1024:.0f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000, help="Сколько сообщений обработать")
+    parser.add_argument('--locations', type=int, default=50, help="Сколько разных местоположений")
+    parser.add_argument('--memory-sample', type=int, default=5000,
+                        help="После скольких сообщений измерять удержанную память")
+    args = parser.parse_args()
+    
+    dicts, records = make_messages(args.messages, args.locations)
+    print(f"{args.messages} сообщений, {args.locations} местоположений")
+    measure("исходная", run_baseline, dicts, args.memory_sample)
+    measure("текущая", run_current, records, args.memory_sample)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Микро-бенчмарк отбора строк командных блоков из байтов лога
+
+Сравнивает текущий путь read_new_data (поиск маркеров [@ и [ @ прямо в
+байтах через scan_command_lines и декодирование только найденных строк)
+с исходным: декодирование всей прочитанной порции, разбиение на строки
+и проверка подстроки в каждой. Оба пути получают одни и те же порции
+из LineFramer и должны найти одни и те же строки.
+
+Без --log используется синтетический лог сервера выживания (чат,
+сообщения плагинов и ~0.7% строк командных блоков), генерируемый
+воспроизводимо.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_prefilter.py [--log logs/latest.log] [--lines 400000] [--chunk-size 65536]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsing import LineFramer, StreamDecoder, scan_command_lines
+
+
+PLAYERS = ['Slend37', 'Steve', 'Alex_2009', 'КотМатроскин', 'xXPvPXx', 'Notch']
+
+NOISE_LINES = [
+    '[{t}] [Server thread/INFO]: <{p}> всем привет, кто на спавне?',
+    '[{t}] [Server thread/INFO]: <{p}> го на арену',
+    '[{t}] [Server thread/INFO]: {p} joined the game',
+    '[{t}] [Server thread/INFO]: {p} left the game',
+    '[{t}] [Server thread/INFO]: {p} has made the advancement [Stone Age]',
+    '[{t}] [Server thread/WARN]: Can\'t keep up! Is the server overloaded? Running 2051ms or 41 ticks behind',
+    '[{t}] [Server thread/INFO]: [Essentials] {p} issued server command: /home base',
+    '[{t}] [Craft Scheduler Thread - 3/INFO]: [CoreProtect] Данные сохранены (412 записей)',
+    '[{t}] [User Authenticator #1/INFO]: UUID of player {p} is 0f3c2a1e-7d4b-4e9a-9c1f-2b6d8e5a4c31',
+]
+
+COMMAND_LINES = [
+    '[{t}] [Server thread/INFO]: [@] {p} прошел {n}',
+    '[{t}] [Server thread/INFO]: [@ {x} 64 {z}] {p} стартовал',
+    '[{t}] [Server thread/INFO]: [@] {p} финишировал',
+]
+
+
+def synthetic_log(lines, seed=0):
+    """Синтетический latest.log: ~0.7% строк командных блоков (воспроизводимо)"""
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        seconds = i // 20
+        fields = {
+            't': f"{seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}",
+            'p': rng.choice(PLAYERS),
+            'n': rng.randint(1, 12),
+            'x': rng.randint(-2000, 2000),
+            'z': rng.randint(-2000, 2000),
+        }
+        template = rng.choice(COMMAND_LINES if rng.random() < 0.007 else NOISE_LINES)
+        out.append(template.format(**fields))
+    return ('\n'.join(out) + '\n').encode('utf-8')
+
+
+def chunks_of(data, chunk_size):
+    """Порции, как их отдает read_chunk"""
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def run_baseline(chunks):
+    """Исходный путь: порция декодируется целиком, строки проверяются как str"""
+    framer = LineFramer()
+    found = []
+    for chunk in chunks:
+        for buf, start, end in framer.feed(chunk):
+            text = str(memoryview(buf)[start:end], 'utf-8', errors='ignore')
+            for line in text.split('\n'):
+                if not line.strip():
+                    continue
+                if '[@' in line or '[ @' in line:
+                    found.append(line)
+    return found
+
+
+def run_current(chunks):
+    """Текущий путь: маркеры ищутся в байтах, декодируются только найденные строки"""
+    framer = LineFramer()
+    decoder = StreamDecoder()
+    found = []
+    for chunk in chunks:
+        spans = framer.feed(chunk)
+        for buf, start, end in spans:
+            decoder.sample(buf, start, end)
+        for buf, start, end in spans:
+            view = memoryview(buf)
+            for line_start, line_end in scan_command_lines(buf, start, end):
+                found.append(decoder.decode(view[line_start:line_end], final=True))
+    return found
+
+
+def measure(label, function, chunks, total_bytes, repeats):
+    """Печатает лучшее время из repeats прогонов и возвращает найденные строки"""
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        found = function(chunks)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:>8}: {best * 1000:>7.1f} ms ({total_bytes / best / 1e6:.0f} MB/s), "
+          f"строк командных блоков: {len(found)}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--log', help="Настоящий latest.log вместо синтетического")
+    parser.add_argument('--lines', type=int, default=400000, help="Строк в синтетическом логе")
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024, help="Размер одной порции чтения")
+    parser.add_argument('--repeats', type=int, default=5, help="Сколько раз повторить замер")
+    args = parser.parse_args()
+    
+    if args.log:
+        with open(args.log, 'rb') as f:
+            data = f.read()
+        print(f"{args.log}: {len(data) / 1e6:.1f} MB")
+    else:
+        data = synthetic_log(args.lines)
+        print(f"Синтетический лог: {args.lines} строк, {len(data) / 1e6:.1f} MB")
+    
+    chunks = chunks_of(data, args.chunk_size)
+    baseline = measure("исходный", run_baseline, chunks, len(data), args.repeats)
+    current = measure("текущий", run_current, chunks, len(data), args.repeats)
+    
+    # Исходный путь отрезал пробелы по краям только при разборе - сравниваем так же
+    if [line.strip() for line in baseline] != [line.strip() for line in current]:
+        print("ВНИМАНИЕ: найденные строки различаются")
+
+
+if __name__ == '__main__':
+    main()
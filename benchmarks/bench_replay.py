@@ -0,0 +1,185 @@
+"""
+Бенчмарк памяти разобранных сообщений при воспроизведении лога
+
+Лог воспроизводится ReplayLogSource на максимальной скорости, и все
+разобранные сообщения удерживаются, как если бы ждали в очереди
+интерфейса. Сравнивается текущая обработка (CommandBlockMessage со
+__slots__, исходная строка не хранится) с исходной: словарь из пяти
+ключей на каждую строку вместе с исходной строкой. Исходный разбор
+перенесен сюда без изменений.
+
+Текущая обработка (process_messages) еще и оценивает время события по
+часам сервера, поэтому ее время нельзя сравнивать с исходным разбором
+напрямую. Для этого есть отдельная строка: текущий разбор тем же
+циклом, что и исходный, без времени события.
+
+Без --log используется синтетическая запись: 100k строк, из них 80k
+строк командных блоков.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_replay.py [--log logs/latest.log] [--lines 100000] [--repeats 3]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsing import SFTPChatMonitor, ReplayLogSource
+
+
+# Паттерны исходного SFTPChatMonitor.patterns
+BASELINE_PATTERNS = [
+    r'\[(\d{2}:\d{2}:\d{2})\]\s+\[[^\]]+\]:\s*\[\s*@\s*\]\s*(.+)',
+    r'\[(\d{2}:\d{2}:\d{2})\]\s+\[[^\]]+\]:\s*\[\s*@\s+[^\]]+\]\s*(.+)',
+    r'\[(\d{2}:\d{2}:\d{2})\][^\]]*INFO[^\]]*]:\s*\[\s*@\s*\]\s*(.+)',
+    r'\[(\d{2}:\d{2}:\d{2})\s+INFO\]:\s*\[\s*@\s*\]\s*(.+)',
+]
+
+
+def baseline_parse(line):
+    """Исходный SFTPChatMonitor.parse_command_block_message (словарь на строку)"""
+    line = line.strip()
+    if not line:
+        return None
+    
+    if not ('[@' in line or '[ @' in line):
+        return None
+    
+    for pattern in BASELINE_PATTERNS:
+        match = re.match(pattern, line)
+        if match:
+            groups = match.groups()
+            
+            if len(groups) >= 2:
+                timestamp = groups[0]
+                message = groups[1].strip()
+                
+                coord_match = re.search(r'\[\s*@\s+([-\d]+)\s+([-\d]+)\s+([-\d]+)\s*\]', line)
+                if coord_match:
+                    x, y, z = coord_match.groups()
+                    location = f"X{x}Y{y}Z{z}"
+                else:
+                    location = "global"
+                
+                return {
+                    'type': 'command_block',
+                    'timestamp': timestamp,
+                    'location': location,
+                    'message': message,
+                    'raw': line
+                }
+    
+    return None
+
+
+def baseline_process(monitor, data):
+    """Исходный SFTPChatMonitor.process_messages"""
+    messages = []
+    for line in data.split('\n'):
+        if not line.strip():
+            continue
+        if '[@' in line or '[ @' in line:
+            message = baseline_parse(line)
+            if message:
+                messages.append(message)
+    return messages
+
+
+def current_parse(monitor, data):
+    """Текущий разбор тем же циклом, что и исходный (без времени события)"""
+    messages = []
+    for line in data.split('\n'):
+        if not line.strip():
+            continue
+        if '[@' in line or '[ @' in line:
+            message = monitor.parse_command_block_message(line)
+            if message:
+                messages.append(message)
+    return messages
+
+
+def current_process(monitor, data):
+    """Текущая обработка: CommandBlockMessage с временем события"""
+    return monitor.process_messages(data)
+
+
+def synthetic_log(path, lines, command_share=0.8, seed=0):
+    """Записывает синтетический latest.log (воспроизводимо)"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        for i in range(lines):
+            seconds = i // 50
+            t = f"{seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+            player = f"Player{rng.randint(1, 40)}"
+            if rng.random() >= command_share:
+                f.write(f"[{t}] [Server thread/INFO]: <{player}> кто на арене?\n")
+            elif rng.random() < 0.5:
+                f.write(f"[{t}] [Server thread/INFO]: [@] {player} прошел {rng.randint(1, 12)}\n")
+            else:
+                x, z = rng.randint(-50, 50), rng.randint(-50, 50)
+                f.write(f"[{t}] [Server thread/INFO]: [@ {x} 64 {z}] {player} стартовал\n")
+
+
+def replay(path, process):
+    """Воспроизводит лог целиком и возвращает все разобранные сообщения"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor = SFTPChatMonitor(source=ReplayLogSource(path, speed=None), use_checkpoint=False)
+        monitor.connect()
+        kept = []
+        while not monitor.source.finished:
+            data = monitor.read_new_data()
+            if data:
+                kept.extend(process(monitor, data))
+        monitor.source.disconnect()
+    return kept
+
+
+def measure(label, path, process, repeats):
+    """Печатает лучшее время из repeats прогонов, удержанную память и число живых блоков"""
+    elapsed = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        count = len(replay(path, process))
+        run_time = time.perf_counter() - started
+        elapsed = run_time if elapsed is None else min(elapsed, run_time)
+    
+    tracemalloc.start()
+    kept = replay(path, process)
+    retained = tracemalloc.get_traced_memory()[0]
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    del kept
+    
+    print(f"{label:>10}: {count} сообщений, {elapsed * 1000:.0f} ms без трассировки, "
+          f"удержано {retained / 1e6:.1f} MB ({retained / count:.0f} B/msg), живых блоков {blocks}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--log', help="Записанный latest.log вместо синтетического")
+    parser.add_argument('--lines', type=int, default=100000, help="Строк в синтетической записи")
+    parser.add_argument('--repeats', type=int, default=3, help="Сколько раз повторить замер времени")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.log
+        if not path:
+            path = os.path.join(directory, 'latest.log')
+            synthetic_log(path, args.lines)
+        print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+        measure("исходная", path, baseline_process, args.repeats)
+        measure("разбор", path, current_parse, args.repeats)
+        measure("обработка", path, current_process, args.repeats)
+
+
+if __name__ == '__main__':
+    main()
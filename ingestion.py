@@ -0,0 +1,686 @@
+import asyncio
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from parsing import (SFTPChatMonitor, SFTPLogSource, LocalFileLogSource, CommandBlockMessage,
+                     LOCATIONS, ReconnectBackoff, SSH_SESSIONS)
+
+
+def create_source(config):
+    """
+    Создает источник лога по настройкам сервера
+    
+    Args:
+        config: Словарь с ключами host, port, username, password,
+            remote_path, source_mode ('sftp', 'tail' или 'local')
+    """
+    if config['source_mode'] == 'local':
+        return LocalFileLogSource(config['remote_path'])
+    return SFTPLogSource(
+        host=config['host'],
+        port=config['port'],
+        username=config['username'],
+        password=config['password'],
+        remote_path=config['remote_path'],
+        source_mode=config['source_mode']
+    )
+
+
+def create_monitor(config):
+    """
+    Создает монитор лога по настройкам сервера
+    
+    Args:
+        config: Настройки источника (см. create_source). Необязательный
+            ключ standby - настройки резервного источника того же лога
+    """
+    standby = config.get('standby')
+    return SFTPChatMonitor(
+        source=create_source(config),
+        standby=create_source(standby) if standby else None
+    )
+
+
+def standby_config(config):
+    """
+    Настройки резервного источника из настроек сервера
+    
+    Резерв задается ключами standby_mode ('sftp', 'tail' или 'local'),
+    standby_path и standby_host (пусто - тот же сервер). Порт и учетные
+    данные берутся у основного источника.
+    
+    Returns:
+        dict или None, если резерв не задан
+    """
+    if not config.get('standby_mode') or not config.get('standby_path'):
+        return None
+    return {
+        'name': f"{config.get('name', '')} (резерв)",
+        'host': config.get('standby_host') or config['host'],
+        'port': config['port'],
+        'username': config['username'],
+        'password': config['password'],
+        'remote_path': config['standby_path'],
+        'source_mode': config['standby_mode']
+    }
+
+
+def failover_notice(entry):
+    """
+    Сообщение для интерфейса о переключении на резервный источник
+    
+    Args:
+        entry: Запись SFTPChatMonitor.failover_log
+    """
+    return {
+        'type': 'connection',
+        'text': f"[!] Чтение переключено на резервный источник {entry['to']}: "
+                f"перерыв {entry['gap']:.2f} сек, позиция {entry['position']}",
+        'level': "warning"
+    }
+
+
+class ConnectionProfiles:
+    """
+    Сохраненные профили подключения к серверам
+    
+    Профиль - те же настройки, что принимает create_monitor, под своим
+    названием. Профили хранятся в JSON-файле рядом с программой; пароль
+    сохраняется только по выбору пользователя, открытым текстом. Профили
+    SSH с паролем подключаются заранее (SSH_SESSIONS), чтобы запуск
+    парсера во время гонки не ждал рукопожатия.
+    """
+    
+    fields = ('name', 'host', 'port', 'username', 'password', 'remote_path', 'source_mode',
+              'standby_mode', 'standby_host', 'standby_path')
+    
+    def __init__(self, path='connection_profiles.json'):
+        """
+        Args:
+            path: Путь к файлу профилей
+        """
+        self.path = path
+        self.profiles = {}  # Название -> настройки (в порядке сохранения)
+        self.last_used = None
+        self.load()
+    
+    def load(self):
+        """Читает профили из файла (нет файла или он поврежден - профилей нет)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(saved, dict):
+            return
+        
+        for profile in saved.get('profiles', []):
+            if isinstance(profile, dict) and profile.get('name'):
+                config = {field: profile.get(field, '') for field in self.fields}
+                try:
+                    config['port'] = int(config['port'] or 22)
+                except (TypeError, ValueError):
+                    continue
+                config['source_mode'] = config['source_mode'] or 'sftp'
+                self.profiles[config['name']] = config
+        if saved.get('last_used') in self.profiles:
+            self.last_used = saved['last_used']
+    
+    def save(self):
+        """Записывает профили на диск (через временный файл)"""
+        data = {'last_used': self.last_used, 'profiles': list(self.profiles.values())}
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"[Profiles] Не удалось сохранить профили: {e}")
+    
+    def names(self):
+        """Названия профилей в порядке сохранения"""
+        return list(self.profiles)
+    
+    def get(self, name):
+        """Копия настроек профиля или None"""
+        profile = self.profiles.get(name)
+        return dict(profile) if profile else None
+    
+    def put(self, config, remember_password=True):
+        """
+        Сохраняет профиль и делает его последним использованным
+        
+        Args:
+            config: Настройки с ключами ConnectionProfiles.fields
+            remember_password: Сохранить пароль (без него профиль не
+                подключается заранее)
+        """
+        profile = {field: config.get(field, '') for field in self.fields}
+        if not remember_password:
+            profile['password'] = ''
+        self.profiles[profile['name']] = profile
+        self.last_used = profile['name']
+        self.save()
+    
+    def remove(self, name):
+        """Удаляет профиль"""
+        if self.profiles.pop(name, None) is not None:
+            if self.last_used == name:
+                self.last_used = None
+            self.save()
+    
+    @staticmethod
+    def can_prewarm(config):
+        """Можно ли подключиться по профилю заранее (SSH и известен пароль)"""
+        return config.get('source_mode') != 'local' and bool(
+            config.get('host') and config.get('username') and config.get('password'))
+    
+    def prewarm(self, config=None):
+        """
+        Начинает фоновое подключение по профилю или по всем профилям
+        
+        Args:
+            config: Настройки одного сервера или None - все сохраненные профили
+        """
+        configs = [config] if config else self.profiles.values()
+        # Резервный источник тоже держим подключенным (горячий резерв)
+        configs = [profile for server in configs for profile in (server, standby_config(server)) if profile]
+        for profile in configs:
+            if self.can_prewarm(profile):
+                SSH_SESSIONS.prewarm(profile['host'], profile['port'], profile['username'],
+                                     profile['password'])
+    
+    def status(self, config):
+        """Состояние заранее установленного соединения профиля (SSHSessionPool.status)"""
+        if not self.can_prewarm(config):
+            return None
+        return SSH_SESSIONS.status(config['host'], config['port'], config['username'])
+
+
+class MultiSourceIngestor:
+    """
+    Одновременное чтение логов нескольких серверов Minecraft
+
+    Все источники обслуживаются одним циклом asyncio. Блокирующие вызовы
+    paramiko (чтение, подключение, ожидание данных) выполняются в небольшом
+    пуле потоков - по одному потоку на источник. Сообщения командных блоков
+    всех серверов сливаются в общую очередь в порядке времени событий.
+    """
+
+    def __init__(self, monitors, message_queue, max_delay=3.0):
+        """
+        Args:
+            monitors: Словарь {название сервера: SFTPChatMonitor}
+            message_queue: Очередь, в которую попадают сообщения (queue.Queue)
+            max_delay: Дольше этого (сек) сообщение не ждет источник, чье
+                чтение зависло - остальные серверы не останавливаются
+        """
+        self.monitors = monitors
+        self.message_queue = message_queue
+        self.max_delay = max_delay
+
+        self.running = False
+        self.thread = None
+        self.loop = None
+        self.executor = None
+
+        # Буфер слияния: (время события, номер прихода, момент прихода, сообщение)
+        self.merge_heap = []
+        self.arrival_counter = itertools.count()
+        # Момент последнего завершенного чтения каждого источника (time.time())
+        self.read_marks = dict.fromkeys(monitors)
+
+        # Статистика по каждому источнику
+        self.source_stats = {
+            name: {
+                'messages': 0,
+                'bytes': 0,
+                'polls': 0,
+                'errors': 0,
+                'reconnects': 0,
+                'last_message_time': None
+            }
+            for name in monitors
+        }
+
+    def start(self):
+        """Запускает цикл asyncio в отдельном фоновом потоке"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        """Останавливает чтение и отключает все источники"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=timeout)
+
+    def run_loop(self):
+        """Точка входа фонового потока"""
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.monitors)),
+            thread_name_prefix="log-source"
+        )
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.executor.shutdown(wait=False)
+            for monitor in self.monitors.values():
+                monitor.disconnect()
+
+    async def main(self):
+        """Запускает чтение всех источников и слияние сообщений"""
+        self.loop = asyncio.get_running_loop()
+        tasks = [asyncio.create_task(self.tail_source(name, monitor))
+                 for name, monitor in self.monitors.items()]
+        tasks.append(asyncio.create_task(self.merge_messages()))
+        await asyncio.gather(*tasks)
+
+    async def call_blocking(self, function, *args):
+        """Выполняет блокирующий вызов paramiko в пуле потоков"""
+        return await self.loop.run_in_executor(self.executor, function, *args)
+
+    async def tail_source(self, name, monitor):
+        """Читает один источник, пока ингестор запущен"""
+        stats = self.source_stats[name]
+
+        while self.running:
+            if not monitor.connected:
+                # Переподключение с нарастающей паузой не мешает чтению остальных серверов
+                if not await self.call_blocking(monitor.try_reconnect):
+                    await asyncio.sleep(min(monitor.reconnect_backoff.remaining(), 0.5))
+                    continue
+                stats['reconnects'] = monitor.reconnects
+
+            new_data = await self.call_blocking(monitor.read_new_data)
+            while monitor.failover_notices:
+                notice = failover_notice(monitor.failover_notices.popleft())
+                notice['text'] += f" ({name})"
+                self.message_queue.put(notice)
+            stats['polls'] += 1
+            stats['bytes'] += monitor.last_read_bytes
+            if not monitor.connected:
+                stats['errors'] += 1
+
+            messages = monitor.process_messages(new_data) if new_data else []
+            checkpoint = monitor.source.checkpoint
+            if checkpoint is not None and checkpoint.hold:
+                # Контрольная точка продвинется, когда получатель подтвердит эти сообщения
+                sequence = checkpoint.track(len(messages))
+                if sequence is not None:
+                    for message in messages:
+                        message.delivery = (checkpoint, sequence)
+            arrival = time.monotonic()
+            for message in messages:
+                message.source = name
+                monitor.print_message(message)  # Консоль и файл истории, как при чтении одного сервера
+                # Время события с поправкой на часы сервера (без метки - момент прихода)
+                event_key = message.event_time.timestamp() if message.event_time else time.time()
+                heapq.heappush(self.merge_heap, (event_key, next(self.arrival_counter), arrival, message))
+            self.read_marks[name] = monitor.last_read_time
+            if messages:
+                stats['messages'] += len(messages)
+                stats['last_message_time'] = datetime.now()
+
+            next_interval = monitor.poll_scheduler.observe(monitor.last_read_bytes, len(messages))
+            if not monitor.catching_up:
+                await self.call_blocking(monitor.wait_for_data, next_interval)
+
+    async def merge_messages(self):
+        """
+        Переносит сообщения из буфера слияния в общую очередь
+
+        Буфер всегда отдает самое раннее событие первым. Строка, которую
+        источник прочитает позже, появилась в логе после его последнего
+        чтения, поэтому событие выходит из буфера, как только все остальные
+        подключенные источники прочитаны позже него: более раннего события
+        от них уже не будет. Отключенные источники не ждем, зависшее чтение
+        задерживает сообщение не дольше max_delay секунд.
+        """
+        while self.running or self.merge_heap:
+            deadline = time.monotonic() - self.max_delay
+            while self.merge_heap:
+                event_key, _, arrival, message = self.merge_heap[0]
+                if self.running and arrival > deadline and event_key > self.watermark(message.source):
+                    break
+                heapq.heappop(self.merge_heap)
+                self.message_queue.put(message)
+            await asyncio.sleep(0.05)
+
+    def watermark(self, source):
+        """
+        Время, до которого другие источники уже прочитаны
+
+        Args:
+            source: Источник сообщения (его собственные строки уже идут по порядку)
+
+        Returns:
+            float: Минимум моментов последнего чтения подключенных источников
+                (time.time(), -inf - источник еще ни разу не прочитан)
+        """
+        marks = [self.read_marks[name] or float('-inf')
+                 for name, monitor in self.monitors.items()
+                 if name != source and monitor.connected]
+        return min(marks, default=float('inf'))
+
+    def get_ingestion_lag(self):
+        """Суммарное отставание чтения по всем источникам (как SFTPChatMonitor.get_ingestion_lag)"""
+        lags = [monitor.get_ingestion_lag() for monitor in self.monitors.values()]
+        return {
+            'bytes': sum(item['bytes'] for item in lags),
+            'seconds': max((item['seconds'] for item in lags), default=0)
+        }
+    
+    def get_stats(self):
+        """
+        Возвращает статистику по источникам
+
+        Returns:
+            dict: {название сервера: {messages, bytes, polls, errors, reconnects,
+                   last_message_time, connected, lag_bytes, poll_interval, telemetry}}
+        """
+        result = {}
+        for name, monitor in self.monitors.items():
+            stats = dict(self.source_stats[name])
+            stats['connected'] = monitor.connected
+            stats['lag_bytes'] = monitor.get_ingestion_lag()['bytes']
+            stats['poll_interval'] = monitor.poll_scheduler.interval
+            stats['telemetry'] = monitor.get_telemetry()
+            result[name] = stats
+        return result
+    
+    def export_telemetry(self, path=None):
+        """
+        Сохраняет снимки телеметрии всех источников в один JSON файл
+        
+        Args:
+            path: Путь к файлу (по умолчанию telemetry_YYYYMMDD_HHMMSS.json)
+            
+        Returns:
+            str: Путь к сохраненному файлу
+        """
+        if path is None:
+            path = f"telemetry_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        snapshot = {name: monitor.get_telemetry() for name, monitor in self.monitors.items()}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        return path
+
+
+def pack_message(message):
+    """
+    Переводит сообщение в кортеж для передачи между процессами
+    
+    Номера местоположений у каждого процесса свои, поэтому передаются
+    координаты, а номер заново выдает реестр принимающего процесса.
+    """
+    coordinates = LOCATIONS.coords[message.location_id]
+    return (
+        message.timestamp,
+        message.location_id if coordinates is None else None,
+        coordinates,
+        message.message,
+        message.raw,
+        message.source,
+        message.event_time
+    )
+
+
+def unpack_message(record):
+    """Восстанавливает CommandBlockMessage из кортежа pack_message"""
+    timestamp, location_id, coordinates, text, raw, source, event_time = record
+    if coordinates is not None:
+        location_id = LOCATIONS.intern(*coordinates)
+    message = CommandBlockMessage(timestamp, location_id, text, raw)
+    message.source = source
+    message.event_time = event_time
+    return message
+
+
+def run_ingestion_process(configs, connection, stop_event, status_interval=1.0, batch_size=500):
+    """
+    Точка входа дочернего процесса чтения логов
+    
+    Внутри работает обычный MultiSourceIngestor. Разобранные сообщения
+    уходят родителю пачками через pipe (одна сериализация на пачку), раз
+    в status_interval секунд отправляется статистика - она же служит
+    признаком жизни процесса. Родитель подтверждает каждую пачку, и только
+    тогда контрольная точка продвигается за ее строки: если процесс упадет,
+    пока сообщения еще в буфере слияния или в pipe, перезапущенный процесс
+    прочитает их заново.
+    
+    Args:
+        configs: Список настроек серверов (см. create_monitor) с ключом name
+        connection: Конец multiprocessing.Pipe (duplex) для обмена с родителем
+        stop_event: multiprocessing.Event - сигнал остановки
+        status_interval: Период отправки статистики (сек)
+        batch_size: Максимум сообщений в одной пачке
+    """
+    message_queue = queue.Queue()
+    monitors = {config['name']: create_monitor(config) for config in configs}
+    for monitor in monitors.values():
+        if monitor.source.checkpoint:
+            monitor.source.checkpoint.hold = True  # Продвигается по подтверждениям родителя
+    ingestor = MultiSourceIngestor(monitors, message_queue)
+    ingestor.start()
+    
+    next_status = 0
+    batch_numbers = itertools.count(1)
+    unconfirmed = deque()  # (номер пачки, [(контрольная точка, номер чтения)])
+    try:
+        while not stop_event.is_set() and ingestor.thread.is_alive():
+            # Подтверждения родителя: пачки до этого номера получены
+            while connection.poll():
+                kind, confirmed = connection.recv()
+                while kind == 'ack' and unconfirmed and unconfirmed[0][0] <= confirmed:
+                    for checkpoint, sequence in unconfirmed.popleft()[1]:
+                        checkpoint.delivered(sequence)
+            
+            batch = []
+            try:
+                batch.append(message_queue.get(timeout=0.05))
+                while len(batch) < batch_size:
+                    batch.append(message_queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            # Уведомления о переключении на резерв передаются как есть
+            notices = [message for message in batch if isinstance(message, dict)]
+            for notice in notices:
+                connection.send(('notice', notice))
+            if notices:
+                batch = [message for message in batch if not isinstance(message, dict)]
+            
+            if batch:
+                # Вывод в консоль и файл истории уже сделан в этом процессе (tail_source)
+                number = next(batch_numbers)
+                connection.send(('messages', number, [pack_message(message) for message in batch]))
+                unconfirmed.append((number, [message.delivery for message in batch if message.delivery]))
+            
+            if time.monotonic() >= next_status:
+                connection.send(('status', ingestor.get_stats(), ingestor.get_ingestion_lag()))
+                next_status = time.monotonic() + status_interval
+    except (BrokenPipeError, EOFError, OSError):
+        pass  # Родительский процесс закрыл свой конец
+    finally:
+        ingestor.stop()
+        for monitor in monitors.values():
+            monitor.close_history()
+        connection.close()
+
+
+class ProcessIngestor:
+    """
+    Чтение логов в отдельном процессе под наблюдением
+    
+    SFTP, декодирование, разбор строк и вывод в консоль выполняются в
+    дочернем процессе и не конкурируют с главным циклом Tk за GIL.
+    Сообщения приходят через pipe и попадают в ту же очередь, что и при
+    чтении в потоке. Поток наблюдения перезапускает процесс, если тот
+    завершился или перестал присылать статистику; после перезапуска
+    чтение продолжается с контрольной точки.
+    
+    Интерфейс совпадает с MultiSourceIngestor: start, stop, get_stats,
+    get_ingestion_lag, export_telemetry.
+    """
+    
+    def __init__(self, configs, message_queue, heartbeat_timeout=10.0):
+        """
+        Args:
+            configs: Список настроек серверов (см. create_monitor) с ключом name
+            message_queue: Очередь, в которую попадают сообщения (queue.Queue)
+            heartbeat_timeout: Через сколько секунд молчания процесс считается зависшим
+        """
+        self.configs = configs
+        self.message_queue = message_queue
+        self.heartbeat_timeout = heartbeat_timeout
+        
+        # spawn на всех системах: fork процесса с потоками Tk и paramiko небезопасен
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.connection = None
+        self.stop_event = None
+        
+        self.running = False
+        self.thread = None
+        self.restarts = 0
+        self.restart_backoff = ReconnectBackoff(base_delay=1, max_delay=30)
+        self.last_heartbeat = None
+        
+        # Последняя статистика, присланная процессом
+        self.stats = {}
+        self.lag = {'bytes': 0, 'seconds': 0}
+    
+    def start(self):
+        """Запускает поток наблюдения, который запускает дочерний процесс"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def stop(self, timeout=3):
+        """Останавливает дочерний процесс (с сохранением контрольной точки)"""
+        self.running = False
+        if self.stop_event:
+            self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+    
+    @property
+    def pid(self):
+        """PID дочернего процесса или None"""
+        return self.process.pid if self.process else None
+    
+    def run(self):
+        """Поток наблюдения: запускает процесс, принимает сообщения, перезапускает при сбое"""
+        while self.running:
+            if not self.restart_backoff.ready():
+                time.sleep(min(self.restart_backoff.remaining(), 0.5))
+                continue
+            
+            self.spawn()
+            reason = self.receive()
+            self.reap()
+            if not self.running:
+                break
+            
+            delay = self.restart_backoff.failed()
+            self.restarts += 1
+            self.message_queue.put({
+                'type': 'connection',
+                'text': f"[!] Процесс чтения лога {reason}, перезапуск через {delay:.1f} сек",
+                'level': "warning"
+            })
+        self.reap()
+    
+    def spawn(self):
+        """Запускает дочерний процесс чтения"""
+        self.connection, child_connection = self.context.Pipe()  # В обратную сторону идут подтверждения
+        self.stop_event = self.context.Event()
+        self.process = self.context.Process(
+            target=run_ingestion_process,
+            args=(self.configs, child_connection, self.stop_event),
+            daemon=True
+        )
+        self.process.start()
+        child_connection.close()  # Иначе конец pipe не закроется вместе с процессом
+        self.last_heartbeat = time.monotonic()
+        print(f"[Ingestion] Запущен процесс чтения логов (PID {self.process.pid})")
+    
+    def receive(self):
+        """
+        Принимает данные от процесса, пока он жив и отвечает
+        
+        Returns:
+            str: Причина завершения процесса или None, если ингестор остановлен
+        """
+        while self.running:
+            try:
+                if self.connection.poll(0.1):
+                    kind, *payload = self.connection.recv()
+                    self.last_heartbeat = time.monotonic()
+                    if kind == 'messages':
+                        number, records = payload
+                        for record in records:
+                            self.message_queue.put(unpack_message(record))
+                        self.connection.send(('ack', number))  # Процесс продвинет контрольную точку
+                    elif kind == 'status':
+                        self.stats, self.lag = payload
+                        self.restart_backoff.succeeded()
+                    elif kind == 'notice':
+                        self.message_queue.put(payload[0])
+                    continue
+            except (EOFError, OSError):
+                self.process.join(timeout=1)
+                return f"завершился (код {self.process.exitcode})"
+            
+            if not self.process.is_alive():
+                return f"завершился (код {self.process.exitcode})"
+            if time.monotonic() - self.last_heartbeat > self.heartbeat_timeout:
+                return f"не отвечает {self.heartbeat_timeout:.0f} сек"
+        return None
+    
+    def reap(self, timeout=2):
+        """Останавливает процесс: сначала по сигналу, затем принудительно"""
+        if self.process is None:
+            return
+        self.stop_event.set()
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()  # Зависший или приостановленный процесс не реагирует на terminate
+            self.process.join(timeout=1)
+        self.connection.close()
+        self.process = None
+    
+    def get_ingestion_lag(self):
+        """Отставание чтения по последней статистике процесса"""
+        return self.lag
+    
+    def get_stats(self):
+        """Статистика по источникам в формате MultiSourceIngestor.get_stats"""
+        return self.stats
+    
+    def export_telemetry(self, path=None):
+        """
+        Сохраняет последние снимки телеметрии источников в JSON файл
+        
+        Returns:
+            str: Путь к сохраненному файлу
+        """
+        if path is None:
+            path = f"telemetry_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        snapshot = {name: stats['telemetry'] for name, stats in self.stats.items()}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        return path
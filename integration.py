@@ -4,7 +4,10 @@ import threading
 import queue
 import time
 import re
-from parsing import SFTPChatMonitor
+from parsing import SFTPChatMonitor, LocalFileLogSource, ReplayLogSource, CommandBlockMessage
+from ingestion import (MultiSourceIngestor, ProcessIngestor, ConnectionProfiles, create_monitor,
+                       standby_config, failover_notice)
+from recovery import RaceRecovery
 from command_templates import get_skier_commands, get_all_command_examples, should_ignore_command, extract_command_parts
 
 class ParserIntegration:
@@ -19,8 +22,11 @@ class ParserIntegration:
         self.root = app.root
         self.parser = None
         self.parser_thread = None
+        self.ingestor = None  # Одновременное чтение нескольких серверов
         self.running = False
+        self.connection_lost = False
         self.message_queue = queue.Queue()
+        self.queue_batch_size = 200  # Максимум сообщений за один тик интерфейса
         self.active_commands = {}
         
         # Окно настроек парсера
@@ -29,6 +35,9 @@ class ParserIntegration:
         # Автоматический режим (автоматически выполняет команды)
         self.auto_mode = True
         
+        # Старт, круги и финиш по времени события из лога, а не по времени обработки
+        self.event_time_mode = True
+        
         # Кэш имен лыжников
         self.skier_names_cache = []
         
@@ -36,6 +45,18 @@ class ParserIntegration:
         self.commands_processed = 0
         self.commands_ignored = 0
         
+        # Воспроизведение записанного лога
+        self.replay_started_at = None
+        self.replay_messages = 0
+        
+        # Восстановление гонки по логу после сбоя
+        self.recovery_thread = None
+        self.recovery_result = None
+        
+        # Сохраненные профили: подключаемся к серверам заранее, в фоне
+        self.profiles = ConnectionProfiles()
+        self.profiles.prewarm()
+        
         # Создаем UI элементы для управления парсером
         self.create_ui_elements()
         
@@ -247,6 +268,21 @@ class ParserIntegration:
             state="disabled"
         )
         
+        parser_menu.add_command(
+            label="Запустить несколько серверов...",
+            command=self.multi_parser_dialog
+        )
+        
+        parser_menu.add_command(
+            label="Воспроизвести лог...",
+            command=self.replay_dialog
+        )
+        
+        parser_menu.add_command(
+            label="Восстановить гонку из лога...",
+            command=self.recovery_dialog
+        )
+        
         parser_menu.add_separator()
         
         parser_menu.add_command(
@@ -334,6 +370,16 @@ class ParserIntegration:
         )
         self.stats_label.pack()
         
+        # Отставание чтения лога
+        self.lag_label = tk.Label(
+            self.control_window,
+            text="",
+            font=("Arial", 8),
+            fg="#888",
+            pady=2
+        )
+        self.lag_label.pack()
+        
         # Кнопки
         buttons_frame = tk.Frame(self.control_window, pady=10)
         buttons_frame.pack()
@@ -443,7 +489,7 @@ class ParserIntegration:
         """Показывает диалог для запуска парсера"""
         self.settings_window = tk.Toplevel(self.root)
         self.settings_window.title("Настройки парсера Minecraft")
-        self.settings_window.geometry("500x400")
+        self.settings_window.geometry("500x760")
         self.settings_window.resizable(False, False)
         
         # Делаем окно модальным
@@ -466,6 +512,19 @@ class ParserIntegration:
         input_frame = tk.Frame(self.settings_window, padx=20, pady=10)
         input_frame.pack(fill="both", expand=True)
         
+        # Сохраненный профиль (по умолчанию - последний использованный)
+        tk.Label(input_frame, text="Профиль:", anchor="w").grid(row=0, column=0, sticky="w", pady=5)
+        self.profile_var = tk.StringVar(value=self.profiles.last_used or "")
+        profile_box = ttk.Combobox(
+            input_frame,
+            textvariable=self.profile_var,
+            values=self.profiles.names(),
+            width=37
+        )
+        profile_box.grid(row=0, column=1, sticky="ew", pady=5, padx=(10, 0))
+        profile_box.bind("<<ComboboxSelected>>", lambda event: self.fill_profile_fields(self.profile_var.get()))
+        profile = self.profiles.get(self.profiles.last_used) or {}
+        
         # Поля ввода
         fields = [
             ("Хост сервера (IP/домен):", "host", "d22.joinserver.xyz"),
@@ -473,17 +532,19 @@ class ParserIntegration:
             ("Имя пользователя:", "username", "jgixek78.7343820e"),
             ("Пароль:", "password", "", True),
             ("Путь к файлу логов:", "remote_path", "/logs/latest.log"),
+            ("Хост резерва (пусто - тот же):", "standby_host", ""),
+            ("Путь к резервному логу:", "standby_path", ""),
         ]
         
         self.input_vars = {}
         
-        for i, (label_text, var_name, default_value, *extra) in enumerate(fields):
+        for i, (label_text, var_name, default_value, *extra) in enumerate(fields, start=1):
             is_password = len(extra) > 0 and extra[0]
             
             label = tk.Label(input_frame, text=label_text, anchor="w")
             label.grid(row=i, column=0, sticky="w", pady=5)
             
-            var = tk.StringVar(value=default_value)
+            var = tk.StringVar(value=str(profile.get(var_name, default_value)))
             self.input_vars[var_name] = var
             
             if is_password:
@@ -493,6 +554,63 @@ class ParserIntegration:
             
             entry.grid(row=i, column=1, sticky="ew", pady=5, padx=(10, 0))
         
+        # Источник лога
+        self.source_mode_var = tk.StringVar(value=profile.get('source_mode', "sftp"))
+        source_modes = [
+            ("SFTP (опрос файла)", "sftp"),
+            ("SSH поток (tail -F)", "tail"),
+            ("Локальный файл (путь к логам на этом компьютере)", "local"),
+        ]
+        for j, (mode_text, mode_value) in enumerate(source_modes):
+            tk.Radiobutton(
+                input_frame,
+                text=mode_text,
+                variable=self.source_mode_var,
+                value=mode_value,
+                anchor="w"
+            ).grid(row=len(fields) + 1 + j, column=0, columnspan=2, sticky="w")
+        
+        # Горячий резерв: тот же лог по другому пути, с другого сервера или зеркало
+        tk.Label(input_frame, text="Резервный источник:", anchor="w").grid(
+            row=len(fields) + len(source_modes) + 1, column=0, sticky="w", pady=5
+        )
+        self.standby_mode_var = tk.StringVar(value=profile.get('standby_mode') or "нет")
+        tk.OptionMenu(input_frame, self.standby_mode_var, "нет", "sftp", "tail", "local").grid(
+            row=len(fields) + len(source_modes) + 1, column=1, sticky="w", pady=5, padx=(10, 0)
+        )
+        
+        # Чтение в отдельном процессе: всплески лога не тормозят секундомеры
+        self.separate_process_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            input_frame,
+            text="Читать лог в отдельном процессе",
+            variable=self.separate_process_var,
+            anchor="w"
+        ).grid(row=len(fields) + len(source_modes) + 2, column=0, columnspan=2, sticky="w", pady=(5, 0))
+        
+        # Сохранение профиля: с паролем сервер подключается заранее при запуске программы
+        self.save_profile_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            input_frame,
+            text="Сохранить профиль",
+            variable=self.save_profile_var,
+            anchor="w"
+        ).grid(row=len(fields) + len(source_modes) + 3, column=0, columnspan=2, sticky="w")
+        
+        self.remember_password_var = tk.BooleanVar(value=bool(profile.get('password')))
+        tk.Checkbutton(
+            input_frame,
+            text="Запомнить пароль и подключаться заранее\n(пароль хранится в connection_profiles.json)",
+            variable=self.remember_password_var,
+            justify="left",
+            anchor="w"
+        ).grid(row=len(fields) + len(source_modes) + 4, column=0, columnspan=2, sticky="w")
+        
+        self.warm_status_label = tk.Label(input_frame, anchor="w", fg="#666")
+        self.warm_status_label.grid(row=len(fields) + len(source_modes) + 5, column=0, columnspan=2,
+                                    sticky="w", pady=(5, 0))
+        self.update_warm_status()
+        
         # Фрейм для кнопок
         button_frame = tk.Frame(self.settings_window, pady=20)
         button_frame.pack()
@@ -521,6 +639,39 @@ class ParserIntegration:
         )
         cancel_btn.pack(side="left", padx=10)
     
+    def fill_profile_fields(self, name):
+        """Заполняет поля диалога настройками сохраненного профиля"""
+        profile = self.profiles.get(name)
+        if not profile:
+            return
+        for var_name, var in self.input_vars.items():
+            var.set(str(profile.get(var_name, "")))
+        self.source_mode_var.set(profile.get('source_mode') or "sftp")
+        self.standby_mode_var.set(profile.get('standby_mode') or "нет")
+        self.remember_password_var.set(bool(profile.get('password')))
+    
+    def update_warm_status(self):
+        """Показывает в диалоге состояние заранее установленного соединения"""
+        if not self.settings_window or not self.settings_window.winfo_exists():
+            return
+        
+        config = {var_name: var.get().strip() for var_name, var in self.input_vars.items()}
+        config['source_mode'] = self.source_mode_var.get()
+        status = self.profiles.status(config)
+        if status is None:
+            text = "Соединение: устанавливается при запуске парсера"
+        elif status['state'] == 'ready':
+            text = f"Соединение: готово (рукопожатие {status['handshake_seconds']:.1f} сек)"
+        elif status['state'] == 'attached':
+            text = "Соединение: используется парсером"
+        elif status['state'] == 'failed':
+            text = f"Соединение: ошибка - {status['error'] or 'нет связи'}, повтор в фоне"
+        else:
+            text = "Соединение: подключение..."
+        self.warm_status_label.config(text=text)
+        
+        self.settings_window.after(500, self.update_warm_status)
+    
     def start_parser_from_dialog(self):
         """Запускает парсер с настройками из диалога"""
         try:
@@ -530,46 +681,280 @@ class ParserIntegration:
             username = self.input_vars['username'].get().strip()
             password = self.input_vars['password'].get().strip()
             remote_path = self.input_vars['remote_path'].get().strip()
+            source_mode = self.source_mode_var.get()
+            separate_process = self.separate_process_var.get()
+            standby_mode = self.standby_mode_var.get()
+            standby_mode = "" if standby_mode == "нет" else standby_mode
+            standby_host = self.input_vars['standby_host'].get().strip()
+            standby_path = self.input_vars['standby_path'].get().strip()
             
-            # Проверяем обязательные поля
-            if not all([host, username, remote_path]):
+            # Проверяем обязательные поля (для локального файла нужен только путь)
+            if source_mode == 'local':
+                required = [remote_path]
+            else:
+                required = [host, username, remote_path]
+            if standby_mode:
+                required.append(standby_path)
+                if standby_mode != 'local':
+                    required += [standby_host or host, username]
+            if not all(required):
                 messagebox.showerror("Ошибка", "Заполните все обязательные поля!")
                 return
             
+            profile = {
+                'name': self.profile_var.get().strip() or (host if source_mode != 'local' else "local"),
+                'host': host,
+                'port': port,
+                'username': username,
+                'password': password,
+                'remote_path': remote_path,
+                'source_mode': source_mode,
+                'standby_mode': standby_mode,
+                'standby_host': standby_host,
+                'standby_path': standby_path
+            }
+            
+            # Сохраняем профиль и делаем его последним использованным
+            if self.save_profile_var.get():
+                self.profiles.put(profile, remember_password=self.remember_password_var.get())
+            
             # Закрываем диалог
             self.settings_window.destroy()
             
             # Запускаем парсер
-            self.start_parser(host, port, username, password, remote_path)
+            self.start_parser(host, port, username, password, remote_path, source_mode, separate_process,
+                              standby=standby_config(profile))
             
         except ValueError:
             messagebox.showerror("Ошибка", "Порт должен быть числом!")
     
-    def start_parser(self, host, port, username, password, remote_path):
-        """Запускает парсер в отдельном потоке"""
+    def start_parser(self, host, port, username, password, remote_path, source_mode='sftp',
+                     separate_process=False, standby=None):
+        """
+        Запускает парсер в отдельном потоке
+        
+        Args:
+            source_mode: Источник лога: 'sftp' - опрос через SFTP,
+                'tail' - поток tail -F через SSH, 'local' - локальный файл
+                remote_path на этом компьютере (параметры SSH не нужны)
+            separate_process: Читать лог в дочернем процессе (ProcessIngestor)
+            standby: Настройки резервного источника того же лога
+                (ingestion.standby_config) или None
+        """
         if self.running:
             messagebox.showwarning("Внимание", "Парсер уже запущен!")
             return
         
-        try:
-            # Создаем экземпляр парсера
-            self.parser = SFTPChatMonitor(
-                host=host,
-                port=port,
-                username=username,
-                password=password,
-                remote_path=remote_path
+        config = {
+            'name': host if source_mode != 'local' else "local",
+            'host': host,
+            'port': port,
+            'username': username,
+            'password': password,
+            'remote_path': remote_path,
+            'source_mode': source_mode,
+            'standby': standby
+        }
+        if separate_process:
+            self.start_multi_parser([config], separate_process=True)
+            return
+        
+        # Сервер регистрируется в пуле: поток чтения дождется подключения,
+        # а после остановки соединение останется готовым к следующему запуску
+        self.profiles.prewarm(config)
+        if standby:
+            self.profiles.prewarm(standby)
+        
+        # Создаем экземпляр парсера
+        self.launch_parser(create_monitor(config))
+    
+    def multi_parser_dialog(self):
+        """Показывает диалог для одновременного запуска парсера на нескольких серверах"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Несколько серверов Minecraft")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        tk.Label(
+            dialog,
+            text="Серверы для одновременного чтения логов",
+            font=("Arial", 14, "bold"),
+            pady=10
+        ).pack()
+        
+        rows_frame = tk.Frame(dialog, padx=20, pady=10)
+        rows_frame.pack(fill="both", expand=True)
+        
+        columns = [
+            ("Название", "name", 10),
+            ("Хост", "host", 18),
+            ("Порт", "port", 6),
+            ("Пользователь", "username", 14),
+            ("Пароль", "password", 10),
+            ("Путь к логам", "remote_path", 18),
+        ]
+        for col, (header, _, _) in enumerate(columns):
+            tk.Label(rows_frame, text=header, anchor="w").grid(row=0, column=col, sticky="w")
+        tk.Label(rows_frame, text="Источник", anchor="w").grid(row=0, column=len(columns), sticky="w")
+        
+        server_rows = []
+        
+        def add_row():
+            row_index = len(server_rows) + 1
+            row_vars = {}
+            for col, (_, var_name, width) in enumerate(columns):
+                default_value = "7477" if var_name == "port" else ""
+                if var_name == "name":
+                    default_value = f"server{row_index}"
+                var = tk.StringVar(value=default_value)
+                row_vars[var_name] = var
+                tk.Entry(
+                    rows_frame,
+                    textvariable=var,
+                    width=width,
+                    show="*" if var_name == "password" else ""
+                ).grid(row=row_index, column=col, padx=2, pady=2)
+            
+            row_vars['source_mode'] = tk.StringVar(value="sftp")
+            tk.OptionMenu(rows_frame, row_vars['source_mode'], "sftp", "tail", "local").grid(
+                row=row_index, column=len(columns), padx=2, pady=2
             )
+            server_rows.append(row_vars)
+        
+        def start():
+            configs = []
+            try:
+                for row_vars in server_rows:
+                    config = {key: var.get().strip() for key, var in row_vars.items()}
+                    if not config['remote_path']:
+                        continue  # Пустая строка - сервер не используется
+                    if config['source_mode'] != 'local' and not all([config['host'], config['username']]):
+                        messagebox.showerror("Ошибка", f"Заполните хост и пользователя для {config['name']}!")
+                        return
+                    config['port'] = int(config['port'] or 22)
+                    configs.append(config)
+            except ValueError:
+                messagebox.showerror("Ошибка", "Порт должен быть числом!")
+                return
             
-            # Подключаемся к серверу
-            if not self.parser.connect():
-                messagebox.showerror("Ошибка", "Не удалось подключиться к серверу!")
+            names = [config['name'] for config in configs]
+            if not configs or len(set(names)) != len(names) or not all(names):
+                messagebox.showerror("Ошибка", "Укажите хотя бы один сервер с уникальным названием!")
                 return
             
+            dialog.destroy()
+            self.start_multi_parser(configs, separate_process_var.get())
+        
+        add_row()
+        add_row()
+        
+        separate_process_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            dialog,
+            text="Читать логи в отдельном процессе",
+            variable=separate_process_var
+        ).pack(anchor="w", padx=20)
+        
+        button_frame = tk.Frame(dialog, pady=15)
+        button_frame.pack()
+        
+        tk.Button(
+            button_frame,
+            text="+ Сервер",
+            command=add_row,
+            bg="#2196F3",
+            fg="white",
+            font=("Arial", 11),
+            width=15
+        ).pack(side="left", padx=10)
+        
+        tk.Button(
+            button_frame,
+            text="Запустить",
+            command=start,
+            bg="#4CAF50",
+            fg="white",
+            font=("Arial", 11),
+            width=15
+        ).pack(side="left", padx=10)
+        
+        tk.Button(
+            button_frame,
+            text="Отмена",
+            command=dialog.destroy,
+            bg="#9E9E9E",
+            fg="white",
+            font=("Arial", 11),
+            width=15
+        ).pack(side="left", padx=10)
+        
+        self.center_window(dialog)
+    
+    def start_multi_parser(self, configs, separate_process=False):
+        """
+        Запускает одновременное чтение логов нескольких серверов
+        
+        Подключение к серверам выполняется в фоновом цикле ингестора,
+        поэтому медленный или недоступный сервер не блокирует интерфейс
+        и не мешает чтению остальных.
+        
+        Args:
+            configs: Список словарей с ключами name, host, port, username,
+                password, remote_path, source_mode
+            separate_process: Читать логи в дочернем процессе под наблюдением
+                (ProcessIngestor) - разбор не отнимает GIL у интерфейса
+        """
+        if self.running:
+            messagebox.showwarning("Внимание", "Парсер уже запущен!")
+            return
+        
+        self.parser = None
+        if separate_process:
+            self.ingestor = ProcessIngestor(configs, self.message_queue)
+        else:
+            monitors = {config['name']: create_monitor(config) for config in configs}
+            self.ingestor = MultiSourceIngestor(monitors, self.message_queue)
+        self.ingestor.start()
+        self.running = True
+        
+        self.update_ui_state(True)
+        self.update_skiers_info()
+        mode_text = " (отдельный процесс)" if separate_process else ""
+        self.log_message(f"[✓] Парсер запущен для серверов{mode_text}: "
+                         f"{', '.join(config['name'] for config in configs)}")
+    
+    def start_replay(self, path, speed):
+        """
+        Запускает воспроизведение записанного лога через всю цепочку обработки
+        
+        Args:
+            path: Путь к записанному latest.log
+            speed: Множитель скорости или None - максимально быстро
+        """
+        if self.running:
+            messagebox.showwarning("Внимание", "Парсер уже запущен!")
+            return
+        
+        self.replay_started_at = time.monotonic()
+        self.replay_messages = 0
+        self.launch_parser(SFTPChatMonitor(source=ReplayLogSource(path, speed)), show_success=False)
+    
+    def launch_parser(self, parser, show_success=True):
+        """
+        Запускает цикл чтения в отдельном потоке
+        
+        Подключение к источнику тоже выполняется в этом потоке: интерфейс
+        не ждет сети, а об успехе или ошибке узнает из очереди сообщений.
+        """
+        try:
+            self.parser = parser
+            
             # Запускаем парсер в отдельном потоке
             self.running = True
             self.parser_thread = threading.Thread(
                 target=self.run_parser,
+                args=(show_success,),
                 daemon=True
             )
             self.parser_thread.start()
@@ -578,19 +963,66 @@ class ParserIntegration:
             self.update_ui_state(True)
             self.update_skiers_info()
             
-            self.log_message(f"[✓] Парсер запущен на {host}:{port}")
-            messagebox.showinfo("Успех", "Парсер успешно запущен!")
+            self.log_message(f"[…] Подключение: {self.parser.source.describe()}")
             
         except Exception as e:
             self.log_message(f"[✗] Ошибка запуска парсера: {str(e)}")
             messagebox.showerror("Ошибка", f"Не удалось запустить парсера: {str(e)}")
     
-    def run_parser(self):
+    def run_parser(self, show_success=True):
         """Основной цикл работы парсера"""
         try:
-            while self.running and self.parser and self.parser.connected:
+            # Подключаемся к серверу (готовое соединение из пула - без рукопожатия)
+            connect_started = time.monotonic()
+            connected = self.parser.connect()
+            if not connected and self.parser.standby is not None:
+                # Основной источник недоступен - начинаем с резервного
+                self.parser.switch_source()
+                connected = self.parser.connect()
+            if not connected:
+                self.message_queue.put({"type": "error", "error": "Не удалось подключиться к серверу!"})
+                return
+            self.message_queue.put({
+                'type': 'started',
+                'text': f"[✓] Парсер запущен: {self.parser.source.describe()} "
+                        f"(подключение {time.monotonic() - connect_started:.2f} сек)",
+                'show_success': show_success
+            })
+            
+            while self.running and self.parser:
+                if not self.parser.connected:
+                    # Запись воспроизведена до конца - переподключаться некуда
+                    if getattr(self.parser.source, 'finished', False):
+                        break
+                    
+                    # Связь потеряна: переподключаемся шагами, не останавливая
+                    # доставку уже прочитанных сообщений в интерфейс
+                    if not self.connection_lost:
+                        self.connection_lost = True
+                        self.message_queue.put({
+                            'type': 'connection',
+                            'text': "[!] Соединение потеряно, переподключение...",
+                            'level': "warning"
+                        })
+                    if not self.parser.try_reconnect():
+                        time.sleep(min(self.parser.reconnect_backoff.remaining(), 0.5))
+                        continue
+                    
+                    self.connection_lost = False
+                    self.message_queue.put({
+                        'type': 'connection',
+                        'text': f"[✓] Соединение восстановлено, чтение продолжено с позиции "
+                                f"{self.parser.source.position}",
+                        'level': "success"
+                    })
+                
                 # Читаем новые данные
                 new_data = self.parser.read_new_data()
+                messages = []
+                
+                # Переключения на резервный источник - в журнал интерфейса
+                while self.parser.failover_notices:
+                    self.message_queue.put(failover_notice(self.parser.failover_notices.popleft()))
                 
                 if new_data:
                     # Обрабатываем сообщения
@@ -603,8 +1035,19 @@ class ParserIntegration:
                         # Добавляем сообщение в очередь для обработки
                         self.message_queue.put(message)
                 
-                # Небольшая пауза
-                time.sleep(0.1)
+                # Адаптивная пауза (в потоковом режиме - до прихода данных)
+                # Пока догоняем отставание - читаем следующую порцию без паузы
+                next_interval = self.parser.poll_scheduler.observe(
+                    self.parser.last_read_bytes, len(messages)
+                )
+                if not self.parser.catching_up:
+                    self.parser.wait_for_data(next_interval)
+                
+            # Запись воспроизведена до конца - сообщаем показатели
+            if self.parser and getattr(self.parser.source, 'finished', False):
+                stats = self.parser.source.throughput()
+                stats['type'] = 'replay_finished'
+                self.message_queue.put(stats)
                 
         except Exception as e:
             print(f"Ошибка в парсере: {e}")
@@ -613,48 +1056,326 @@ class ParserIntegration:
             self.running = False
             if self.parser:
                 self.parser.disconnect()
+                self.parser.close_history()
             self.update_ui_state(False)
     
     def process_message_queue(self):
-        """Обрабатывает сообщения из очереди"""
+        """
+        Обрабатывает сообщения из очереди
+        
+        За один тик обрабатывается не больше queue_batch_size сообщений,
+        чтобы при догоняющем чтении большого отставания интерфейс не замирал.
+        Если в очереди еще остались сообщения, следующий тик планируется сразу.
+        """
+        processed = 0
         try:
-            while not self.message_queue.empty():
+            while processed < self.queue_batch_size and not self.message_queue.empty():
                 message = self.message_queue.get_nowait()
+                processed += 1
                 
-                if message.get('type') == 'error':
-                    # Ошибка парсера
-                    self.show_parser_error(message.get('error', 'Неизвестная ошибка'))
-                elif message.get('type') == 'command_block':
+                if isinstance(message, CommandBlockMessage):
                     # Сообщение от командного блока
                     self.process_command_block_message(message)
+                    self.replay_messages += 1
+                elif message.get('type') == 'error':
+                    # Ошибка парсера
+                    self.show_parser_error(message.get('error', 'Неизвестная ошибка'))
+                elif message.get('type') == 'replay_finished':
+                    # Воспроизведение записи завершено
+                    self.show_replay_results(message)
+                elif message.get('type') == 'started':
+                    # Поток чтения подключился к источнику
+                    self.log_message(message['text'], "success")
+                    if message.get('show_success'):
+                        messagebox.showinfo("Успех", "Парсер успешно запущен!")
+                elif message.get('type') == 'connection':
+                    # Потеря и восстановление связи с сервером
+                    self.log_message(message['text'], message.get('level', "info"))
                 
                 self.message_queue.task_done()
                 
         except queue.Empty:
             pass
         
-        # Планируем следующую проверку
-        self.root.after(100, self.process_message_queue)
+        self.update_lag_display()
+        
+        # Планируем следующую проверку (сразу, если очередь еще не разобрана)
+        delay = 1 if not self.message_queue.empty() else 100
+        self.root.after(delay, self.process_message_queue)
+    
+    def show_replay_results(self, stats):
+        """Выводит пропускную способность по итогам воспроизведения записи"""
+        # Сообщение о завершении стоит в очереди после всех команд записи,
+        # поэтому к этому моменту интерфейс уже обработал их все
+        total_seconds = max(time.monotonic() - self.replay_started_at, 1e-9)
+        self.log_message(
+            f"[Воспроизведение] Чтение: {stats['lines']} строк за {stats['seconds']:.2f} сек "
+            f"({stats['lines_per_second']:.0f} строк/сек, "
+            f"{stats['bytes_per_second'] / 1024 / 1024:.1f} MB/сек)",
+            "success"
+        )
+        self.log_message(
+            f"[Воспроизведение] Вся цепочка: {self.replay_messages} команд за {total_seconds:.2f} сек "
+            f"({self.replay_messages / total_seconds:.0f} сообщений/сек)",
+            "success"
+        )
+    
+    def replay_dialog(self):
+        """Показывает диалог выбора записи лога и скорости воспроизведения"""
+        from tkinter import filedialog
+        path = filedialog.askopenfilename(
+            title="Запись лога для воспроизведения",
+            filetypes=[("Логи Minecraft", "*.log"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Воспроизведение лога")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        tk.Label(dialog, text="Скорость воспроизведения:", font=("Arial", 11), pady=10).pack()
+        
+        speed_var = tk.StringVar(value="1")
+        for text, value in [("1x (реальное время)", "1"), ("10x", "10"), ("100x", "100"),
+                            ("Максимальная (замер пропускной способности)", "max")]:
+            tk.Radiobutton(dialog, text=text, variable=speed_var, value=value, anchor="w").pack(
+                fill="x", padx=20
+            )
+        
+        def start():
+            value = speed_var.get()
+            dialog.destroy()
+            self.start_replay(path, None if value == "max" else float(value))
+        
+        tk.Button(
+            dialog,
+            text="Воспроизвести",
+            command=start,
+            bg="#4CAF50",
+            fg="white",
+            font=("Arial", 11),
+            width=15
+        ).pack(pady=15)
+        
+        self.center_window(dialog)
+    
+    def recovery_dialog(self):
+        """Показывает диалог восстановления старта и кругов по логу сервера"""
+        if self.recovery_thread and self.recovery_thread.is_alive():
+            messagebox.showwarning("Внимание", "Восстановление уже выполняется!")
+            return
+        
+        # Лог подключенного сервера доступен, если парсер читает настоящий latest.log
+        server_available = bool(self.parser and self.parser.connected and
+                                not isinstance(self.parser.source, ReplayLogSource))
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Восстановление гонки")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        tk.Label(dialog, text="Откуда читать лог:", font=("Arial", 11, "bold"), pady=5).pack(anchor="w", padx=10)
+        source_var = tk.StringVar(value="server" if server_available else "file")
+        tk.Radiobutton(
+            dialog, text="Лог подключенного сервера", variable=source_var, value="server",
+            state="normal" if server_available else "disabled", anchor="w"
+        ).pack(fill="x", padx=20)
+        tk.Radiobutton(dialog, text="Файл latest.log на этом компьютере...", variable=source_var,
+                       value="file", anchor="w").pack(fill="x", padx=20)
+        
+        tk.Label(dialog, text="Начало гонки:", font=("Arial", 11, "bold"), pady=5).pack(anchor="w", padx=10)
+        start_var = tk.StringVar(value="last_start")
+        tk.Radiobutton(dialog, text="С последнего общего старта (иначе весь файл)", variable=start_var,
+                       value="last_start", anchor="w").pack(fill="x", padx=20)
+        
+        text_frame = tk.Frame(dialog)
+        text_frame.pack(fill="x", padx=20)
+        tk.Radiobutton(text_frame, text="С сообщения, содержащего:", variable=start_var,
+                       value="text").pack(side="left")
+        start_text_var = tk.StringVar()
+        tk.Entry(text_frame, textvariable=start_text_var, width=20).pack(side="left", padx=5)
+        
+        time_frame = tk.Frame(dialog)
+        time_frame.pack(fill="x", padx=20)
+        tk.Radiobutton(time_frame, text="С времени лога (ЧЧ:ММ:СС):", variable=start_var,
+                       value="time").pack(side="left")
+        start_time_var = tk.StringVar()
+        tk.Entry(time_frame, textvariable=start_time_var, width=10).pack(side="left", padx=5)
+        
+        tk.Radiobutton(dialog, text="Весь файл", variable=start_var, value="all", anchor="w").pack(
+            fill="x", padx=20
+        )
+        
+        def start():
+            mode = start_var.get()
+            start_text = start_text_var.get().strip() if mode == "text" else None
+            start_time = start_time_var.get().strip() if mode == "time" else None
+            if (mode == "text" and not start_text) or (mode == "time" and not re.match(r'^\d{1,2}:\d{2}:\d{2}$', start_time)):
+                messagebox.showerror("Ошибка", "Укажите текст сообщения или время в формате ЧЧ:ММ:СС!", parent=dialog)
+                return
+            
+            path = None
+            if source_var.get() == "file":
+                from tkinter import filedialog
+                path = filedialog.askopenfilename(
+                    title="Лог сервера для восстановления",
+                    filetypes=[("Логи Minecraft", "*.log"), ("All files", "*.*")],
+                    parent=dialog
+                )
+                if not path:
+                    return
+            
+            if not messagebox.askyesno(
+                "Подтверждение",
+                "Старт и круги всех лыжников будут заменены восстановленными из лога. Продолжить?",
+                parent=dialog
+            ):
+                return
+            
+            dialog.destroy()
+            self.start_recovery(path, start_time, start_text, mode == "last_start")
+        
+        tk.Button(
+            dialog,
+            text="Восстановить",
+            command=start,
+            bg="#4CAF50",
+            fg="white",
+            font=("Arial", 11),
+            width=15
+        ).pack(pady=15)
+        
+        self.center_window(dialog)
+    
+    def start_recovery(self, path=None, start_time=None, start_text=None, from_last_start=False):
+        """
+        Запускает восстановление гонки по логу в фоновом потоке
+        
+        Args:
+            path: Локальный файл лога или None - лог подключенного сервера
+            start_time: Начало гонки 'HH:MM:SS'
+            start_text: Начало гонки - последнее сообщение с этим текстом
+            from_last_start: Начать с последней команды общего старта
+        """
+        self.update_skier_commands()
+        
+        if path:
+            parser = SFTPChatMonitor(source=LocalFileLogSource(path), use_checkpoint=False)
+            clock_offset = 0.0
+        else:
+            parser = self.parser
+            clock_offset = parser.event_clock.offset or 0.0
+        
+        recovery = RaceRecovery(
+            self.active_commands,
+            [sw.get_name() for sw in self.app.stopwatches],
+            parser.parse_command_block_message,
+            clock_offset
+        )
+        
+        def run():
+            try:
+                data = RaceRecovery.read_log(parser.source)
+                result = recovery.scan(data, start_time, start_text, from_last_start)
+                result['bytes'] = len(data)
+            except Exception as e:
+                result = {'error': str(e)}
+            self.recovery_result = result
+        
+        self.log_message(f"[Восстановление] Чтение лога: {parser.source.describe()}")
+        self.recovery_result = None
+        self.recovery_thread = threading.Thread(target=run, daemon=True)
+        self.recovery_thread.start()
+        self.root.after(100, self.finish_recovery)
+    
+    def finish_recovery(self):
+        """Загружает результат восстановления в секундомеры, когда фоновый поток закончил"""
+        if self.recovery_thread and self.recovery_thread.is_alive():
+            self.root.after(100, self.finish_recovery)
+            return
+        
+        result = self.recovery_result
+        self.recovery_thread = None
+        if result is None or 'error' in result:
+            error = result['error'] if result else "нет результата"
+            self.log_message(f"[✗] Восстановление не удалось: {error}", "error")
+            messagebox.showerror("Ошибка", f"Не удалось восстановить гонку: {error}")
+            return
+        
+        self.app.restore_race_state(result['states'])
+        
+        self.log_message(
+            f"[Восстановление] {result['commands']} команд из {result['lines']} строк командных блоков "
+            f"({result['bytes'] / 1024 / 1024:.1f} MB) за {result['seconds']:.2f} сек",
+            "success"
+        )
+        for state in result['states']:
+            status = "на дистанции" if state.running else "остановлен"
+            self.log_message(f"[Восстановление] {state.name}: кругов {len(state.lap_times)}, {status}")
+        
+        messagebox.showinfo(
+            "Восстановление гонки",
+            f"Восстановлено команд: {result['commands']}\n"
+            f"Лыжников на дистанции: {sum(1 for state in result['states'] if state.running)}"
+        )
+    
+    def update_lag_display(self):
+        """Обновляет отображение отставания чтения лога от реального времени"""
+        if self.running and self.ingestor:
+            # Суммарное отставание по всем серверам
+            lag = self.ingestor.get_ingestion_lag()
+        elif self.running and self.parser:
+            lag = self.parser.get_ingestion_lag()
+        else:
+            lag = None
+        
+        if lag is not None:
+            backlog = lag['bytes'] + self.message_queue.qsize()
+            if backlog:
+                text = (f"Отставание: {lag['bytes'] // 1024} KB лога, "
+                        f"{self.message_queue.qsize()} в очереди, ~{lag['seconds']} сек")
+                color = "#FF9800"
+            else:
+                text = "Отставание: нет"
+                color = "#888"
+        else:
+            text = ""
+            color = "#888"
+        
+        if self.lag_label.cget("text") != text:
+            self.lag_label.config(text=text, fg=color)
     
     def process_command_block_message(self, message):
         """Обрабатывает сообщение от командного блока"""
-        text = message.get('message', '').strip()
-        location = message.get('location', 'unknown')
-        timestamp = message.get('timestamp', '')
-        
-        log_msg = f"[Minecraft] {timestamp} [{location}]: {text}"
+        text = message.message.strip()
+        location = message.location
+        timestamp = message.timestamp
+        
+        # При чтении нескольких серверов указываем, с какого пришло сообщение
+        source = message.source
+        prefix = f"[Minecraft:{source}]" if source else "[Minecraft]"
+        log_msg = f"{prefix} {timestamp} [{location}]: {text}"
         self.log_message(log_msg, "info")
         
         # Если включен автоматический режим, анализируем команду
         if self.auto_mode:
-            self.execute_command_from_text(text)
+            event_time = message.event_time if self.event_time_mode else None
+            self.execute_command_from_text(text, event_time)
     
-    def execute_command_from_text(self, text):
+    def execute_command_from_text(self, text, event_time=None):
         """
         Выполняет команду на основе текста сообщения
         
         Сначала проверяет, нужно ли игнорировать сообщение,
         затем ищет точные совпадения с командами
+        
+        Args:
+            text: Текст сообщения командного блока
+            event_time: Время события из лога (datetime) или None - текущее время
         """
         text_lower = text.lower()
         
@@ -709,16 +1430,17 @@ class ParserIntegration:
                 best_match['action'], 
                 best_match['skier_name'], 
                 lap_number, 
-                text
+                text,
+                event_time
             )
             
             self.commands_processed += 1
             self.update_stats_display()
         else:
             # Если не нашли команду, пробуем общий парсинг (с осторожностью)
-            self.parse_general_command_with_caution(text)
+            self.parse_general_command_with_caution(text, event_time)
     
-    def parse_general_command_with_caution(self, text):
+    def parse_general_command_with_caution(self, text, event_time=None):
         """
         Парсит общие команды с дополнительными проверками
         
@@ -756,7 +1478,7 @@ class ParserIntegration:
             start_pattern = r'^' + re.escape(skier_name) + r'\s+(?:старт|стартовал|запуск)\b'
             if re.search(start_pattern, text_lower):
                 if not stopwatch.running:
-                    stopwatch.start()
+                    stopwatch.start(at=event_time)
                     self.commands_processed += 1
                     self.log_message(f"[Авто] Запущен: {skier_name}", "success")
                     self.update_stats_display()
@@ -766,7 +1488,7 @@ class ParserIntegration:
             stop_pattern = r'^' + re.escape(skier_name) + r'\s+(?:стоп|финиш|финишировал)\b'
             if re.search(stop_pattern, text_lower):
                 if stopwatch.running:
-                    stopwatch.stop()
+                    stopwatch.stop(at=event_time)
                     self.commands_processed += 1
                     self.log_message(f"[Авто] Остановлен: {skier_name}", "success")
                     self.update_stats_display()
@@ -776,7 +1498,7 @@ class ParserIntegration:
             lap_pattern = r'^' + re.escape(skier_name) + r'\s+(?:подошел|прошел|вышел)\b'
             if re.search(lap_pattern, text_lower):
                 if stopwatch.running:
-                    stopwatch.record_lap()
+                    stopwatch.record_lap(at=event_time)
                     self.commands_processed += 1
                     self.log_message(f"[Авто] Круг: {skier_name}", "success")
                     self.update_stats_display()
@@ -784,12 +1506,12 @@ class ParserIntegration:
         
         # Проверяем общие команды
         if re.search(r'^старт\s+всех\b|^все\s+старт\b', text_lower):
-            self.app.start_all_stopwatches()
+            self.app.start_all_stopwatches(at=event_time)
             self.commands_processed += 1
             self.log_message("[Авто] Запущены все лыжники", "success")
             self.update_stats_display()
         elif re.search(r'^стоп\s+всех\b|^все\s+стоп\b', text_lower):
-            self.app.stop_all_stopwatches()
+            self.app.stop_all_stopwatches(at=event_time)
             self.commands_processed += 1
             self.log_message("[Авто] Остановлены все лыжники", "success")
             self.update_stats_display()
@@ -797,14 +1519,14 @@ class ParserIntegration:
             lap_count = 0
             for stopwatch in self.app.stopwatches:
                 if stopwatch.running:
-                    stopwatch.record_lap()
+                    stopwatch.record_lap(at=event_time)
                     lap_count += 1
             if lap_count > 0:
                 self.commands_processed += 1
                 self.log_message(f"[Авто] Круг для {lap_count} лыжников", "success")
                 self.update_stats_display()
     
-    def perform_action(self, action, skier_name, lap_number, original_text):
+    def perform_action(self, action, skier_name, lap_number, original_text, event_time=None):
         """
         Выполняет конкретное действие
         
@@ -813,6 +1535,7 @@ class ParserIntegration:
             skier_name: Имя лыжника (может быть пустым для общих команд)
             lap_number: Номер круга (если указан)
             original_text: Оригинальный текст команды
+            event_time: Время события из лога (datetime) или None - текущее время
         """
         # Находим лыжника по имени
         skier = None
@@ -821,18 +1544,18 @@ class ParserIntegration:
         
         if action == 'start_skier':
             if skier and not skier.running:
-                skier.start()
+                skier.start(at=event_time)
                 self.log_message(f"[Авто] Запущен: {skier_name}", "success")
         
         elif action == 'stop_skier':
             if skier and skier.running:
-                skier.record_lap()
-                skier.stop()
+                skier.record_lap(at=event_time)
+                skier.stop(at=event_time)
                 self.log_message(f"[Авто] Остановлен: {skier_name}", "success")
         
         elif action == 'lap_skier':
             if skier and skier.running:
-                skier.record_lap()
+                skier.record_lap(at=event_time)
                 if lap_number:
                     self.log_message(f"[Авто] Круг {lap_number}: {skier_name}", "success")
                 else:
@@ -840,7 +1563,7 @@ class ParserIntegration:
         
         elif action == 'lap_skier_with_number':
             if skier and skier.running:
-                skier.record_lap()
+                skier.record_lap(at=event_time)
                 self.log_message(f"[Авто] Круг {lap_number}: {skier_name}", "success")
         
         elif action == 'select_skier':
@@ -849,18 +1572,18 @@ class ParserIntegration:
                 self.log_message(f"[Авто] Выбран: {skier_name}", "success")
         
         elif action == 'start_all':
-            self.app.start_all_stopwatches()
+            self.app.start_all_stopwatches(at=event_time)
             self.log_message("[Авто] Запущены все лыжники", "success")
         
         elif action == 'stop_all':
-            self.app.stop_all_stopwatches()
+            self.app.stop_all_stopwatches(at=event_time)
             self.log_message("[Авто] Остановлены все лыжники", "success")
         
         elif action == 'lap_all':
             lap_count = 0
             for stopwatch in self.app.stopwatches:
                 if stopwatch.running:
-                    stopwatch.record_lap()
+                    stopwatch.record_lap(at=event_time)
                     lap_count += 1
             if lap_count > 0:
                 self.log_message(f"[Авто] Круг для {lap_count} лыжников", "success")
@@ -1108,7 +1831,7 @@ Slend37 снят с дистанции
         """Показывает статус парсера"""
         status_window = tk.Toplevel(self.root)
         status_window.title("Статус парсера Minecraft")
-        status_window.geometry("400x300")
+        status_window.geometry("520x520" if not self.ingestor else "560x640")
         
         # Делаем окно модальным
         status_window.transient(self.root)
@@ -1124,11 +1847,41 @@ Slend37 снят с дистанции
         
         # Статус
         skier_names = [sw.get_name() for sw in self.app.stopwatches]
+        offset_text = ""
+        if self.running and self.parser and self.parser.event_clock.offset is not None:
+            offset_text = f" (смещение часов сервера {self.parser.event_clock.offset:+.2f} сек)"
+        if self.running and self.parser:
+            scheduler = self.parser.poll_scheduler
+            poll_text = (f"{scheduler.interval * 1000:.0f} мс, "
+                         f"фактически {scheduler.effective_rate:.1f} опросов/сек")
+            telemetry_text = self.format_telemetry(self.parser.get_telemetry(), "        ")
+        elif self.running and self.ingestor:
+            # По строке статистики на каждый сервер
+            lines = []
+            for name, stats in self.ingestor.get_stats().items():
+                lines.append(
+                    f"\n          {name}: {'подключен' if stats['connected'] else 'нет связи'}, "
+                    f"{stats['messages']} сообщ., {stats['bytes'] // 1024} KB, "
+                    f"опрос {stats['poll_interval'] * 1000:.0f} мс, "
+                    f"переподключений {stats['reconnects']}"
+                )
+                lines.append("\n" + self.format_telemetry(stats['telemetry'], "            "))
+            if isinstance(self.ingestor, ProcessIngestor):
+                lines.append(f"\n          процесс PID {self.ingestor.pid}, перезапусков {self.ingestor.restarts}")
+            poll_text = "по серверам:" + "".join(lines)
+            telemetry_text = ""
+        else:
+            poll_text = "-"
+            telemetry_text = ""
         status_text = f"""
         Состояние: {'АКТИВЕН' if self.running else 'НЕ АКТИВЕН'}
         
         Автоматический режим: {'ВКЛЮЧЕН' if self.auto_mode else 'ВЫКЛЮЧЕН'}
         
+        Время событий: {'по логу' if self.event_time_mode else 'по моменту обработки'}{offset_text}
+        
+        Интервал опроса: {poll_text}
+{telemetry_text}
         Лыжники: {', '.join(skier_names)}
         
         Парсер ожидает сообщения от командных блоков...
@@ -1149,6 +1902,17 @@ Slend37 снят с дистанции
         )
         status_label.pack()
         
+        # Снимок телеметрии в файл (для разбора задержек после трансляции)
+        if self.running and (self.parser or self.ingestor):
+            tk.Button(
+                status_window,
+                text="Экспорт телеметрии",
+                command=self.export_telemetry,
+                bg="#607D8B",
+                fg="white",
+                width=20
+            ).pack(pady=(5, 0))
+        
         # Кнопка закрытия
         tk.Button(
             status_window,
@@ -1161,11 +1925,69 @@ Slend37 снят с дистанции
         
         self.center_window(status_window)
     
+    def format_telemetry(self, snapshot, indent):
+        """
+        Описание телеметрии соединения для окна статуса
+        
+        Args:
+            snapshot: Снимок SFTPChatMonitor.get_telemetry()
+            indent: Отступ строк
+            
+        Returns:
+            str: Строки с задержками запросов, объемом опросов и отставанием
+        """
+        histograms = snapshot['histograms']
+        poll_bytes = histograms['poll_bytes']
+        poll_lines = histograms['poll_lines']
+        lag = histograms['lag_bytes']
+        lines = [
+            f"Задержка (p50 / p99): stat {self.format_latency(histograms['stat_rtt_us'])}, "
+            f"чтение {self.format_latency(histograms['read_rtt_us'])}",
+            f"За опрос (p50 / max): {poll_bytes['p50'] or 0} / {poll_bytes['max'] or 0} байт, "
+            f"{poll_lines['p50'] or 0} / {poll_lines['max'] or 0} строк ({snapshot['polls']} опросов)",
+            f"Отставание: {snapshot['lag_bytes'] // 1024} KB (max {(lag['max'] or 0) // 1024} KB), "
+            f"переподключений {snapshot['reconnects']}, неудачных попыток {snapshot['reconnect_failures']}",
+            f"Кодировка: {snapshot['encoding'] or 'еще не определена'}, "
+            f"недекодированных байтов {snapshot['replaced_bytes']}"
+        ]
+        if snapshot.get('standby'):
+            gap = histograms['failover_gap_ms']
+            last_gap = f", последний перерыв {snapshot['failover_log'][-1]['gap']:.2f} сек" \
+                if snapshot['failover_log'] else ""
+            lines.append(f"Резерв: {snapshot['standby']}, переключений {snapshot['failovers']} "
+                         f"(max перерыв {(gap['max'] or 0) / 1000:.2f} сек{last_gap})")
+        return "".join(f"{indent}{line}\n" for line in lines)
+    
+    @staticmethod
+    def format_latency(histogram):
+        """Медиана и 99-й процентиль задержки в миллисекундах"""
+        if not histogram['count']:
+            return "-"
+        return f"{histogram['p50'] / 1000:.1f} / {histogram['p99'] / 1000:.1f} мс"
+    
+    def export_telemetry(self):
+        """Сохраняет снимок телеметрии парсера в JSON файл"""
+        try:
+            if self.ingestor:
+                path = self.ingestor.export_telemetry()
+            elif self.parser:
+                path = self.parser.export_telemetry()
+            else:
+                return
+        except OSError as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить телеметрию: {e}")
+            return
+        messagebox.showinfo("Телеметрия", f"Снимок телеметрии сохранен в файл:\n{path}")
+    
     def stop_parser(self):
         """Останавливает парсер"""
-        if self.running and self.parser:
+        if self.running and (self.parser or self.ingestor):
             self.running = False
-            if self.parser_thread:
+            if self.ingestor:
+                self.ingestor.stop()
+                self.ingestor = None
+            # Поток, который еще подключается, завершится сам - не ждем сеть
+            if self.parser_thread and self.parser and self.parser.connected:
                 self.parser_thread.join(timeout=2)
             
             self.update_ui_state(False)
@@ -1,20 +1,2671 @@
 # [file name]: parsing.py (обновленная версия)
 import os
 import sys
+import codecs
+import contextlib
+import gzip
+import queue
+import posixpath
+import random
 import time
 import re
+import select
+import shlex
 import threading
+from collections import deque, namedtuple
 from datetime import datetime
-import paramiko
 import hashlib
+import json
+
+# Разбор строки командного блока за один проход: время, координаты и сообщение
+#   Ванильный формат: [HH:MM:SS] [Server thread/INFO]: [@] сообщение
+#   С координатами:   [HH:MM:SS] [Server thread/INFO]: [@ X Y Z] сообщение
+#   Формат Paper:     [HH:MM:SS INFO]: [@] сообщение
+COMMAND_BLOCK_RE = re.compile(
+    r'\[(?P<timestamp>\d{2}:\d{2}:\d{2})'
+    r'(?:\]\s+\[[^\]]+\]:\s*\[\s*(?P<at>@)(?:\s+(?P<x>[-\d]+)\s+(?P<y>[-\d]+)\s+(?P<z>[-\d]+))?'
+    r'|\s+INFO\]:\s*\[\s*(?P<paper_at>@))'
+    r'\s*\]\s*(?P<message>.+)'
+)
+
+# Полный набор паттернов для нестандартных строк, которые не разобрал COMMAND_BLOCK_RE
+LEGACY_PATTERNS = [re.compile(pattern) for pattern in (
+    # Формат: [HH:MM:SS] [Server thread/INFO]: [@] сообщение
+    # Пример: [03:18:20] [Server thread/INFO]: [@] Прошел кт
+    r'\[(\d{2}:\d{2}:\d{2})\]\s+\[[^\]]+\]:\s*\[\s*@\s*\]\s*(.+)',
+    
+    # Формат с координатами: [HH:MM:SS] [Server thread/INFO]: [@ X Y Z] сообщение
+    r'\[(\d{2}:\d{2}:\d{2})\]\s+\[[^\]]+\]:\s*\[\s*@\s+[^\]]+\]\s*(.+)',
+    
+    # Альтернативный формат: [HH:MM:SS INFO]: [@] сообщение
+    r'\[(\d{2}:\d{2}:\d{2})\][^\]]*INFO[^\]]*]:\s*\[\s*@\s*\]\s*(.+)',
+    
+    # Формат Paper: [HH:MM:SS INFO]: [@] сообщение
+    r'\[(\d{2}:\d{2}:\d{2})\s+INFO\]:\s*\[\s*@\s*\]\s*(.+)',
+)]
+
+MARKER_COORDS_RE = re.compile(r'\[\s*@\s+([-\d]+)\s+([-\d]+)\s+([-\d]+)\s*\]')
+COORDS_RE = re.compile(r'([-\d]+)\s+([-\d]+)\s+([-\d]+)')
+TIMESTAMP_RE = re.compile(r'\[(\d{2}:\d{2}:\d{2})\]')
+
+# Байты, не декодированные в выбранной кодировке (errors='surrogateescape')
+ESCAPED_BYTE_RE = re.compile('[\udc80-\udcff]')
+HIGH_BYTE_RE = re.compile(rb'[\x80-\xff]')  # Байт вне ASCII (выбор кодировки лога)
+
+# Архив лога после ротации: YYYY-MM-DD-N.log (до сжатия) или YYYY-MM-DD-N.log.gz
+ROTATED_LOG_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})-(\d+)\.log(\.gz)?$')
+
+class LocationRegistry:
+    """
+    Реестр местоположений командных блоков
+    
+    Координаты разбираются в кортеж целых чисел один раз и получают
+    небольшой целый номер. Дальше статистика и история работают с номером:
+    поиск по номеру - индекс в списке, по координатам - один словарь.
+    """
+    
+    GLOBAL = 0   # Сообщение без координат ([@])
+    UNKNOWN = 1  # Маркер есть, но координаты не найдены
+    
+    def __init__(self):
+        self.names = ['global', 'unknown']  # Название по номеру
+        self.coords = [None, None]  # Координаты (x, y, z) по номеру
+        self.ids = {}  # Номер по координатам
+        self.lock = threading.Lock()
+    
+    def intern(self, x, y, z):
+        """
+        Возвращает номер местоположения, при первой встрече регистрирует его
+        
+        Args:
+            x, y, z: Координаты из строки лога (строки)
+            
+        Returns:
+            int: Номер местоположения
+        """
+        try:
+            key = (int(x), int(y), int(z))
+        except ValueError:
+            # Выражение допускает строки вроде '1-2' - такие координаты храним как есть
+            key = (x, y, z)
+        
+        location_id = self.ids.get(key)
+        if location_id is None:
+            with self.lock:
+                location_id = self.ids.get(key)
+                if location_id is None:
+                    location_id = len(self.names)
+                    self.names.append(f"X{x}Y{y}Z{z}")
+                    self.coords.append(key)
+                    self.ids[key] = location_id
+        return location_id
+    
+    def lookup(self, x, y, z):
+        """Номер местоположения по целым координатам (None - не встречалось)"""
+        return self.ids.get((x, y, z))
+    
+    def name(self, location_id):
+        """Название местоположения (XxYyZz, 'global' или 'unknown')"""
+        return self.names[location_id]
+    
+    def coordinates(self, location_id):
+        """Координаты (x, y, z) местоположения (None для 'global' и 'unknown')"""
+        return self.coords[location_id]
+    
+    def __len__(self):
+        return len(self.names)
+
+
+# Общий реестр: номера местоположений одинаковы для всех источников
+LOCATIONS = LocationRegistry()
+
+class CommandBlockMessage:
+    """
+    Разобранное сообщение командного блока
+    
+    Объект со __slots__ вместо словаря на каждую строку: нет словаря
+    атрибутов и строковых ключей. Исходная строка лога хранится, только
+    если она нужна (SFTPChatMonitor.keep_raw_lines).
+    """
+    
+    __slots__ = ('timestamp', 'location_id', 'message', 'raw', 'source', 'event_time', 'delivery')
+    
+    type = 'command_block'
+    
+    def __init__(self, timestamp, location_id, message, raw=None):
+        """
+        Args:
+            timestamp: Время из лога HH:MM:SS
+            location_id: Номер местоположения в LOCATIONS
+            message: Текст сообщения
+            raw: Исходная строка лога (None - не сохранялась)
+        """
+        self.timestamp = timestamp
+        self.location_id = location_id
+        self.message = message
+        self.raw = raw
+        self.source = None  # Название сервера при чтении нескольких серверов
+        self.event_time = None  # Время события по часам этого компьютера (datetime)
+        self.delivery = None  # (контрольная точка, номер чтения) до подтверждения доставки
+    
+    def __repr__(self):
+        return f"CommandBlockMessage({self.timestamp!r}, {self.location!r}, {self.message!r})"
+    
+    @property
+    def location(self):
+        """Координаты командного блока (XxYyZz), 'global' или 'unknown'"""
+        return LOCATIONS.names[self.location_id]
+    
+    @property
+    def coordinates(self):
+        """Координаты (x, y, z) целыми числами или None"""
+        return LOCATIONS.coords[self.location_id]
+
+
+# Компактные записи истории: кортеж вместо словаря на каждое сообщение
+HistoryRecord = namedtuple('HistoryRecord', 'timestamp location_id message processed_at')
+LocationMessage = namedtuple('LocationMessage', 'timestamp message')
+
+class LineFramer:
+    """
+    Нарезает поток байтов лога на полные строки
+    
+    Хвост без перевода строки остается в буфере до следующего чтения,
+    поэтому строка, разрезанная границей чтения, не теряется и не
+    разбирается как две испорченные половинки.
+    """
+    
+    def __init__(self):
+        self.carry = bytearray()  # Незавершенная строка с прошлого чтения
+        self.skip_partial = False  # Чтение началось с середины строки - ее остаток отбросить
+        self.discarded = 0  # Сколько байтов отброшено при последнем feed
+    
+    def feed(self, data):
+        """
+        Принимает очередной кусок байтов и отдает только полные строки
+        
+        Кусок не склеивается и не копируется целиком: из буфера достраивается
+        только первая строка, остальные полные строки отдаются диапазоном
+        поверх исходных данных.
+        
+        Args:
+            data: Новые байты из лога (bytes)
+            
+        Returns:
+            list: Диапазоны (буфер, начало, конец), каждый из полных строк
+        """
+        self.discarded = 0
+        if self.skip_partial:
+            # Начало первой строки не прочитано - ее остаток не разбираем
+            first_newline = data.find(b'\n')
+            if first_newline == -1:
+                self.discarded = len(data)
+                return []
+            self.skip_partial = False
+            self.discarded = first_newline + 1
+            data = data[first_newline + 1:]
+        
+        last_newline = data.rfind(b'\n')
+        if last_newline == -1:
+            # Перевода строки нет - вся порция уходит в буфер
+            self.carry += data
+            return []
+        
+        spans = []
+        start = 0
+        if self.carry:
+            # Достраиваем строку, начатую в прошлом чтении
+            first_newline = data.find(b'\n')
+            self.carry += memoryview(data)[:first_newline + 1]
+            first_line = bytes(self.carry)
+            spans.append((first_line, 0, len(first_line)))
+            self.carry.clear()
+            start = first_newline + 1
+        
+        if start <= last_newline:
+            spans.append((data, start, last_newline + 1))
+        
+        # Запоминаем хвост до следующего чтения
+        self.carry += memoryview(data)[last_newline + 1:]
+        return spans
+    
+    @property
+    def pending(self):
+        """Количество байтов незавершенной строки в буфере"""
+        return len(self.carry)
+    
+    def reset(self):
+        """Сбрасывает незавершенную строку (при переходе на другую позицию файла)"""
+        self.carry.clear()
+        self.skip_partial = False
+
+
+class StreamDecoder:
+    """
+    Декодер потока байтов лога
+    
+    Лог считается UTF-8: строка, которая строго декодируется как UTF-8,
+    всегда так и декодируется (текст cp1251 с кириллицей почти никогда не
+    бывает корректным UTF-8). По последним window строкам вне ASCII
+    ведется учет: только если некорректный UTF-8 в большинстве из них,
+    такие строки декодируются как cp1251. Одиночный мусорный байт или
+    обрезанный символ кодировку не переключают, а когда корректные строки
+    UTF-8 снова преобладают, декодер возвращается к UTF-8.
+    
+    Порции, которые могут оборваться посреди символа (final=False, поток
+    stderr), декодируются инкрементально: незавершенная последовательность
+    дожидается следующей порции. Недекодируемые байты заменяются на U+FFFD
+    и подсчитываются.
+    """
+    
+    def __init__(self, encoding=None, window=32, min_lines=3):
+        """
+        Args:
+            encoding: Кодировка потока или None - определять по строкам
+            window: Сколько последних строк вне ASCII учитывается при выборе
+            min_lines: Сколько строк должно свидетельствовать за смену кодировки
+        """
+        self.fixed = encoding is not None  # Кодировка задана явно
+        self.encoding = encoding  # None - строк вне ASCII еще не было
+        self.decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='surrogateescape')
+        self.window = window
+        self.min_lines = min_lines
+        self.recent = deque()  # True - строка корректна в UTF-8
+        self.recent_invalid = 0
+        self.replaced_bytes = 0  # Сколько байтов заменено на U+FFFD
+    
+    def observe(self, valid):
+        """Учитывает строку вне ASCII и при явном перевесе меняет кодировку"""
+        if len(self.recent) == self.window:
+            self.recent_invalid -= not self.recent.popleft()
+        self.recent.append(valid)
+        self.recent_invalid += not valid
+        
+        invalid = self.recent_invalid
+        valid_count = len(self.recent) - invalid
+        if self.encoding != 'cp1251' and invalid >= self.min_lines and invalid > valid_count:
+            self.encoding = 'cp1251'
+        elif self.encoding != 'utf-8' and (valid_count >= self.min_lines and valid_count > invalid or
+                                           self.encoding is None and valid):
+            self.encoding = 'utf-8'
+    
+    def sample(self, buf, start, end):
+        """
+        Учитывает строки вне ASCII из диапазона полных строк лога
+        
+        Пока окно учета не заполнено, кодировка выбирается не только по
+        строкам командных блоков, но и по чату и остальным строкам - первые
+        команды лога в cp1251 уже декодируются правильно.
+        """
+        pos = start
+        while not self.fixed and len(self.recent) < self.window:
+            match = HIGH_BYTE_RE.search(buf, pos, end)
+            if match is None:
+                return
+            line_start = max(start, buf.rfind(b'\n', start, match.start()) + 1)
+            line_end = buf.find(b'\n', match.start(), end)
+            if line_end == -1:
+                line_end = end
+            try:
+                str(buf[line_start:line_end], 'utf-8')
+                self.observe(True)
+            except UnicodeDecodeError:
+                self.observe(False)
+            pos = line_end + 1
+    
+    def decode(self, data, final=False):
+        """
+        Декодирует очередную порцию байтов
+        
+        Args:
+            data: Байты (bytes или memoryview)
+            final: Порция заканчивается на границе символа (например, полная
+                строка) - незавершенная последовательность считается ошибкой
+        
+        Returns:
+            str: Текст порции
+        """
+        if self.fixed or not final or self.decoder.getstate()[0]:
+            return self.replace_escaped(self.decoder.decode(data, final))
+        
+        if data.isascii() if isinstance(data, bytes) else bytes(data).isascii():
+            return str(data, 'ascii')
+        try:
+            text = str(data, 'utf-8')
+        except UnicodeDecodeError:
+            self.observe(False)
+        else:
+            self.observe(True)
+            return text
+        
+        if self.encoding == 'cp1251':
+            return self.replace_escaped(str(data, 'cp1251', 'surrogateescape'))
+        return self.replace_escaped(str(data, 'utf-8', 'surrogateescape'))
+    
+    def replace_escaped(self, text):
+        """Заменяет недекодированные байты на U+FFFD и считает их"""
+        if ESCAPED_BYTE_RE.search(text):
+            text, replaced = ESCAPED_BYTE_RE.subn('\ufffd', text)
+            self.replaced_bytes += replaced
+        return text
+
+
+def scan_command_lines(buf, start, end):
+    """
+    Находит в байтах лога строки командных блоков, не декодируя остальное
+    
+    Маркеры [@ и [ @ ищутся прямо в байтах через bytes.find, границы
+    строки определяются по соседним переводам строки. Чат и сообщения
+    плагинов (подавляющая часть лога) пропускаются без декодирования.
+    
+    Args:
+        buf: Байты лога
+        start: Начало диапазона полных строк
+        end: Конец диапазона полных строк
+        
+    Yields:
+        tuple: (начало строки, конец строки без перевода строки)
+    """
+    pos = start
+    next_plain = buf.find(b'[@', pos, end)
+    next_spaced = buf.find(b'[ @', pos, end)
+    
+    while next_plain != -1 or next_spaced != -1:
+        if next_spaced == -1 or (next_plain != -1 and next_plain < next_spaced):
+            hit = next_plain
+        else:
+            hit = next_spaced
+        
+        line_start = buf.rfind(b'\n', pos, hit) + 1 or pos
+        line_end = buf.find(b'\n', hit, end)
+        if line_end == -1:
+            line_end = end
+        
+        yield line_start, line_end
+        
+        # Продолжаем поиск со следующей строки
+        pos = line_end + 1
+        if pos >= end:
+            break
+        if next_plain != -1 and next_plain < pos:
+            next_plain = buf.find(b'[@', pos, end)
+        if next_spaced != -1 and next_spaced < pos:
+            next_spaced = buf.find(b'[ @', pos, end)
+
+
+class SeenLineIndex:
+    """
+    Ограниченный индекс уже обработанных строк командных блоков
+    
+    Ключ строки - (отпечаток файла, смещение строки в файле, хеш строки).
+    У хвоста старого файла из архива это отпечаток и смещения старого файла
+    (сохраненная позиция плюс положение в хвосте), поэтому две одинаковые
+    законные строки не склеиваются в одну. Хеш различает строки короткого
+    нового файла, пока его отпечаток еще не известен. Хранятся только
+    последние capacity ключей, поэтому память не растет за весь день гонки;
+    повторно прочитанное окно после подключения заведомо меньше емкости.
+    """
+    
+    def __init__(self, capacity=4096):
+        """
+        Args:
+            capacity: Сколько последних строк помнить
+        """
+        self.capacity = capacity
+        self.keys = set()
+        self.order = deque()
+        self.duplicates = 0  # Сколько повторов отброшено
+    
+    @staticmethod
+    def line_hash(line):
+        """Короткий хеш содержимого строки (bytes или memoryview)"""
+        return hashlib.blake2b(line, digest_size=8).digest()
+    
+    def seen(self, key):
+        """
+        Проверяет строку и запоминает ее
+        
+        Returns:
+            bool: True если строка уже обрабатывалась (повтор)
+        """
+        if key in self.keys:
+            self.duplicates += 1
+            return True
+        
+        self.keys.add(key)
+        self.order.append(key)
+        if len(self.order) > self.capacity:
+            self.keys.discard(self.order.popleft())
+        return False
+    
+    def __len__(self):
+        return len(self.keys)
+
+
+class AdaptivePollScheduler:
+    """
+    Адаптивный интервал опроса лога
+    
+    Пока идут сообщения командных блоков, опрашиваем как можно чаще.
+    Когда лог молчит, интервал растет экспоненциально до потолка.
+    Первый же новый байт возвращает быстрый опрос.
+    """
+    
+    def __init__(self, min_interval=0.02, base_interval=0.1, max_interval=1.0, backoff=1.5):
+        """
+        Args:
+            min_interval: Интервал, пока приходят сообщения командных блоков (сек)
+            base_interval: Интервал, когда в лог пишется что-то другое (сек)
+            max_interval: Потолок интервала при простое лога (сек)
+            backoff: Множитель роста интервала при простое
+        """
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = base_interval
+        
+        # Фактическая частота опроса (экспоненциальное скользящее среднее)
+        self.last_poll_time = None
+        self.avg_poll_period = None
+    
+    def observe(self, new_bytes, command_lines):
+        """
+        Учитывает результат опроса и возвращает паузу до следующего
+        
+        Args:
+            new_bytes: Сколько байтов прочитано на этом опросе
+            command_lines: Сколько сообщений командных блоков разобрано
+            
+        Returns:
+            float: Интервал до следующего опроса в секундах
+        """
+        now = time.time()
+        if self.last_poll_time is not None:
+            period = now - self.last_poll_time
+            if self.avg_poll_period is None:
+                self.avg_poll_period = period
+            else:
+                self.avg_poll_period += (period - self.avg_poll_period) * 0.2
+        self.last_poll_time = now
+        
+        if command_lines:
+            self.interval = self.min_interval
+        elif new_bytes:
+            self.interval = min(self.interval, self.base_interval)
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        
+        return self.interval
+    
+    @property
+    def effective_rate(self):
+        """Фактическое количество опросов в секунду"""
+        if not self.avg_poll_period:
+            return 0.0
+        return 1.0 / self.avg_poll_period
+
+
+class ReconnectBackoff:
+    """
+    Паузы между попытками переподключения
+    
+    Пауза растет экспоненциально от base_delay до max_delay, попытки не
+    прекращаются. Случайный разброс не дает нескольким клиентам стучаться
+    на сервер одновременно после общего обрыва. Ожидание не блокирует:
+    вызывающий код сам спрашивает ready() на каждом витке своего цикла.
+    """
+    
+    def __init__(self, base_delay=1.0, max_delay=60.0, factor=2.0, jitter=0.5):
+        """
+        Args:
+            base_delay: Пауза после первой неудачной попытки (сек)
+            max_delay: Потолок паузы (сек)
+            factor: Множитель роста паузы
+            jitter: Доля паузы, на которую она случайно сокращается (0..1)
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0  # Неудачных попыток подряд
+        self.next_attempt_time = 0.0
+    
+    def ready(self):
+        """Пора ли делать следующую попытку"""
+        return time.monotonic() >= self.next_attempt_time
+    
+    def remaining(self):
+        """Сколько секунд осталось до следующей попытки"""
+        return max(0.0, self.next_attempt_time - time.monotonic())
+    
+    def failed(self):
+        """
+        Учитывает неудачную попытку
+        
+        Returns:
+            float: Пауза до следующей попытки в секундах
+        """
+        delay = min(self.max_delay, self.base_delay * self.factor ** self.attempts)
+        delay *= 1 - self.jitter * random.random()
+        self.attempts += 1
+        self.next_attempt_time = time.monotonic() + delay
+        return delay
+    
+    def succeeded(self):
+        """Сбрасывает паузу после успешного подключения"""
+        self.attempts = 0
+        self.next_attempt_time = 0.0
+
+
+class WarmSession:
+    """Заранее установленное соединение с одним сервером (запись SSHSessionPool)"""
+    
+    __slots__ = ('host', 'port', 'username', 'password', 'ssh_client', 'sftp_client',
+                 'state', 'error', 'settled', 'backoff', 'connected_at', 'handshake_seconds')
+    
+    def __init__(self, host, port, username, password):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.ssh_client = None
+        self.sftp_client = None
+        # 'connecting', 'checking', 'ready', 'failed' или 'attached' (отдано источнику)
+        self.state = 'failed'
+        self.error = None
+        self.settled = threading.Event()  # Подключение или проверка завершены
+        self.settled.set()
+        self.backoff = ReconnectBackoff(base_delay=2.0, max_delay=60.0)
+        self.connected_at = None
+        self.handshake_seconds = None
+
+
+class SSHSessionPool:
+    """
+    Заранее установленные SSH/SFTP соединения
+    
+    Рукопожатие SSH, аутентификация и открытие SFTP выполняются в фоновых
+    потоках заранее (например, при запуске программы по сохраненным
+    профилям). Транспорт поддерживается keepalive-пакетами, простаивающие
+    соединения периодически проверяются и при обрыве устанавливаются
+    заново. SFTPLogSource.connect забирает готовое соединение через
+    acquire, а при остановке парсера возвращает его через release - повторный
+    запуск тоже обходится без рукопожатия.
+    """
+    
+    def __init__(self, keepalive_interval=15, check_interval=10.0, connect_timeout=30,
+                 probe_timeout=5.0):
+        """
+        Args:
+            keepalive_interval: Интервал keepalive-пакетов SSH (сек)
+            check_interval: Как часто проверять простаивающие соединения (сек)
+            connect_timeout: Таймаут подключения, баннера и аутентификации (сек)
+            probe_timeout: Сколько ждать ответа на проверочный запрос SFTP (сек)
+        """
+        self.keepalive_interval = keepalive_interval
+        self.check_interval = check_interval
+        self.connect_timeout = connect_timeout
+        self.probe_timeout = probe_timeout
+        self.sessions = {}  # (хост, порт, пользователь) -> WarmSession
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+    
+    def open_session(self, host, port, username, password):
+        """
+        Устанавливает SSH соединение и открывает SFTP (блокирующий вызов)
+        
+        Returns:
+            tuple: (paramiko.SSHClient, paramiko.SFTPClient)
+        """
+        import paramiko  # Нужен только для SSH: разбор и локальные источники работают без него
+        
+        ssh_client = paramiko.SSHClient()
+        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh_client.connect(
+            hostname=host,
+            port=port,
+            username=username,
+            password=password,
+            timeout=self.connect_timeout,
+            banner_timeout=self.connect_timeout,
+            auth_timeout=self.connect_timeout
+        )
+        try:
+            # Keepalive не дает NAT и серверу закрыть простаивающий транспорт
+            ssh_client.get_transport().set_keepalive(self.keepalive_interval)
+            sftp_client = ssh_client.open_sftp()
+        except Exception:
+            ssh_client.close()
+            raise
+        return ssh_client, sftp_client
+    
+    def prewarm(self, host, port, username, password):
+        """
+        Начинает подключение к серверу в фоне
+        
+        Повторный вызов с теми же параметрами ничего не делает; с другим
+        паролем - заменяет соединение.
+        """
+        key = (host, int(port), username)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session and session.password == password:
+                return
+            if session:
+                self.close_session(session)
+            session = WarmSession(host, int(port), username, password)
+            self.sessions[key] = session
+            self.start_warm_up(session)
+            
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+    
+    def start_warm_up(self, session):
+        """Запускает подключение в отдельном потоке (вызывается под self.lock)"""
+        session.state = 'connecting'
+        session.error = None
+        session.settled.clear()
+        threading.Thread(target=self.warm_up, args=(session,), daemon=True).start()
+    
+    def warm_up(self, session):
+        """
+        Подключается к серверу записи session (в фоновом потоке)
+        
+        Если источник не дождался подключения и забрал запись (attached),
+        результат не применяется: иначе то же соединение выдали бы дважды.
+        """
+        started = time.monotonic()
+        try:
+            clients = self.open_session(session.host, session.port, session.username, session.password)
+        except Exception as e:
+            with self.lock:
+                if session.state != 'connecting':
+                    return  # Источник уже подключается сам
+                session.state = 'failed'
+                session.error = str(e) or e.__class__.__name__
+                delay = session.backoff.failed()
+                session.settled.set()
+            print(f"[SSH Pool] Не удалось подключиться к {session.host}:{session.port}: "
+                  f"{session.error}, следующая попытка через {delay:.1f} сек")
+            return
+        
+        with self.lock:
+            if (self.sessions.get((session.host, session.port, session.username)) is not session or
+                    session.state != 'connecting'):
+                # Профиль заменен, пул закрыт или источник перестал ждать, пока шло подключение
+                for client in reversed(clients):
+                    client.close()
+                session.settled.set()
+                return
+            session.ssh_client, session.sftp_client = clients
+            session.state = 'ready'
+            session.connected_at = time.time()
+            session.handshake_seconds = time.monotonic() - started
+            session.backoff.succeeded()
+            session.settled.set()
+        print(f"[SSH Pool] Соединение с {session.host}:{session.port} готово "
+              f"за {session.handshake_seconds:.2f} сек")
+    
+    @staticmethod
+    def is_alive(ssh_client, sftp_client):
+        """Открыт ли транспорт SSH и канал SFTP (без обращения к серверу)"""
+        transport = ssh_client.get_transport() if ssh_client else None
+        return bool(transport and transport.is_active() and sftp_client and
+                    not sftp_client.get_channel().closed)
+    
+    def probe(self, session):
+        """
+        Проверяет простаивающее соединение одним запросом SFTP
+        
+        Keepalive сам по себе не замечает молча пропавшую сеть, а ответ
+        на запрос - замечает не позже чем через probe_timeout.
+        """
+        if not self.is_alive(session.ssh_client, session.sftp_client):
+            return False
+        channel = session.sftp_client.get_channel()
+        try:
+            channel.settimeout(self.probe_timeout)
+            session.sftp_client.normalize('.')
+            return True
+        except Exception:
+            return False
+        finally:
+            try:
+                channel.settimeout(None)
+            except Exception:
+                pass
+    
+    def run(self):
+        """Фоновая проверка простаивающих соединений и повторное подключение"""
+        while not self.stop_event.wait(self.check_interval):
+            with self.lock:
+                checking = []
+                for session in self.sessions.values():
+                    if session.state == 'ready':
+                        session.state = 'checking'
+                        session.settled.clear()
+                        checking.append(session)
+                    elif session.state == 'failed' and session.backoff.ready():
+                        self.start_warm_up(session)
+            
+            for session in checking:
+                alive = self.probe(session)
+                with self.lock:
+                    if session.state != 'checking':
+                        continue  # Источник не дождался проверки и забрал запись
+                    if alive:
+                        session.state = 'ready'
+                    else:
+                        print(f"[SSH Pool] Соединение с {session.host}:{session.port} потеряно, "
+                              f"переподключение")
+                        self.close_session(session)
+                        session.state = 'failed'
+                        session.error = "соединение потеряно"
+                    session.settled.set()
+    
+    def acquire(self, host, port, username, password):
+        """
+        Забирает готовое соединение
+        
+        Если соединение еще устанавливается или проверяется, ждет его
+        (вызывается из потока чтения, а не интерфейса). Пока источник
+        держит соединение, пул не открывает к серверу второе.
+        
+        Returns:
+            tuple: (SSHClient, SFTPClient) или None - готового соединения нет,
+                   подключаться нужно самому
+        """
+        key = (host, int(port), username)
+        with self.lock:
+            session = self.sessions.get(key)
+        if session is None or session.password != password:
+            return None
+        session.settled.wait(self.connect_timeout + self.probe_timeout)
+        
+        with self.lock:
+            clients = None
+            if session.state == 'ready' and self.is_alive(session.ssh_client, session.sftp_client):
+                clients = (session.ssh_client, session.sftp_client)
+            else:
+                self.close_session(session)
+            session.ssh_client = session.sftp_client = None
+            session.state = 'attached'
+            session.settled.set()
+        return clients
+    
+    def release(self, host, port, username, ssh_client, sftp_client):
+        """
+        Возвращает соединение после остановки источника
+        
+        Returns:
+            bool: True если пул забрал соединение (живое остается готовым,
+                  оборванное закрывается и будет установлено заново)
+        """
+        key = (host, int(port), username)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None or session.state != 'attached':
+                return False
+            session.ssh_client, session.sftp_client = ssh_client, sftp_client
+            if self.is_alive(ssh_client, sftp_client):
+                session.state = 'ready'
+            else:
+                self.close_session(session)
+                session.state = 'failed'
+        return True
+    
+    def status(self, host, port, username):
+        """
+        Состояние заранее установленного соединения для интерфейса
+        
+        Returns:
+            dict или None, если сервер не подключается заранее
+        """
+        try:
+            session = self.sessions.get((host, int(port), username))
+        except ValueError:
+            return None
+        if session is None:
+            return None
+        return {
+            'state': session.state,
+            'error': session.error,
+            'connected_at': session.connected_at,
+            'handshake_seconds': session.handshake_seconds
+        }
+    
+    @staticmethod
+    def close_session(session):
+        """Закрывает клиентов записи (вызывается под self.lock)"""
+        for client in (session.sftp_client, session.ssh_client):
+            if client:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+        session.ssh_client = session.sftp_client = None
+    
+    def close(self):
+        """Закрывает все простаивающие соединения и останавливает проверку"""
+        self.stop_event.set()
+        with self.lock:
+            for session in self.sessions.values():
+                if session.state != 'attached':
+                    self.close_session(session)
+            self.sessions.clear()
+
+
+SSH_SESSIONS = SSHSessionPool()
+
+
+class EventClock:
+    """
+    Время событий лога по часам этого компьютера
+    
+    Лог пишет время по часам сервера и с точностью до секунды, а прочитанная
+    строка доходит до нас с задержкой опроса. Для каждой строки разность
+    "момент прочтения - время в логе" не меньше смещения часов сервера плюс
+    минимальная задержка доставки, поэтому минимум по скользящему окну
+    непрерывно оценивает это смещение. Постоянная минимальная задержка
+    одинакова для старта и кругов и на время круга не влияет.
+    
+    Доля секунды восстанавливается по окну прочтения: строка появилась в логе
+    после предыдущего опроса и до текущего. Пересечение этого окна с секундой
+    из лога дает момент события; несколько строк одной секунды распределяются
+    по пересечению в порядке следования.
+    
+    Смещение оценивается только по строкам, прочитанным у конца файла:
+    старый хвост, догоняющее чтение и продолжение с контрольной точки
+    прочитаны намного позже, чем записаны, и завысили бы смещение. Пока
+    таких строк нет, используется смещение из контрольной точки или ноль.
+    """
+    
+    def __init__(self, window=256):
+        """
+        Args:
+            window: Сколько последних строк учитывать при оценке смещения
+        """
+        self.samples = deque(maxlen=window)
+        self.offset = None  # Смещение "локальные часы - часы сервера" (сек)
+    
+    def log_seconds(self, timestamp, arrival):
+        """
+        Переводит HH:MM:SS из лога в секунды эпохи по часам сервера
+        
+        Дата берется по оценке текущего времени сервера; метка, отстоящая
+        от него больше чем на 12 часов, относится к соседним суткам.
+        """
+        try:
+            hours, minutes, seconds = (int(part) for part in timestamp.split(':'))
+        except (ValueError, AttributeError):
+            return None
+        
+        server_now = arrival - (self.offset or 0.0)
+        day = datetime.fromtimestamp(server_now)
+        value = day.replace(hour=hours, minute=minutes, second=seconds, microsecond=0).timestamp()
+        if value - server_now > 12 * 3600:
+            value -= 86400
+        elif server_now - value > 12 * 3600:
+            value += 86400
+        return value
+    
+    def stamp(self, timestamps, window_start, window_end, sample=True):
+        """
+        Вычисляет время событий для строк, прочитанных за один опрос
+        
+        Args:
+            timestamps: Метки HH:MM:SS строк в порядке следования в логе
+            window_start: Момент предыдущего опроса (time.time()) или None
+            window_end: Момент текущего опроса (time.time())
+            sample: Строки прочитаны у конца файла сразу после записи -
+                учитывать их в оценке смещения
+            
+        Returns:
+            list: datetime события для каждой строки (None, если метка не разобрана)
+        """
+        seconds = [self.log_seconds(timestamp, window_end) for timestamp in timestamps]
+        
+        if sample:
+            for value in seconds:
+                if value is not None:
+                    self.samples.append(window_end - value)
+            if self.samples:
+                self.offset = min(self.samples)
+        offset = self.offset or 0.0
+        
+        # Группы строк с одинаковой секундой распределяются внутри интервала
+        result = []
+        index = 0
+        while index < len(seconds):
+            value = seconds[index]
+            group_end = index
+            while group_end < len(seconds) and seconds[group_end] == value:
+                group_end += 1
+            count = group_end - index
+            
+            if value is None:
+                result.extend([None] * count)
+            else:
+                low = value + offset
+                high = low + 1.0
+                if window_start is not None:
+                    low_bound = max(low, window_start)
+                    high_bound = min(high, window_end)
+                    if low_bound <= high_bound:
+                        low, high = low_bound, high_bound
+                    else:
+                        # Окно опроса не пересекается с секундой (догоняющее чтение) - середина секунды
+                        low = high = low + 0.5
+                for position in range(count):
+                    event = low + (high - low) * (position + 1) / (count + 1)
+                    result.append(datetime.fromtimestamp(event))
+            index = group_end
+        
+        return result
+
+
+class TelemetryHistogram:
+    """
+    Гистограмма целых значений с корзинами по степеням двойки
+    
+    Запись - один bit_length() и увеличение счетчика в списке, без
+    выделения памяти на каждое значение. Минимум, максимум и среднее
+    точные, квантили оцениваются по верхней границе корзины (до 2 раз).
+    """
+    
+    def __init__(self, unit=''):
+        """
+        Args:
+            unit: Единица измерения значений (для отображения)
+        """
+        self.unit = unit
+        self.buckets = [0] * 65  # Корзина i - значения от 2**(i-1) до 2**i - 1
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+    
+    def record(self, value):
+        """Добавляет значение (отрицательные считаются нулем)"""
+        value = max(0, int(value))
+        self.buckets[min(value.bit_length(), 64)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+    
+    def percentile(self, fraction):
+        """
+        Оценка квантиля по корзинам
+        
+        Args:
+            fraction: Доля от 0 до 1 (0.5 - медиана)
+            
+        Returns:
+            int или None, если значений еще нет
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min((1 << index) - 1, self.max)
+        return self.max
+    
+    def snapshot(self):
+        """Текущее состояние гистограммы в виде словаря (для JSON)"""
+        return {
+            'unit': self.unit,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            # Верхняя граница корзины -> количество значений
+            'buckets': {(1 << index) - 1: bucket_count
+                        for index, bucket_count in enumerate(self.buckets) if bucket_count}
+        }
+
+
+class ConnectionTelemetry:
+    """
+    Телеметрия соединения и передачи данных лога
+    
+    Показывает, где теряется время: задержка запросов к серверу (stat и
+    чтение), объем каждого опроса, переподключения и отставание от конца
+    файла. Все хранится в памяти, запись стоит несколько целочисленных
+    операций.
+    """
+    
+    def __init__(self):
+        self.histograms = {
+            'stat_rtt_us': TelemetryHistogram('мкс'),  # Запрос размера файла
+            'read_rtt_us': TelemetryHistogram('мкс'),  # Чтение новых байтов
+            'poll_bytes': TelemetryHistogram('байт'),  # Байтов за опрос
+            'poll_lines': TelemetryHistogram('строк'),  # Строк лога за опрос
+            'lag_bytes': TelemetryHistogram('байт'),  # Отставание от конца файла после опроса
+            'failover_gap_ms': TelemetryHistogram('мс')  # Перерыв чтения при переключении на резерв
+        }
+        self.polls = 0
+        self.reconnects = 0  # Восстановлений связи после обрыва
+        self.reconnect_failures = 0  # Неудачных попыток переподключения
+        self.failovers = 0  # Переключений на резервный источник
+        self.lag_bytes = 0  # Текущее отставание от конца файла
+        self.started_at = datetime.now()
+    
+    def record_rtt(self, name, started):
+        """
+        Записывает время запроса к серверу
+        
+        Args:
+            name: 'stat_rtt_us' или 'read_rtt_us'
+            started: Значение time.perf_counter() перед запросом
+        """
+        self.histograms[name].record((time.perf_counter() - started) * 1000000)
+    
+    def record_poll(self, data, lag_bytes):
+        """
+        Записывает результат одного опроса
+        
+        Args:
+            data: Прочитанные байты (None или b'' - новых данных нет)
+            lag_bytes: Сколько байтов файла еще не прочитано
+        """
+        self.polls += 1
+        self.histograms['poll_bytes'].record(len(data) if data else 0)
+        self.histograms['poll_lines'].record(data.count(b'\n') if data else 0)
+        self.histograms['lag_bytes'].record(lag_bytes)
+        self.lag_bytes = lag_bytes
+    
+    def snapshot(self):
+        """
+        Снимок телеметрии
+        
+        Returns:
+            dict: started_at, polls, reconnects, reconnect_failures, failovers,
+                  lag_bytes и histograms - {название: снимок TelemetryHistogram}
+        """
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'polls': self.polls,
+            'reconnects': self.reconnects,
+            'reconnect_failures': self.reconnect_failures,
+            'failovers': self.failovers,
+            'lag_bytes': self.lag_bytes,
+            'histograms': {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+        }
+
+
+class LogSource:
+    """
+    Базовый источник данных лога
+    
+    Источник отвечает только за доставку новых байтов лога: подключение,
+    позицию чтения, ротацию файла и догоняющее чтение. Разбор строк
+    делает SFTPChatMonitor, которому источник передается при создании.
+    """
+    
+    log_prefix = "[Log Source]"
+    
+    def __init__(self, path):
+        """
+        Args:
+            path: Путь к файлу latest.log
+        """
+        self.path = path
+        self.connected = False
+        
+        # Позиция чтения и сборка полных строк
+        self.position = 0
+        self.framer = LineFramer()
+        self.decoder = StreamDecoder()  # Кодировка лога определяется один раз
+        
+        # Отпечаток файла - его первые байты. По нему при переподключении
+        # проверяется, что по пути лежит тот же файл и позиция в нем верна
+        self.fingerprint_size = 4096
+        self.head = None  # Известное начало файла (None - еще не прочитано)
+        self.identity_size = 64  # Сколько первых байтов задают короткий отпечаток файла
+        self.file_identity = None  # Хеш первых identity_size байтов (None - еще не известен)
+        self.pending_data = None  # Хвост старого файла, восстановленный при подключении
+        self.tail_origin = None  # (отпечаток, смещение) старого файла, с которого начинается хвост
+        self.rotated_retry_attempts = 5  # Сколько раз читать недописанный архив старого лога
+        self.rotated_retry_delay = 0.5  # Пауза между попытками (сек)
+        
+        # Контрольная точка чтения на диске (IngestionCheckpoint или None)
+        self.checkpoint = None
+        self.resumed_checkpoint = None  # Контрольная точка, с которой продолжено чтение
+        
+        # Догоняющее чтение отставания (без потери данных)
+        self.catchup_chunk_size = 1024 * 1024  # Размер одной порции чтения
+        self.backlog_bytes = 0  # Сколько байтов еще осталось прочитать
+        self.catching_up = False
+        
+        # Проверка связи (включается монитором, у которого есть резервный источник)
+        self.heartbeat_interval = None  # Как часто обращаться к серверу при простое (сек)
+        self.request_timeout = None  # Сколько ждать ответа сервера (None - без ограничения)
+        self.taking_over = False  # Продолжает чтение за другим источником того же лога
+        
+        # Диагностика
+        self.round_trips = 0  # Количество запросов к файлу
+        self.polls = 0  # Количество опросов файла
+        self.telemetry = ConnectionTelemetry()  # Задержки запросов, объем опросов, отставание
+    
+    def connect(self):
+        """Открывает источник. Возвращает True при успехе"""
+        raise NotImplementedError
+    
+    def disconnect(self):
+        """Закрывает источник"""
+        self.connected = False
+    
+    def read_chunk(self):
+        """Читает новые байты с текущей позиции. Возвращает bytes или None"""
+        raise NotImplementedError
+    
+    def mark_broken(self):
+        """Помечает источник неработающим после ошибки чтения"""
+        self.connected = False
+    
+    def wait_for_data(self, timeout):
+        """Ждет появления новых данных, но не дольше timeout секунд"""
+        time.sleep(timeout)
+    
+    def describe(self):
+        """Короткое описание источника для интерфейса"""
+        return self.path
+    
+    def seek(self, position):
+        """Переходит на новую позицию файла"""
+        self.position = position
+        self.framer.reset()  # Незавершенная строка со старой позиции больше не нужна
+        self.head = bytearray() if position == 0 else None
+        self.file_identity = None
+    
+    def advance(self, data):
+        """Сдвигает позицию на прочитанные байты и запоминает начало файла для отпечатка"""
+        if self.head is not None and self.position <= len(self.head) < self.fingerprint_size:
+            self.head += data[len(self.head) - self.position:self.fingerprint_size - self.position]
+            self.update_identity()
+        self.position += len(data)
+    
+    def take_over(self, other):
+        """
+        Продолжает чтение того же лога с места, где остановился другой источник
+        
+        Позиция, незавершенная строка, отпечаток файла, декодер, контрольная
+        точка и телеметрия переходят к этому источнику. При подключении
+        choose_start_position проверяет, что по его пути лежит тот же файл.
+        
+        Args:
+            other: Источник, который перестал отвечать
+        """
+        self.position = other.position
+        self.framer = other.framer
+        self.decoder = other.decoder
+        self.head = None if other.head is None else bytearray(other.head)
+        self.file_identity = other.file_identity
+        self.pending_data, other.pending_data = other.pending_data, None
+        self.tail_origin, other.tail_origin = other.tail_origin, None
+        self.checkpoint = other.checkpoint
+        self.telemetry = other.telemetry
+        self.taking_over = True
+    
+    def head_fingerprint(self):
+        """Отпечаток известного начала файла: (размер, sha1) или None"""
+        if self.head is None:
+            return None
+        return len(self.head), hashlib.sha1(self.head).hexdigest()
+    
+    def checkpoint_key(self):
+        """Под каким именем хранить контрольную точку этого источника (None - не хранить)"""
+        return os.path.abspath(self.path)
+    
+    def checkpoint_state(self):
+        """
+        Текущее состояние чтения для контрольной точки
+        
+        Смещение указывает на конец последней полной строки: незавершенная
+        строка в буфере после перезапуска будет прочитана заново целиком.
+        
+        Returns:
+            dict или None, если начало файла еще не известно
+        """
+        fingerprint = self.head_fingerprint()
+        if fingerprint is None:
+            return None
+        return {
+            'path': self.path,
+            'identity': self.file_identity,
+            'head_size': fingerprint[0],
+            'head_sha1': fingerprint[1],
+            'offset': max(0, self.position - self.framer.pending)
+        }
+    
+    def resume_from_checkpoint(self, current_size, read_head):
+        """
+        Продолжает чтение с контрольной точки, сохраненной до перезапуска
+        
+        Стоит одного чтения начала файла: если начало совпадает с отпечатком,
+        чтение продолжается с сохраненного смещения. Если файл за это время
+        заменили, хвост старого достается из архива, а новый читается с начала.
+        
+        Returns:
+            bool: True если позиция выбрана по контрольной точке
+        """
+        saved = self.checkpoint.load() if self.checkpoint else None
+        if not saved:
+            return False
+        
+        head = bytes(read_head(min(current_size, saved['head_size'])))
+        self.resumed_checkpoint = saved
+        if (len(head) == saved['head_size'] and saved['offset'] <= current_size and
+                hashlib.sha1(head).hexdigest() == saved['head_sha1']):
+            self.seek(saved['offset'])
+            self.head = bytearray(head)
+            self.update_identity()
+            print(f"{self.log_prefix} Продолжаю с контрольной точки: позиция {saved['offset']}")
+            return True
+        
+        print(f"{self.log_prefix} Файл лога заменен после контрольной точки")
+        self.position = saved['offset']
+        self.head = None
+        self.framer.reset()
+        tail = self.recover_rotated_tail(saved['offset'], (saved['head_size'], saved['head_sha1']))
+        if tail:
+            self.pending_data = tail if tail.endswith(b'\n') else tail + b'\n'
+            self.tail_origin = (saved.get('identity'), saved['offset'])
+        self.seek(0)
+        return True
+    
+    def update_identity(self):
+        """Вычисляет короткий отпечаток файла, как только прочитано его начало"""
+        if self.file_identity is None and self.head is not None and len(self.head) >= self.identity_size:
+            self.file_identity = hashlib.sha1(self.head[:self.identity_size]).hexdigest()[:16]
+    
+    def choose_start_position(self, current_size, read_head):
+        """
+        Определяет позицию чтения при подключении
+        
+        При первом подключении чтение продолжается с контрольной точки,
+        сохраненной до перезапуска приложения, а без нее начинается с последних
+        5KB файла. При переподключении - ровно с того байта, где оно остановилось,
+        если по пути лежит тот же файл (совпадает его начало). Незавершенная
+        строка в буфере при этом сохраняется. Если файл за время обрыва
+        заменили, недочитанный хвост старого достается из архива и отдается
+        первым (pending_data), а новый файл читается с начала.
+        
+        Args:
+            current_size: Текущий размер файла по пути
+            read_head: Функция read_head(n), возвращающая первые n байтов файла
+        
+        Returns:
+            bool: False если источник продолжает чтение за другим (take_over),
+                  а его копия лога еще не дошла до позиции чтения - подключаться рано
+        """
+        if self.head is None:
+            if self.resume_from_checkpoint(current_size, read_head):
+                return True
+            self.seek(max(0, current_size - 5000))  # Начинаем с последних 5KB
+            self.framer.skip_partial = self.position > 0  # Первая строка обрезана
+            self.head = bytearray(read_head(min(current_size, self.fingerprint_size)))
+            self.update_identity()
+            return True
+        
+        known_head = bytes(self.head)
+        same_head = bytes(read_head(len(known_head))) == known_head
+        if same_head and current_size >= self.position:
+            print(f"{self.log_prefix} Продолжаю чтение с позиции {self.position}")
+            return True
+        if same_head and self.taking_over:
+            # Зеркало лога отстает - с позиции основного источника читать еще нечего
+            print(f"{self.log_prefix} Копия лога отстает: {current_size} из {self.position} байт")
+            return False
+        
+        print(f"{self.log_prefix} Файл лога заменен за время обрыва связи")
+        self.pending_data = self.start_new_file()
+        return True
+    
+    def list_log_directory(self):
+        """Возвращает имена файлов в каталоге лога"""
+        raise NotImplementedError
+    
+    def open_log_file(self, name):
+        """Открывает файл из каталога лога для чтения в бинарном режиме"""
+        raise NotImplementedError
+    
+    def read_whole_log(self):
+        """
+        Читает текущий файл лога целиком (из другого потока, не мешая чтению)
+        
+        Returns:
+            bytes: Содержимое файла
+        """
+        with self.open_log_file(os.path.basename(self.path)) as log_file:
+            return log_file.read()
+    
+    def start_new_file(self):
+        """
+        Переходит на начало нового latest.log после ротации
+        
+        Строки, записанные в старый файл после нашего последнего чтения,
+        достаются из архива YYYY-MM-DD-N.log.gz и отдаются раньше строк
+        нового файла.
+        
+        Returns:
+            bytes: Недочитанный хвост старого файла или None
+        """
+        tail = self.recover_rotated_tail(self.position, self.head_fingerprint())
+        if not tail:
+            self.seek(0)
+            return None
+        
+        # Хвост дописывает незавершенную строку в буфере, поэтому буфер не сбрасываем
+        if not tail.endswith(b'\n'):
+            tail += b'\n'
+        self.tail_origin = (self.file_identity, self.position - self.framer.pending)
+        self.position = 0
+        self.head = bytearray()
+        self.file_identity = None
+        return tail
+    
+    def recover_rotated_tail(self, offset, expected_head=None):
+        """
+        Достает из самого свежего архива лога байты после offset
+        
+        log4j2 сначала переименовывает latest.log в YYYY-MM-DD-N.log и только
+        потом асинхронно сжимает его в YYYY-MM-DD-N.log.gz, удаляя несжатый
+        файл после сжатия. Пока несжатый файл есть, он полный и берется
+        вместо .gz. Если .gz обрывается (еще дописывается) или несжатый
+        файл успели удалить, чтение повторяется.
+        
+        Args:
+            offset: До какой позиции старый файл уже был прочитан
+            expected_head: Отпечаток начала старого файла (размер, sha1) или None.
+                Если архив начинается иначе, это не тот файл и хвост не берется.
+        
+        Returns:
+            bytes: Недочитанный хвост или None, если архив не найден
+        """
+        for attempt in range(1, self.rotated_retry_attempts + 1):
+            try:
+                names = self.list_log_directory()
+            except Exception as e:
+                print(f"{self.log_prefix} Не удалось просмотреть каталог лога: {e}")
+                return None
+            
+            candidates = []
+            for entry in names:
+                match = ROTATED_LOG_RE.match(entry)
+                if match:
+                    # При равных дате и номере несжатый файл идет последним
+                    candidates.append((match.group(1), int(match.group(2)), not match.group(3), entry))
+            
+            if not candidates:
+                print(f"{self.log_prefix} Архив старого лога не найден, хвост не восстановлен")
+                return None
+            
+            name = max(candidates)[3]
+            try:
+                tail = self.read_rotated_tail(name, offset, expected_head)
+                if tail is not None:
+                    print(f"{self.log_prefix} Восстановлено {len(tail)} байт из архива {name}")
+                return tail
+            
+            except EOFError:
+                # Сжатый поток оборвался: архив еще дописывается
+                print(f"{self.log_prefix} Архив {name} еще не дописан (попытка {attempt} из {self.rotated_retry_attempts})")
+                if attempt < self.rotated_retry_attempts:
+                    time.sleep(self.rotated_retry_delay)
+            
+            except FileNotFoundError:
+                # Несжатый файл удален после сжатия между просмотром каталога и открытием
+                print(f"{self.log_prefix} Архив {name} уже сжат, ищу заново")
+            
+            except Exception as e:
+                print(f"{self.log_prefix} Не удалось прочитать архив лога: {e}")
+                return None
+        
+        print(f"{self.log_prefix} Архив старого лога так и не дописан, хвост не восстановлен")
+        return None
+    
+    def read_rotated_tail(self, name, offset, expected_head):
+        """
+        Читает байты после offset из архива лога (.log или .log.gz)
+        
+        Архив распаковывается потоком: уже прочитанная часть пропускается
+        порциями и не хранится в памяти.
+        
+        Args:
+            name: Имя файла архива в каталоге лога
+            offset: До какой позиции старый файл уже был прочитан
+            expected_head: Отпечаток начала старого файла (размер, sha1) или None
+        
+        Returns:
+            bytes: Недочитанный хвост или None, если архив не подходит
+        
+        Raises:
+            EOFError: Сжатый поток оборвался (архив еще дописывается)
+        """
+        with self.open_log_file(name) as raw:
+            with (gzip.GzipFile(fileobj=raw) if name.endswith('.gz') else contextlib.nullcontext(raw)) as archive:
+                # Проверяем, что архив - это тот самый файл, который мы читали
+                prefix = b''
+                skipped = 0
+                if expected_head and expected_head[0]:
+                    head_size, head_sha1 = expected_head
+                    first = archive.read(head_size)
+                    if len(first) < head_size or hashlib.sha1(first).hexdigest() != head_sha1:
+                        print(f"{self.log_prefix} Архив {name} не совпадает с прочитанным файлом, пропускаю")
+                        return None
+                    skipped = min(head_size, offset)
+                    prefix = first[offset:]
+                
+                # Пропускаем уже прочитанную часть
+                while skipped < offset:
+                    chunk = archive.read(min(self.catchup_chunk_size, offset - skipped))
+                    if not chunk:
+                        break
+                    skipped += len(chunk)
+                
+                if skipped < offset:
+                    print(f"{self.log_prefix} Архив {name} короче прочитанной части, пропускаю")
+                    return None
+                
+                return prefix + archive.read()
+    
+    def limit_catchup_read(self, current_size):
+        """
+        Определяет, сколько байтов читать на этом опросе
+        
+        Накопленное отставание не отбрасывается: оно читается подряд
+        крупными порциями по catchup_chunk_size, пока не догоним конец файла.
+        
+        Args:
+            current_size: Текущий размер файла
+            
+        Returns:
+            int: Количество байтов для чтения
+        """
+        pending = current_size - self.position
+        bytes_to_read = min(pending, self.catchup_chunk_size)
+        self.backlog_bytes = pending - bytes_to_read
+        
+        if self.backlog_bytes and not self.catching_up:
+            print(f"{self.log_prefix} Большой объем данных ({pending} байт), догоняю порциями по "
+                  f"{self.catchup_chunk_size // 1024}KB")
+        elif not self.backlog_bytes and self.catching_up:
+            print(f"{self.log_prefix} Отставание ликвидировано")
+        self.catching_up = self.backlog_bytes > 0
+        
+        return bytes_to_read
+
+
+class SFTPLogSource(LogSource):
+    """Лог-файл на удаленном сервере через SSH/SFTP"""
+    
+    log_prefix = "[SFTP Monitor]"
+    
+    def __init__(self, host, username, password, remote_path, port=22, persistent_handle=True,
+                 source_mode='sftp'):
+        """
+        Args:
+            host: SSH сервер (IP или домен)
+            username: Имя пользователя SSH
+            password: Пароль SSH
+            remote_path: Полный путь к файлу latest.log на сервере
+            port: Порт SSH (по умолчанию 22)
+            persistent_handle: Держать файл лога открытым между опросами
+                (по умолчанию True). Если False - файл открывается заново
+                на каждом опросе, как раньше.
+            source_mode: 'sftp' - опрос файла через SFTP, 'tail' - поток
+                `tail -F` через exec-канал SSH (если сервер не разрешает
+                exec, используется опрос через SFTP)
+        """
+        super().__init__(remote_path)
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.remote_path = remote_path
+        
+        # SSH/SFTP соединение
+        self.ssh_client = None
+        self.sftp_client = None
+        
+        # Постоянный дескриптор файла лога
+        # Опрос с открытым дескриптором: fstat + read = 2 запроса (1, если новых данных нет)
+        # Опрос с переоткрытием: stat + open + read + close = 4 запроса
+        self.persistent_handle = persistent_handle
+        self.remote_file = None
+        self.rotation_check_interval = 2.0  # Как часто проверять ротацию при простое (сек)
+        self.last_growth_time = 0
+        self.rotation_detected = False  # Файл по пути уже новый, старый еще дочитывается
+        self.prefetch_threshold = 32 * 1024  # С какого объема включать конвейерное чтение
+        self.last_size = 0
+        
+        # Потоковое чтение через exec-канал (tail -F)
+        self.source_mode = source_mode
+        self.stream_channel = None
+        self.stderr_decoder = None  # Сообщения tail в stderr (создается вместе с каналом)
+        self.stream_start_timeout = 1.0  # Сколько ждать, не завершится ли tail сразу (сек)
+        self.stream_activity_time = 0  # Когда поток tail последний раз подавал признаки жизни
+    
+    def connect(self):
+        """Устанавливает соединение с SSH/SFTP сервером"""
+        import paramiko
+        
+        try:
+            # Заранее установленное соединение из пула - без рукопожатия
+            clients = SSH_SESSIONS.acquire(self.host, self.port, self.username, self.password)
+            if clients:
+                print(f"[SFTP Monitor] Используется готовое соединение с {self.host}:{self.port}")
+            else:
+                print(f"[SFTP Monitor] Подключение к SSH {self.host}:{self.port}...")
+                clients = SSH_SESSIONS.open_session(self.host, self.port, self.username, self.password)
+            self.ssh_client, self.sftp_client = clients
+            
+            # Запрос без ответа дольше request_timeout - признак оборванной связи
+            self.sftp_client.get_channel().settimeout(self.request_timeout)
+            
+            # Проверяем доступ к файлу
+            try:
+                file_stat = self.sftp_client.stat(self.remote_path)
+                self.last_size = file_stat.st_size
+                print(f"[SFTP Monitor] Файл найден. Размер: {self.last_size} байт")
+            except IOError:
+                print(f"[SFTP Monitor] Файл не найден: {self.remote_path}")
+                return False
+            
+            # Первое подключение - последние 5KB, переподключение - ровно с места обрыва
+            if not self.choose_start_position(self.last_size, self.read_remote_head):
+                return False
+            
+            self.connected = True
+            print("[SFTP Monitor] SSH/SFTP подключение установлено")
+            
+            if self.source_mode == 'tail':
+                self.start_tail_stream()
+            
+            return True
+            
+        except paramiko.AuthenticationException:
+            print("[SFTP Monitor] Ошибка аутентификации: неверный логин или пароль")
+            return False
+        except paramiko.SSHException as e:
+            print(f"[SFTP Monitor] Ошибка SSH: {e}")
+            return False
+        except Exception as e:
+            print(f"[SFTP Monitor] Ошибка подключения: {e}")
+            self.connected = False
+            return False
+    
+    def disconnect(self):
+        """Закрывает SSH/SFTP соединение (или возвращает его в пул)"""
+        self.close_remote_file()
+        self.close_tail_stream()
+        
+        # Соединение сервера из пула остается открытым для следующего запуска
+        # (после ошибки чтения пул закрывает его и устанавливает заново)
+        clients = (self.ssh_client, self.sftp_client) if self.connected else (None, None)
+        if SSH_SESSIONS.release(self.host, self.port, self.username, *clients) and self.connected:
+            self.ssh_client = None
+            self.sftp_client = None
+            self.connected = False
+            print("[SFTP Monitor] SSH/SFTP соединение возвращено в пул")
+            return
+        
+        if self.sftp_client:
+            try:
+                self.sftp_client.close()
+            except:
+                pass
+            self.sftp_client = None
+        
+        if self.ssh_client:
+            try:
+                self.ssh_client.close()
+            except:
+                pass
+            self.ssh_client = None
+        
+        self.connected = False
+        print("[SFTP Monitor] SSH/SFTP соединение закрыто")
+    
+    def mark_broken(self):
+        """Закрывает дескриптор и поток после ошибки чтения"""
+        self.close_remote_file()
+        self.close_tail_stream()
+        self.connected = False
+    
+    def describe(self):
+        """Короткое описание источника для интерфейса"""
+        mode_text = "поток tail -F" if self.stream_channel else "опрос SFTP"
+        return f"{self.host}:{self.port} ({mode_text})"
+    
+    def checkpoint_key(self):
+        """Контрольная точка хранится отдельно для каждого сервера и пути к логу"""
+        return f"sftp://{self.username}@{self.host}:{self.port}{self.remote_path}"
+    
+    def read_remote_head(self, size):
+        """Читает первые size байтов файла лога (для отпечатка файла)"""
+        if size <= 0:
+            return b''
+        with self.sftp_client.open(self.remote_path, 'rb') as f:
+            self.round_trips += 3  # open + read + close
+            return f.read(size)
+    
+    def open_remote_file(self):
+        """Открывает файл лога и держит дескриптор открытым между опросами"""
+        self.close_remote_file()
+        self.remote_file = self.sftp_client.open(self.remote_path, 'rb')
+        self.round_trips += 1
+        self.remote_file.seek(self.position)
+        self.last_growth_time = time.time()
+    
+    def close_remote_file(self):
+        """Закрывает постоянный дескриптор файла лога"""
+        if self.remote_file:
+            try:
+                self.remote_file.close()
+            except:
+                pass
+            self.remote_file = None
+        self.rotation_detected = False
+    
+    def list_log_directory(self):
+        """Возвращает имена файлов в каталоге лога на сервере"""
+        self.round_trips += 1
+        return self.sftp_client.listdir(posixpath.dirname(self.remote_path))
+    
+    def open_log_file(self, name):
+        """Открывает файл из каталога лога на сервере (с конвейерным чтением)"""
+        log_file = self.sftp_client.open(posixpath.join(posixpath.dirname(self.remote_path), name), 'rb')
+        log_file.prefetch()
+        self.round_trips += 1
+        return log_file
+    
+    def read_whole_log(self):
+        """
+        Читает файл лога целиком по отдельному SFTP каналу
+        
+        SFTPClient нельзя использовать из двух потоков сразу, а поток чтения
+        продолжает опрашивать лог через sftp_client. Отдельный канал на том
+        же SSH транспорте не требует нового рукопожатия, и на него не
+        распространяется короткий request_timeout горячего резерва. Без
+        живого транспорта открывается собственное соединение.
+        
+        Returns:
+            bytes: Содержимое файла
+        """
+        ssh_client = self.ssh_client  # Поток чтения может заменить его при переподключении
+        transport = ssh_client.get_transport() if ssh_client else None
+        own_client = None
+        if transport is None or not transport.is_active():
+            own_client, sftp_client = SSH_SESSIONS.open_session(self.host, self.port, self.username, self.password)
+        else:
+            sftp_client = ssh_client.open_sftp()
+        
+        try:
+            with sftp_client.open(self.remote_path, 'rb') as log_file:
+                log_file.prefetch()
+                return log_file.read()
+        finally:
+            sftp_client.close()
+            if own_client:
+                own_client.close()
+    
+    def check_rotation(self, handle_size):
+        """
+        Проверяет, не был ли файл по пути remote_path заменен новым
+        
+        Открытый дескриптор продолжает указывать на старый файл после ротации,
+        поэтому при простое сравниваем размер файла по пути с размером дескриптора.
+        Размер одного и того же файла только растет: если между fstat и stat
+        сервер дописал строку, повторный fstat дескриптора будет не меньше
+        размера по пути. Другим файл считается, только если он меньше
+        дескриптора или дескриптор до его размера так и не дорос.
+        
+        Args:
+            handle_size: Размер файла по открытому дескриптору
+            
+        Returns:
+            bool: True если по пути уже лежит другой файл
+        """
+        path_size = self.sftp_client.stat(self.remote_path).st_size
+        self.round_trips += 1
+        if path_size <= handle_size:
+            return path_size < handle_size
+        
+        # Файл по пути больше - дописан между запросами или это уже новый файл
+        handle_size = self.remote_file.stat().st_size
+        self.round_trips += 1
+        return handle_size < path_size
+    
+    def start_tail_stream(self):
+        """
+        Открывает exec-канал с `tail -F` на текущем SSH соединении
+        
+        Сервер сам присылает новые строки, как только они записаны в лог.
+        Если exec запрещен (типично для хостингов только с SFTP) или tail
+        сразу завершился, источник переключается на опрос через SFTP.
+        
+        Returns:
+            bool: True если поток запущен
+        """
+        command = f"tail -c +{self.position + 1} -F {shlex.quote(self.remote_path)}"
+        
+        try:
+            channel = self.ssh_client.get_transport().open_session()
+            channel.exec_command(command)
+            
+            # Если tail недоступен, канал закрывается почти сразу
+            deadline = time.time() + self.stream_start_timeout
+            while time.time() < deadline and not channel.recv_ready():
+                if channel.exit_status_ready():
+                    error = channel.recv_stderr(1024).decode('utf-8', errors='ignore').strip()
+                    raise IOError(f"tail завершился с кодом {channel.recv_exit_status()}: {error}")
+                time.sleep(0.05)
+            
+            self.stream_channel = channel
+            self.stream_activity_time = time.monotonic()
+            self.stderr_decoder = StreamDecoder('utf-8')  # stderr приходит порциями по 4KB
+            print(f"[SFTP Monitor] Потоковое чтение запущено: {command}")
+            return True
+            
+        except Exception as e:
+            print(f"[SFTP Monitor] Потоковое чтение недоступно ({e}), используется опрос через SFTP")
+            self.source_mode = 'sftp'
+            self.stream_channel = None
+            return False
+    
+    def close_tail_stream(self):
+        """Закрывает exec-канал с tail"""
+        if self.stream_channel:
+            try:
+                self.stream_channel.close()
+            except:
+                pass
+            self.stream_channel = None
+    
+    def read_stream_data(self):
+        """Забирает байты, которые tail уже прислал в канал"""
+        channel = self.stream_channel
+        
+        # Сообщения tail о ротации/усечении файла приходят в stderr
+        while channel.recv_stderr_ready():
+            notice = self.stderr_decoder.decode(channel.recv_stderr(4096)).strip()
+            print(f"[SFTP Monitor] tail: {notice}")
+            if 'truncated' in notice or 'replaced' in notice or 'has appeared' in notice:
+                self.seek(0)
+        
+        chunks = []
+        while channel.recv_ready():
+            chunk = channel.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        
+        if not chunks and channel.exit_status_ready():
+            # tail завершился, но SSH жив - продолжаем опросом с той же позиции
+            print("[SFTP Monitor] Поток tail закрыт, переключаюсь на опрос через SFTP")
+            self.close_tail_stream()
+            self.source_mode = 'sftp'
+            return None
+        
+        if chunks:
+            self.stream_activity_time = time.monotonic()
+        elif self.heartbeat_interval and time.monotonic() - self.stream_activity_time >= self.heartbeat_interval:
+            # Молчащий поток не отличить от оборванной связи - спрашиваем сервер
+            # (без ответа за request_timeout запрос завершится ошибкой)
+            started = time.perf_counter()
+            self.sftp_client.stat(self.remote_path)
+            self.telemetry.record_rtt('stat_rtt_us', started)
+            self.round_trips += 1
+            self.stream_activity_time = time.monotonic()
+        
+        new_data = b''.join(chunks)
+        self.advance(new_data)
+        return new_data
+    
+    def wait_for_data(self, timeout):
+        """
+        Ждет появления новых данных, но не дольше timeout секунд
+        
+        В потоковом режиме просыпается сразу, как только tail прислал байты,
+        в режиме опроса просто выдерживает паузу.
+        """
+        if self.stream_channel:
+            try:
+                select.select([self.stream_channel], [], [], timeout)
+                return
+            except Exception:
+                pass
+        time.sleep(timeout)
+    
+    def read_chunk(self):
+        """Читает новые байты лога через SFTP или поток tail"""
+        if not self.connected or not self.sftp_client:
+            return None
+        
+        self.polls += 1
+        if self.stream_channel:
+            return self.read_stream_data()
+        if self.persistent_handle:
+            return self.read_with_persistent_handle()
+        return self.read_with_reopen()
+    
+    def read_with_persistent_handle(self):
+        """Читает новые байты через постоянно открытый дескриптор"""
+        if self.remote_file is None:
+            self.open_remote_file()
+        
+        # Размер берем с открытого дескриптора (fstat) - без поиска пути на сервере
+        started = time.perf_counter()
+        current_size = self.remote_file.stat().st_size
+        self.telemetry.record_rtt('stat_rtt_us', started)
+        self.round_trips += 1
+        
+        # Если файл был перезаписан на месте
+        if current_size < self.position:
+            print("[SFTP Monitor] Обнаружена перезапись файла (новый день?)")
+            self.remote_file.seek(0)
+            recovered = self.start_new_file()
+            if recovered:
+                return recovered
+        
+        if current_size == self.position:
+            # Файл не растет - возможно, его уже заменили новым (ротация)
+            if not self.rotation_detected and time.time() - self.last_growth_time < self.rotation_check_interval:
+                return None
+            self.last_growth_time = time.time()
+            if not self.rotation_detected and not self.check_rotation(current_size):
+                return None
+            
+            # Строки, дописанные в старый файл после fstat, дочитываем до перехода
+            current_size = self.remote_file.stat().st_size
+            self.round_trips += 1
+            self.rotation_detected = current_size > self.position
+            if not self.rotation_detected:
+                print("[SFTP Monitor] Обнаружена ротация файла (новый день?)")
+                self.seek(0)
+                self.open_remote_file()
+                return None
+        
+        bytes_to_read = self.limit_catchup_read(current_size)
+        
+        # Большие объемы читаем конвейером, не дожидаясь ответа на каждый блок
+        if bytes_to_read > self.prefetch_threshold:
+            self.remote_file.prefetch(self.position + bytes_to_read)
+        
+        started = time.perf_counter()
+        new_data = self.remote_file.read(bytes_to_read)
+        self.telemetry.record_rtt('read_rtt_us', started)
+        self.round_trips += 1
+        
+        self.advance(new_data)
+        self.last_growth_time = time.time()
+        return new_data
+    
+    def read_with_reopen(self):
+        """Читает новые байты, открывая файл заново на каждом опросе"""
+        # Проверяем текущий размер файла
+        started = time.perf_counter()
+        file_stat = self.sftp_client.stat(self.remote_path)
+        self.telemetry.record_rtt('stat_rtt_us', started)
+        self.round_trips += 1
+        current_size = file_stat.st_size
+        
+        # Если файл был перезаписан (например, log rotation)
+        if current_size < self.position:
+            print("[SFTP Monitor] Обнаружена перезапись файла (новый день?)")
+            recovered = self.start_new_file()
+            if recovered:
+                return recovered
+        
+        # Если есть новые данные
+        if current_size > self.position:
+            # Вычисляем сколько данных нужно прочитать
+            bytes_to_read = self.limit_catchup_read(current_size)
+            
+            # Открываем файл для чтения
+            started = time.perf_counter()
+            with self.sftp_client.open(self.remote_path, 'rb') as f:
+                # Переходим на последнюю позицию
+                f.seek(self.position)
+                
+                # Читаем новые данные
+                new_data = f.read(bytes_to_read)
+                self.round_trips += 3  # open + read + close
+            self.telemetry.record_rtt('read_rtt_us', started)  # Вместе с open и close
+            
+            # Обновляем позицию
+            self.advance(new_data)
+            return new_data
+        
+        return None
+
+
+class LocalFileLogSource(LogSource):
+    """
+    Лог-файл на этом же компьютере (сервер и хронометраж на одной машине)
+    
+    Новые байты читаются напрямую из файла без сетевых запросов.
+    На Linux ожидание будится через inotify, на других системах
+    используется обычный опрос (fstat локального файла почти бесплатен).
+    """
+    
+    log_prefix = "[Local Log]"
+    
+    def __init__(self, path):
+        """
+        Args:
+            path: Путь к файлу logs/latest.log
+        """
+        super().__init__(path)
+        self.file = None
+        self.file_id = None  # (st_dev, st_ino) открытого файла - для обнаружения ротации
+        self.watch = None
+    
+    def connect(self):
+        """Открывает локальный файл лога"""
+        try:
+            self.file = open(self.path, 'rb')
+            file_stat = os.fstat(self.file.fileno())
+            self.file_id = (file_stat.st_dev, file_stat.st_ino)
+            print(f"[Local Log] Файл найден. Размер: {file_stat.st_size} байт")
+            
+            # Первое подключение - последние 5KB, переподключение - ровно с места обрыва
+            if not self.choose_start_position(file_stat.st_size, self.read_local_head):
+                self.file.close()
+                self.file = None
+                return False
+            self.file.seek(self.position)
+        except OSError as e:
+            print(f"[Local Log] Не удалось открыть файл {self.path}: {e}")
+            return False
+        
+        self.watch = InotifyWatch.create(os.path.dirname(os.path.abspath(self.path)))
+        self.connected = True
+        return True
+    
+    def disconnect(self):
+        """Закрывает файл лога"""
+        if self.file:
+            try:
+                self.file.close()
+            except OSError:
+                pass
+            self.file = None
+        if self.watch:
+            self.watch.close()
+            self.watch = None
+        self.connected = False
+    
+    def mark_broken(self):
+        """Закрывает файл после ошибки чтения"""
+        self.disconnect()
+    
+    def describe(self):
+        """Короткое описание источника для интерфейса"""
+        mode_text = "inotify" if self.watch else "опрос"
+        return f"локальный файл {self.path} ({mode_text})"
+    
+    def wait_for_data(self, timeout):
+        """Ждет изменения файла (inotify) или просто выдерживает паузу"""
+        if self.watch:
+            self.watch.wait(timeout)
+        else:
+            time.sleep(timeout)
+    
+    def list_log_directory(self):
+        """Возвращает имена файлов в каталоге лога"""
+        return os.listdir(os.path.dirname(os.path.abspath(self.path)))
+    
+    def open_log_file(self, name):
+        """Открывает файл из каталога лога"""
+        return open(os.path.join(os.path.dirname(os.path.abspath(self.path)), name), 'rb')
+    
+    def read_local_head(self, size):
+        """Читает первые size байтов открытого файла (для отпечатка файла)"""
+        self.file.seek(0)
+        return self.file.read(size)
+    
+    def check_rotation(self):
+        """Проверяет, не лежит ли по пути уже другой файл (другой inode)"""
+        try:
+            path_stat = os.stat(self.path)
+        except OSError:
+            return False  # Новый файл еще не создан
+        return (path_stat.st_dev, path_stat.st_ino) != self.file_id
+    
+    def read_chunk(self):
+        """Читает новые байты из локального файла"""
+        if not self.connected or not self.file:
+            return None
+        
+        self.polls += 1
+        started = time.perf_counter()
+        current_size = os.fstat(self.file.fileno()).st_size
+        self.telemetry.record_rtt('stat_rtt_us', started)
+        
+        # Если файл был перезаписан на месте
+        if current_size < self.position:
+            print("[Local Log] Обнаружена перезапись файла (новый день?)")
+            self.file.seek(0)
+            recovered = self.start_new_file()
+            if recovered:
+                return recovered
+        
+        if current_size == self.position:
+            # Старый файл дочитан - переходим на новый, если была ротация
+            if not self.check_rotation():
+                return None
+            
+            # Строки, дописанные в старый файл после fstat, дочитываем до перехода
+            current_size = os.fstat(self.file.fileno()).st_size
+            if current_size == self.position:
+                print("[Local Log] Обнаружена ротация файла (новый день?)")
+                self.file.close()
+                self.file = open(self.path, 'rb')
+                file_stat = os.fstat(self.file.fileno())
+                self.file_id = (file_stat.st_dev, file_stat.st_ino)
+                self.seek(0)
+                return self.read_chunk()  # Новый файл мог уже получить строки
+        
+        bytes_to_read = self.limit_catchup_read(current_size)
+        started = time.perf_counter()
+        new_data = self.file.read(bytes_to_read)
+        self.telemetry.record_rtt('read_rtt_us', started)
+        self.advance(new_data)
+        return new_data
+
+
+class ReplayLogSource(LogSource):
+    """
+    Воспроизведение записанного latest.log для репетиций и нагрузочных тестов
+    
+    Строки выдаются в темпе, заданном их собственными метками [HH:MM:SS],
+    ускоренном в speed раз. При speed=None файл выдается максимально
+    быстро крупными порциями - так измеряется предельная пропускная
+    способность всей цепочки обработки.
+    """
+    
+    log_prefix = "[Replay]"
+    
+    LINE_TIME_RE = re.compile(rb'\[(\d{2}):(\d{2}):(\d{2})\]')
+    
+    def __init__(self, path, speed=1.0):
+        """
+        Args:
+            path: Путь к записанному файлу лога
+            speed: Множитель скорости (1, 10, 100...) или None - максимально быстро
+        """
+        super().__init__(path)
+        self.speed = speed
+        self.file = None
+        self.file_size = 0
+        self.finished = False
+        
+        # Следующая строка, время которой еще не наступило
+        self.next_line = None
+        self.next_line_time = None
+        
+        # Соответствие времени лога и реального времени воспроизведения
+        self.log_start_time = None
+        self.replay_start = None
+        self.replay_end = None
+        self.last_line_time = 0
+        self.day_offset = 0  # Переходы через полночь внутри записи
+        
+        # Статистика воспроизведения
+        self.lines_replayed = 0
+        self.bytes_replayed = 0
+    
+    def connect(self):
+        """Открывает файл записи и запускает часы воспроизведения"""
+        try:
+            self.file = open(self.path, 'rb')
+            self.file_size = os.fstat(self.file.fileno()).st_size
+        except OSError as e:
+            print(f"[Replay] Не удалось открыть файл {self.path}: {e}")
+            return False
+        
+        self.seek(0)
+        self.finished = False
+        self.next_line = None
+        self.log_start_time = None
+        self.day_offset = 0
+        self.lines_replayed = 0
+        self.bytes_replayed = 0
+        self.replay_start = time.monotonic()
+        self.replay_end = None
+        self.connected = True
+        print(f"[Replay] Воспроизведение {self.path} ({self.file_size} байт), {self.describe_speed()}")
+        return True
+    
+    def disconnect(self):
+        """Закрывает файл записи"""
+        if self.file:
+            self.file.close()
+            self.file = None
+        self.connected = False
+    
+    def describe_speed(self):
+        """Скорость воспроизведения для интерфейса"""
+        return "максимальная скорость" if self.speed is None else f"скорость {self.speed:g}x"
+    
+    def describe(self):
+        """Короткое описание источника для интерфейса"""
+        return f"воспроизведение {os.path.basename(self.path)} ({self.describe_speed()})"
+    
+    def checkpoint_key(self):
+        """Воспроизведение всегда идет с начала записи - контрольная точка не нужна"""
+        return None
+    
+    def line_time(self, line):
+        """Время строки в секундах от начала суток записи (строки без метки - как у предыдущей)"""
+        match = self.LINE_TIME_RE.match(line)
+        if not match:
+            return self.last_line_time
+        
+        hours, minutes, seconds = match.groups()
+        line_time = int(hours) * 3600 + int(minutes) * 60 + int(seconds) + self.day_offset
+        
+        # Время заметно ушло назад - запись перешла через полночь
+        if line_time < self.last_line_time - 12 * 3600:
+            self.day_offset += 86400
+            line_time += 86400
+        
+        self.last_line_time = line_time
+        return line_time
+    
+    def replay_clock(self):
+        """Текущее время воспроизведения в секундах времени лога"""
+        return self.log_start_time + (time.monotonic() - self.replay_start) * self.speed
+    
+    def finish(self):
+        """Отмечает окончание записи"""
+        self.finished = True
+        self.catching_up = False
+        self.backlog_bytes = 0
+        self.replay_end = time.monotonic()
+        self.connected = False
+        stats = self.throughput()
+        print(f"[Replay] Воспроизведение завершено: {stats['lines']} строк за {stats['seconds']:.2f} сек "
+              f"({stats['lines_per_second']:.0f} строк/сек)")
+    
+    def read_chunk(self):
+        """Выдает строки записи, время которых уже наступило"""
+        if not self.connected or not self.file:
+            return None
+        
+        self.polls += 1
+        if self.speed is None:
+            data = self.file.read(self.catchup_chunk_size)
+        else:
+            data = self.read_due_lines()
+        
+        if not data:
+            if self.next_line is None:
+                self.finish()
+            return None
+        
+        self.position += len(data)
+        self.bytes_replayed += len(data)
+        self.lines_replayed += data.count(b'\n')
+        self.backlog_bytes = self.file_size - self.position
+        
+        # При максимальной скорости читаем без пауз до конца файла
+        self.catching_up = self.speed is None
+        return data
+    
+    def read_due_lines(self):
+        """Собирает строки, время которых по часам воспроизведения уже наступило"""
+        lines = []
+        clock = None
+        
+        while True:
+            if self.next_line is None:
+                line = self.file.readline()
+                if not line:
+                    break
+                self.next_line = line
+                self.next_line_time = self.line_time(line)
+                if self.log_start_time is None:
+                    self.log_start_time = self.next_line_time
+            
+            if clock is None:
+                clock = self.replay_clock()
+            if self.next_line_time > clock:
+                break
+            
+            lines.append(self.next_line)
+            self.next_line = None
+        
+        return b''.join(lines)
+    
+    def wait_for_data(self, timeout):
+        """Спит до времени следующей строки записи, но не дольше timeout"""
+        if self.speed is None:
+            return
+        if self.next_line is not None:
+            delay = (self.next_line_time - self.replay_clock()) / self.speed
+            timeout = max(0.0, min(timeout, delay))
+        time.sleep(timeout)
+    
+    def throughput(self):
+        """
+        Возвращает показатели воспроизведения
+        
+        Returns:
+            dict: lines, bytes, seconds, lines_per_second, bytes_per_second
+        """
+        end = self.replay_end or time.monotonic()
+        seconds = max(end - (self.replay_start or end), 1e-9)
+        return {
+            'lines': self.lines_replayed,
+            'bytes': self.bytes_replayed,
+            'seconds': seconds,
+            'lines_per_second': self.lines_replayed / seconds,
+            'bytes_per_second': self.bytes_replayed / seconds
+        }
+
+
+class InotifyWatch:
+    """
+    Пробуждение по изменениям в каталоге лога через inotify (только Linux)
+    
+    Используется только стандартная библиотека (ctypes). Если inotify
+    недоступен, create() возвращает None и источник работает опросом.
+    """
+    
+    IN_MODIFY = 0x00000002
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    
+    def __init__(self, fd):
+        self.fd = fd
+    
+    @classmethod
+    def create(cls, directory):
+        """Создает наблюдение за каталогом или возвращает None"""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = cls.IN_MODIFY | cls.IN_CREATE | cls.IN_MOVED_TO
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                os.close(fd)
+                return None
+            return cls(fd)
+        except (OSError, AttributeError):
+            return None
+    
+    def wait(self, timeout):
+        """Ждет событие в каталоге, но не дольше timeout секунд"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                os.read(self.fd, 65536)  # Сбрасываем накопившиеся события
+            except BlockingIOError:
+                pass
+    
+    def close(self):
+        """Закрывает дескриптор inotify"""
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class HistoryFileWriter:
+    """
+    Фоновая запись истории командных блоков в файл
+    
+    Разбор лога только кладет строку в очередь. Отдельный поток держит
+    файл command_blocks_history_YYYYMMDD.txt открытым, копит строки и
+    сбрасывает их на диск по объему или по времени. В полночь файл
+    переключается на новый день (по времени самой строки).
+    """
+    
+    def __init__(self, directory='.', prefix='command_blocks_history_', flush_bytes=64 * 1024,
+                 flush_interval=1.0, max_queue=100000):
+        """
+        Args:
+            directory: Каталог для файлов истории
+            prefix: Начало имени файла истории (дальше идет дата YYYYMMDD)
+            flush_bytes: Сбрасывать на диск, когда накопилось столько байтов
+            flush_interval: Сбрасывать на диск не реже, чем раз в столько секунд
+            max_queue: Потолок очереди строк (при переполнении строки отбрасываются)
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        
+        # Текущий файл
+        self.file = None
+        self.file_day = None
+        
+        # Диагностика
+        self.lines_written = 0
+        self.lines_dropped = 0
+        self.errors = 0
+    
+    def start(self):
+        """Запускает поток записи"""
+        self.thread = threading.Thread(target=self.run, name="history-writer", daemon=True)
+        self.thread.start()
+    
+    def write(self, text, when=None):
+        """
+        Ставит строку в очередь на запись (не ждет диск)
+        
+        Args:
+            text: Текст строки истории
+            when: Время строки (datetime), по умолчанию - текущее
+        """
+        try:
+            self.queue.put_nowait((when or datetime.now(), text))
+        except queue.Full:
+            self.lines_dropped += 1
+    
+    def close(self, timeout=2):
+        """Дописывает очередь, закрывает файл и останавливает поток"""
+        if self.thread and self.thread.is_alive():
+            self.queue.put((None, None))
+            self.thread.join(timeout=timeout)
+        self.thread = None
+    
+    def filename_for(self, day):
+        """Имя файла истории для указанного дня"""
+        return os.path.join(self.directory, f"{self.prefix}{day.strftime('%Y%m%d')}.txt")
+    
+    def run(self):
+        """Цикл потока записи"""
+        pending = []
+        pending_bytes = 0
+        deadline = None
+        
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                when, text = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                when = text = None
+                stop = False
+            else:
+                stop = text is None
+            
+            if text is not None:
+                day = when.date()
+                if day != self.file_day:
+                    # Полночь: дописываем старый файл и переходим на новый
+                    self.flush(pending)
+                    pending, pending_bytes, deadline = [], 0, None
+                    self.open_file(day)
+                
+                line = f"{when.strftime('%Y-%m-%d %H:%M:%S')} - {text}\n"
+                pending.append(line)
+                pending_bytes += len(line)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            
+            if stop or pending_bytes >= self.flush_bytes or (
+                    deadline is not None and time.monotonic() >= deadline):
+                self.flush(pending)
+                pending, pending_bytes, deadline = [], 0, None
+            
+            if stop:
+                break
+        
+        if self.file:
+            self.file.close()
+            self.file = None
+    
+    def open_file(self, day):
+        """Открывает файл истории нового дня (старый закрывается)"""
+        if self.file:
+            self.file.close()
+            self.file = None
+        self.file_day = day
+        try:
+            self.file = open(self.filename_for(day), 'a', encoding='utf-8')
+        except OSError as e:
+            self.report_error(e)
+    
+    def flush(self, lines):
+        """Записывает накопленные строки одним вызовом и сбрасывает буфер файла"""
+        if not lines or not self.file:
+            if lines:
+                self.lines_dropped += len(lines)
+            return
+        try:
+            self.file.write(''.join(lines))
+            self.file.flush()
+            self.lines_written += len(lines)
+        except OSError as e:
+            self.lines_dropped += len(lines)
+            self.report_error(e)
+    
+    def report_error(self, error):
+        """Сообщает об ошибке записи (первую и затем каждую сотую, чтобы не засорять консоль)"""
+        if self.errors % 100 == 0:
+            print(f"[History] Ошибка записи истории: {error}")
+        self.errors += 1
+
+
+class IngestionCheckpoint:
+    """
+    Контрольная точка чтения лога в маленьком локальном файле
+    
+    Хранит путь, отпечаток файла, смещение конца последней обработанной
+    строки и хеш последней строки командного блока. Запись атомарная
+    (временный файл + os.replace), поэтому обрыв питания оставляет либо
+    старую, либо новую точку.
+    
+    Разбор лога только запоминает состояние и не ждет диск. Пишет фоновый
+    поток, не чаще раза в min_interval секунд: изменения за это время
+    сливаются в одну запись последнего состояния. После сбоя строки за
+    последние min_interval секунд будут прочитаны повторно.
+    
+    В режиме hold (чтение в дочернем процессе) состояние чтения ждет в
+    очереди, пока все его сообщения не дойдут до родителя: после сбоя
+    процесса чтение продолжится не дальше того, что родитель получил.
+    """
+    
+    def __init__(self, key, directory='.', min_interval=1.0):
+        """
+        Args:
+            key: Имя источника (хост и путь к логу)
+            directory: Каталог для файла контрольной точки
+            min_interval: Минимальный интервал между записями на диск (сек)
+        """
+        self.key = key
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+        self.path = os.path.join(directory, f"ingestion_checkpoint_{digest}.json")
+        self.min_interval = min_interval
+        self.state = None  # Последнее состояние (может быть еще не записано)
+        self.dirty = False
+        self.last_write_time = 0.0
+        self.writes = 0
+        
+        # Фоновая запись (создается при первом изменении)
+        self.thread = None
+        self.wakeup = threading.Event()  # Есть несохраненное состояние
+        self.closing = threading.Event()
+        self.write_lock = threading.Lock()  # Файл пишет один поток за раз (поток записи или flush)
+        
+        # Подтверждение доставки (hold): состояния ждут, пока их сообщения не дойдут
+        self.hold = False
+        self.latest = None  # Последнее запомненное состояние чтения
+        self.staged = None  # Состояние последнего чтения, еще не поставленное в очередь
+        self.held = deque()  # [номер чтения, состояние, сообщений в пути]
+        self.sequence = 0
+        self.lock = threading.RLock()  # Состояние меняют поток чтения, подтверждения и поток записи
+    
+    def load(self):
+        """
+        Читает сохраненную контрольную точку
+        
+        Returns:
+            dict или None, если точки нет, она повреждена или от другого источника
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        required = ('key', 'head_size', 'head_sha1', 'offset')
+        if not isinstance(saved, dict) or saved.get('key') != self.key or \
+                any(field not in saved for field in required):
+            return None
+        return saved
+    
+    def save(self, state, last_line_hash=None):
+        """
+        Запоминает состояние (на диск его запишет фоновый поток)
+        
+        Args:
+            state: Состояние из LogSource.checkpoint_state()
+            last_line_hash: Хеш последней обработанной строки командного блока (hex),
+                None - новых строк командных блоков не было
+        """
+        if state is None:
+            return
+        if last_line_hash is None and self.latest:
+            last_line_hash = self.latest.get('last_line_hash')
+        state = dict(state, key=self.key, last_line_hash=last_line_hash)
+        if self.latest and all(self.latest.get(k) == v for k, v in state.items()):
+            return  # Ничего не изменилось
+        
+        self.latest = state
+        if self.hold:
+            self.staged = state  # Запишется после подтверждения доставки (track, delivered)
+            return
+        self.commit(state)
+    
+    def commit(self, state):
+        """Делает состояние текущим и будит поток записи"""
+        with self.lock:
+            self.state = state
+            self.dirty = True
+            if self.thread is None:
+                self.closing.clear()
+                self.thread = threading.Thread(target=self.run, name="checkpoint-writer", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+    
+    def track(self, count):
+        """
+        Ставит состояние последнего чтения в очередь до подтверждения доставки
+        
+        Args:
+            count: Сколько сообщений этого чтения передается дальше
+            
+        Returns:
+            int или None: Номер чтения для delivered (None - состояние не менялось)
+        """
+        with self.lock:
+            if self.staged is None:
+                return None
+            self.sequence += 1
+            self.held.append([self.sequence, self.staged, count])
+            self.staged = None
+            self.commit_delivered()
+            return self.sequence
+    
+    def delivered(self, sequence):
+        """Отмечает доставку одного сообщения чтения с номером sequence"""
+        with self.lock:
+            for entry in self.held:
+                if entry[0] == sequence:
+                    entry[2] -= 1
+                    break
+            self.commit_delivered()
+    
+    def commit_delivered(self):
+        """Продвигает точку до последнего чтения, все сообщения которого (и предыдущих) доставлены"""
+        state = None
+        while self.held and self.held[0][2] <= 0:
+            state = self.held.popleft()[1]
+        if state is not None:
+            self.commit(state)
+    
+    def run(self):
+        """Цикл потока записи"""
+        while not self.closing.is_set():
+            self.wakeup.wait()
+            # Изменения за паузу после прошлой записи сливаются в одну
+            pause = self.last_write_time + self.min_interval - time.monotonic()
+            if pause > 0:
+                self.closing.wait(pause)
+            self.wakeup.clear()
+            self.flush()
+    
+    def flush(self):
+        """Записывает несохраненное состояние на диск (в вызывающем потоке)"""
+        with self.write_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                state = dict(self.state, saved_at=datetime.now().isoformat(timespec='seconds'))
+                self.dirty = False
+            
+            temp_path = self.path + '.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+                self.writes += 1
+            except OSError as e:
+                print(f"[Checkpoint] Не удалось сохранить контрольную точку: {e}")
+                with self.lock:
+                    self.dirty = True
+            self.last_write_time = time.monotonic()
+    
+    def close(self, timeout=2):
+        """Останавливает поток записи и дописывает последнее состояние"""
+        if self.thread is not None:
+            self.closing.set()
+            self.wakeup.set()
+            self.thread.join(timeout=timeout)
+            self.thread = None
+        self.flush()
+
 
 class SFTPChatMonitor:
     """
     Полный мониторинг чата Minecraft через SFTP
     Только для командных блоков
+    
+    Источник байтов лога подключаемый (LogSource): по умолчанию SFTP,
+    также поддерживается локальный файл (LocalFileLogSource).
     """
     
-    def __init__(self, host, username, password, remote_path, port=22):
+    def __init__(self, host=None, username=None, password=None, remote_path=None, port=22,
+                 persistent_handle=True, source_mode='sftp', max_poll_interval=1.0, source=None,
+                 use_checkpoint=True, standby=None):
         """
         Инициализация SFTP монитора
         
@@ -24,21 +2675,77 @@ class SFTPChatMonitor:
             password: Пароль SSH
             remote_path: Полный путь к файлу latest.log на сервере
             port: Порт SSH (по умолчанию 22)
+            persistent_handle: Держать файл лога открытым между опросами
+                (по умолчанию True). Если False - файл открывается заново
+                на каждом опросе, как раньше.
+            source_mode: Источник данных: 'sftp' - опрос файла через SFTP,
+                'tail' - поток `tail -F` через exec-канал SSH (если сервер
+                не разрешает exec, используется опрос через SFTP)
+            max_poll_interval: Потолок интервала опроса при простое лога (сек)
+            source: Готовый источник лога (LogSource). Если указан,
+                параметры SSH не используются.
+            use_checkpoint: Сохранять позицию чтения на диск и продолжать
+                с нее после перезапуска приложения
+            standby: Резервный источник того же лога (LogSource): другой
+                путь или сервер с тем же файлом либо его зеркало. При обрыве
+                чтение переключается на него с той же позиции.
         """
-        self.host = host
-        self.port = port
-        self.username = username
-        self.password = password
-        self.remote_path = remote_path
+        if source is None:
+            source = SFTPLogSource(
+                host=host,
+                username=username,
+                password=password,
+                remote_path=remote_path,
+                port=port,
+                persistent_handle=persistent_handle,
+                source_mode=source_mode
+            )
+        self.source = source
         
-        # SSH/SFTP соединение
-        self.ssh_client = None
-        self.sftp_client = None
-        self.connected = False
+        # Контрольная точка чтения (мгновенное продолжение после перезапуска)
+        checkpoint_key = self.source.checkpoint_key() if use_checkpoint else None
+        if checkpoint_key:
+            self.source.checkpoint = IngestionCheckpoint(checkpoint_key)
+        
+        # Телеметрия соединения и чтения (ведет источник, монитор дополняет)
+        self.telemetry = self.source.telemetry
+        
+        # Опросы и адаптивный интервал
+        self.last_read_bytes = 0  # Сколько байтов прочитано на последнем опросе
+        self.poll_scheduler = AdaptivePollScheduler(max_interval=max_poll_interval)
+        
+        # Горячий резерв: обрыв замечается за heartbeat_interval + request_timeout,
+        # после чего чтение продолжается с резервного источника
+        self.standby = standby
+        self.heartbeat_interval = 0.25  # Опрос (запрос к серверу) не реже этого при простое
+        self.request_timeout = 0.75  # Ответа дольше - связь считается оборванной
+        self.failover_from = None  # (источник, момент последнего чтения) до первого чтения с резерва
+        self.failover_log = deque(maxlen=100)  # Переключения: время, откуда, куда, перерыв
+        self.failover_notices = deque()  # Переключения, еще не показанные в интерфейсе
+        if standby is not None:
+            for log_source in (self.source, standby):
+                log_source.heartbeat_interval = self.heartbeat_interval
+                log_source.request_timeout = self.request_timeout
+            standby.telemetry = self.source.telemetry
+            self.poll_scheduler.max_interval = min(max_poll_interval, self.heartbeat_interval)
+        self.last_log_timestamp = None  # [HH:MM:SS] последнего разобранного сообщения
+        
+        # Время событий по меткам лога (event_time в сообщениях)
+        self.event_clock = EventClock()
+        self.last_read_time = None  # Момент предыдущего опроса
+        self.read_window = (None, None)  # Интервал, в который появились прочитанные строки
+        self.at_end_of_log = False  # Предыдущее чтение дошло до конца файла
+        self.live_read = False  # Прочитаны только строки, записанные после предыдущего опроса
+        
+        # Строки, уже прочитанные до переподключения, не обрабатываются повторно
+        self.seen_lines = SeenLineIndex()
+        
+        # Переподключение без блокировки и без ограничения числа попыток
+        self.reconnect_backoff = ReconnectBackoff()
+        self.reconnects = 0  # Сколько раз соединение восстанавливалось после обрыва
+        self.was_connected = False
         
         # Мониторинг
-        self.last_position = 0
-        self.last_size = 0
         self.running = False
         self.message_count = 0
         
@@ -50,166 +2757,274 @@ class SFTPChatMonitor:
             'last_message_time': None
         }
         
-        # История сообщений
-        self.chat_history = []
+        # История сообщений (кольцевой буфер: старые записи вытесняются без копирования)
         self.max_history = 1000
+        self.max_location_messages = 10  # Последних сообщений на каждое местоположение
+        self.chat_history = deque(maxlen=self.max_history)
+        self.history_writer = None  # Фоновая запись истории в файл (создается при первой записи)
+        self.keep_raw_lines = False  # Хранить ли исходную строку лога в каждом сообщении
         
-        # Паттерны для парсинга (командные блоки)
-        self.patterns = [
-            # Формат: [HH:MM:SS] [Server thread/INFO]: [@] сообщение
-            # Пример: [03:18:20] [Server thread/INFO]: [@] Прошел кт
-            r'\[(\d{2}:\d{2}:\d{2})\]\s+\[[^\]]+\]:\s*\[\s*@\s*\]\s*(.+)',
-            
-            # Формат с координатами: [HH:MM:SS] [Server thread/INFO]: [@ X Y Z] сообщение
-            r'\[(\d{2}:\d{2}:\d{2})\]\s+\[[^\]]+\]:\s*\[\s*@\s+[^\]]+\]\s*(.+)',
-            
-            # Альтернативный формат: [HH:MM:SS INFO]: [@] сообщение
-            r'\[(\d{2}:\d{2}:\d{2})\][^\]]*INFO[^\]]*]:\s*\[\s*@\s*\]\s*(.+)',
-            
-            # Формат Paper: [HH:MM:SS INFO]: [@] сообщение
-            r'\[(\d{2}:\d{2}:\d{2})\s+INFO\]:\s*\[\s*@\s*\]\s*(.+)',
-        ]
-        
-        print(f"[SFTP Monitor] Инициализация подключения к {host}:{port}")
+        print(f"[SFTP Monitor] Инициализация источника: {self.source.describe()}")
+    
+    @property
+    def connected(self):
+        """Подключен ли источник лога"""
+        return self.source.connected
+    
+    @property
+    def catching_up(self):
+        """Догоняем ли сейчас накопленное отставание"""
+        return self.source.catching_up
     
     def connect(self):
-        """Устанавливает соединение с SSH/SFTP сервером"""
-        try:
-            print(f"[SFTP Monitor] Подключение к SSH {self.host}:{self.port}...")
-            
-            # Создаем SSH клиент
-            self.ssh_client = paramiko.SSHClient()
-            self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # Подключаемся с таймаутом
-            self.ssh_client.connect(
-                hostname=self.host,
-                port=self.port,
-                username=self.username,
-                password=self.password,
-                timeout=30,
-                banner_timeout=30,
-                auth_timeout=30
-            )
-            
-            # Создаем SFTP клиент
-            self.sftp_client = self.ssh_client.open_sftp()
-            
-            # Проверяем доступ к файлу
-            try:
-                file_stat = self.sftp_client.stat(self.remote_path)
-                self.last_size = file_stat.st_size
-                self.last_position = max(0, self.last_size - 5000)  # Начинаем с последних 5KB
-                print(f"[SFTP Monitor] Файл найден. Размер: {self.last_size} байт")
-            except IOError:
-                print(f"[SFTP Monitor] Файл не найден: {self.remote_path}")
-                return False
-            
-            self.connected = True
-            print("[SFTP Monitor] SSH/SFTP подключение установлено")
-            return True
-            
-        except paramiko.AuthenticationException:
-            print("[SFTP Monitor] Ошибка аутентификации: неверный логин или пароль")
-            return False
-        except paramiko.SSHException as e:
-            print(f"[SFTP Monitor] Ошибка SSH: {e}")
-            return False
-        except Exception as e:
-            print(f"[SFTP Monitor] Ошибка подключения: {e}")
-            self.connected = False
+        """Подключает источник лога"""
+        if not self.source.connect():
             return False
+        
+        resumed = self.source.resumed_checkpoint
+        if resumed:
+            if self.event_clock.offset is None:
+                self.event_clock.offset = resumed.get('clock_offset')  # До первых строк у конца файла
+            self.source.resumed_checkpoint = None
+        
+        # Первое чтение после подключения - старые строки, смещение часов по ним не оценивается
+        self.at_end_of_log = False
+        if self.was_connected:
+            self.reconnects += 1
+            self.telemetry.reconnects = self.reconnects
+        self.was_connected = True
+        self.source.taking_over = False
+        self.reconnect_backoff.succeeded()
+        return True
     
     def disconnect(self):
-        """Закрывает SSH/SFTP соединение"""
-        if self.sftp_client:
-            try:
-                self.sftp_client.close()
-            except:
-                pass
-            self.sftp_client = None
+        """Отключает источник лога"""
+        if self.source.checkpoint:
+            self.source.checkpoint.close()
+        self.source.disconnect()
+    
+    def try_reconnect(self):
+        """
+        Один шаг переподключения без ожидания
         
-        if self.ssh_client:
-            try:
-                self.ssh_client.close()
-            except:
-                pass
-            self.ssh_client = None
+        Если пауза после прошлой неудачи еще не истекла, сразу возвращает
+        False - цикл чтения продолжает крутиться и может быть остановлен.
+        Позиция чтения и незавершенная строка сохраняются: источник
+        продолжит ровно с места обрыва. Если есть резервный источник,
+        каждая попытка идет к другому источнику, первая - без паузы.
         
-        self.connected = False
-        print("[SFTP Monitor] SSH/SFTP соединение закрыто")
+        Returns:
+            bool: True если источник подключен
+        """
+        if self.connected:
+            return True
+        if not self.reconnect_backoff.ready():
+            return False
+        
+        attempt = self.reconnect_backoff.attempts + 1
+        print(f"[SFTP Monitor] Попытка переподключения {attempt}...")
+        self.source.disconnect()  # Закрываем остатки старого соединения (контрольную точку пишет ее поток)
+        # Первое подключение - к основному источнику, дальше попытки чередуются
+        if self.standby is not None and (self.was_connected or self.reconnect_backoff.attempts):
+            self.switch_source()
+        if self.connect():
+            return True
+        
+        delay = self.reconnect_backoff.failed()
+        self.telemetry.reconnect_failures += 1
+        print(f"[SFTP Monitor] Не удалось переподключиться, следующая попытка через {delay:.1f} сек")
+        return False
+    
+    def switch_source(self):
+        """Делает резервный источник основным, передав ему позицию чтения"""
+        failed = self.source
+        self.standby.take_over(failed)
+        self.source, self.standby = self.standby, failed
+        if self.failover_from is None and self.was_connected:
+            # Перерыв отсчитывается от последнего чтения (до первого подключения его нет)
+            self.failover_from = (failed.describe(), self.last_read_time)
+        print(f"[SFTP Monitor] Переключение на резервный источник: {self.source.describe()}")
+    
+    def finish_failover(self, read_time):
+        """Записывает переключение после первого чтения с нового источника"""
+        previous, last_read_time = self.failover_from
+        self.failover_from = None
+        gap = read_time - last_read_time if last_read_time else 0.0
+        entry = {
+            'time': datetime.fromtimestamp(read_time).isoformat(timespec='seconds'),
+            'from': previous,
+            'to': self.source.describe(),
+            'gap': gap,
+            'position': self.source.position
+        }
+        self.failover_log.append(entry)
+        self.failover_notices.append(entry)
+        self.telemetry.failovers += 1
+        self.telemetry.histograms['failover_gap_ms'].record(gap * 1000)
+        print(f"[SFTP Monitor] Чтение переключено: {previous} -> {entry['to']}, "
+              f"перерыв {gap:.2f} сек, позиция {entry['position']}")
     
     def reconnect(self):
-        """Переподключается к SSH/SFTP серверу"""
-        self.disconnect()
-        time.sleep(5)  # Ждем перед повторной попыткой
+        """
+        Переподключается к источнику лога, пока не получится
         
-        for attempt in range(3):  # 3 попытки
-            print(f"[SFTP Monitor] Попытка переподключения {attempt + 1}/3...")
-            if self.connect():
+        Returns:
+            bool: True после восстановления связи, False - если мониторинг остановлен
+        """
+        while self.running:
+            if self.try_reconnect():
                 return True
-            time.sleep(5)
-        
-        print("[SFTP Monitor] Не удалось переподключиться")
+            time.sleep(min(self.reconnect_backoff.remaining(), 0.5))
         return False
     
+    def wait_for_data(self, timeout):
+        """
+        Ждет появления новых данных, но не дольше timeout секунд
+        
+        Потоковые источники (tail, inotify) просыпаются сразу при появлении
+        данных, в режиме опроса просто выдерживается пауза.
+        """
+        self.source.wait_for_data(timeout)
+    
     def read_new_data(self):
-        """Читает новые данные из лог-файла через SFTP"""
-        if not self.connected or not self.sftp_client:
+        """Читает новые данные из лог-файла и оставляет только строки командных блоков"""
+        if not self.source.connected:
             return None
         
         try:
-            # Проверяем текущий размер файла
-            file_stat = self.sftp_client.stat(self.remote_path)
-            current_size = file_stat.st_size
-            
-            # Если файл был перезаписан (например, log rotation)
-            if current_size < self.last_position:
-                print("[SFTP Monitor] Обнаружена перезапись файла (новый день?)")
-                self.last_position = 0
-            
-            # Если есть новые данные
-            if current_size > self.last_position:
-                # Вычисляем сколько данных нужно прочитать
-                bytes_to_read = current_size - self.last_position
+            self.last_read_bytes = 0
+            
+            # Сначала хвост старого файла, восстановленный при переподключении
+            recovered = self.source.pending_data
+            new_data = recovered or self.source.read_chunk()
+            self.source.pending_data = None
+            origin, self.source.tail_origin = self.source.tail_origin, None
+            read_time = time.time()
+            self.live_read = self.at_end_of_log and not recovered
+            self.at_end_of_log = not recovered and not self.source.backlog_bytes
+            if self.failover_from is not None:
+                self.finish_failover(read_time)
+            self.read_window = (self.last_read_time, read_time)
+            self.last_read_time = read_time
+            self.telemetry.record_poll(new_data, self.source.backlog_bytes)
+            
+            if new_data:
+                self.last_read_bytes = len(new_data)
                 
-                # Ограничиваем максимальный размер за один раз (100KB)
-                if bytes_to_read > 100 * 1024:
-                    print(f"[SFTP Monitor] Большой объем данных ({bytes_to_read} байт), читаю первые 100KB")
-                    bytes_to_read = 100 * 1024
-                    self.last_position = current_size - bytes_to_read
+                # Смещение первой строки: у хвоста из архива - в старом файле,
+                # иначе байты прочитаны подряд и заканчиваются на текущей позиции
+                if origin is not None:
+                    identity, stream_offset = origin
+                else:
+                    identity = self.source.file_identity
+                    stream_offset = self.source.position - len(new_data) - self.source.framer.pending
                 
-                # Открываем файл для чтения
-                with self.sftp_client.open(self.remote_path, 'rb') as f:
-                    # Переходим на последнюю позицию
-                    f.seek(self.last_position)
-                    
-                    # Читаем новые данные
-                    new_data = f.read(bytes_to_read)
-                    
-                    # Обновляем позицию
-                    self.last_position += len(new_data)
-                    
-                    if new_data:
-                        # Декодируем данные
-                        try:
-                            decoded_data = new_data.decode('utf-8', errors='ignore')
-                        except:
-                            # Пробуем другие кодировки
-                            try:
-                                decoded_data = new_data.decode('cp1251', errors='ignore')
-                            except:
-                                decoded_data = new_data.decode('latin-1', errors='ignore')
-                        
-                        return decoded_data
+                # Отдаем дальше только полные строки, хвост ждет следующего чтения.
+                # Декодируются только строки командных блоков, остальное отсеивается по байтам
+                command_lines = []
+                last_line_hash = None
+                spans = self.source.framer.feed(new_data)
+                stream_offset += self.source.framer.discarded  # Обрезанная первая строка
+                for buf, start, end in spans:
+                    self.source.decoder.sample(buf, start, end)  # Пока кодировка не ясна
+                for buf, start, end in spans:
+                    view = memoryview(buf)
+                    for line_start, line_end in scan_command_lines(buf, start, end):
+                        # Хеш в ключе различает строки, пока отпечаток короткого нового файла еще не известен
+                        line_hash = SeenLineIndex.line_hash(view[line_start:line_end])
+                        key = (identity, stream_offset + line_start - start, line_hash)
+                        if self.seen_lines.seen(key):
+                            continue  # Строка уже обработана до переподключения
+                        last_line_hash = line_hash
+                        command_lines.append(self.decode_data(view[line_start:line_end]))
+                    stream_offset += end - start
+                
+                # Позиция на диск (фоновой записью, не чаще раза в секунду)
+                if self.source.checkpoint:
+                    state = self.source.checkpoint_state()
+                    if state is not None:
+                        state['clock_offset'] = self.event_clock.offset  # Для продолжения после перезапуска
+                    self.source.checkpoint.save(
+                        state,
+                        last_line_hash.hex() if last_line_hash is not None else None
+                    )
+                
+                if command_lines:
+                    return '\n'.join(command_lines)
             
             return None
             
         except Exception as e:
             print(f"[SFTP Monitor] Ошибка при чтении данных: {e}")
-            self.connected = False
+            self.source.mark_broken()
             return None
     
+    def get_ingestion_lag(self):
+        """
+        Возвращает текущее отставание чтения от реального времени
+        
+        Returns:
+            dict: bytes - сколько байтов лога еще не прочитано,
+                  seconds - насколько время последнего разобранного сообщения
+                  отстает от текущего (0, если отставания нет)
+        """
+        lag_seconds = 0
+        if self.catching_up and self.last_log_timestamp:
+            try:
+                log_time = datetime.strptime(self.last_log_timestamp, '%H:%M:%S')
+                now = datetime.now()
+                log_seconds = log_time.hour * 3600 + log_time.minute * 60 + log_time.second
+                now_seconds = now.hour * 3600 + now.minute * 60 + now.second
+                lag_seconds = (now_seconds - log_seconds) % 86400  # Учитываем переход через полночь
+            except ValueError:
+                pass
+        
+        return {
+            'bytes': self.source.backlog_bytes,
+            'seconds': lag_seconds
+        }
+    
+    def get_telemetry(self):
+        """
+        Снимок телеметрии соединения вместе с текущим отставанием
+        
+        Returns:
+            dict: снимок ConnectionTelemetry, а также source - описание
+                  источника, lag - результат get_ingestion_lag(), encoding -
+                  кодировка лога, replaced_bytes - сколько байтов не декодировано,
+                  standby - описание резервного источника (или None) и
+                  failover_log - последние переключения на резерв
+        """
+        snapshot = self.telemetry.snapshot()
+        snapshot['source'] = self.source.describe()
+        snapshot['standby'] = self.standby.describe() if self.standby is not None else None
+        snapshot['failover_log'] = list(self.failover_log)
+        snapshot['lag'] = self.get_ingestion_lag()
+        snapshot['encoding'] = self.source.decoder.encoding
+        snapshot['replaced_bytes'] = self.source.decoder.replaced_bytes
+        return snapshot
+    
+    def export_telemetry(self, path=None):
+        """
+        Сохраняет снимок телеметрии в JSON файл
+        
+        Args:
+            path: Путь к файлу (по умолчанию telemetry_YYYYMMDD_HHMMSS.json)
+            
+        Returns:
+            str: Путь к сохраненному файлу
+        """
+        if path is None:
+            path = f"telemetry_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_telemetry(), f, ensure_ascii=False, indent=2)
+        print(f"[SFTP Monitor] Телеметрия сохранена в {path}")
+        return path
+    
+    def decode_data(self, new_data):
+        """Декодирует полную строку лога (bytes или memoryview) декодером источника"""
+        return self.source.decoder.decode(new_data, final=True)
+    
     def parse_command_block_message(self, line):
         """Парсит строку лога и извлекает сообщение от командного блока"""
         line = line.strip()
@@ -220,9 +3035,37 @@ class SFTPChatMonitor:
         if not ('[@' in line or '[ @' in line):
             return None
         
+        # Обычные строки разбираются одним проходом скомпилированного выражения
+        match = COMMAND_BLOCK_RE.match(line)
+        if match and line.find('@') == max(match.start('at'), match.start('paper_at')):
+            x = match.group('x')
+            message = match.group('message').strip()
+            
+            if x is not None:
+                return CommandBlockMessage(
+                    match.group('timestamp'),
+                    LOCATIONS.intern(x, match.group('y'), match.group('z')),
+                    message,
+                    line if self.keep_raw_lines else None
+                )
+            
+            # Без координат в маркере строку с @ в тексте разбираем полностью:
+            # координаты могли бы найтись в самом сообщении
+            if '@' not in message:
+                return CommandBlockMessage(
+                    match.group('timestamp'),
+                    LocationRegistry.GLOBAL,
+                    message,
+                    line if self.keep_raw_lines else None
+                )
+        
+        return self.parse_command_block_fallback(line)
+    
+    def parse_command_block_fallback(self, line):
+        """Полный разбор нестандартной строки командного блока (старые паттерны и ручной поиск)"""
         # Пробуем все паттерны для командных блоков
-        for pattern in self.patterns:
-            match = re.match(pattern, line)
+        for pattern in LEGACY_PATTERNS:
+            match = pattern.match(line)
             if match:
                 groups = match.groups()
                 
@@ -231,25 +3074,18 @@ class SFTPChatMonitor:
                     message = groups[1].strip()
                     
                     # Определяем местоположение (если есть координаты)
-                    location = "unknown"
-                    coord_match = re.search(r'\[\s*@\s+([-\d]+)\s+([-\d]+)\s+([-\d]+)\s*\]', line)
+                    coord_match = MARKER_COORDS_RE.search(line)
                     if coord_match:
-                        x, y, z = coord_match.groups()
-                        location = f"X{x}Y{y}Z{z}"
+                        location = LOCATIONS.intern(*coord_match.groups())
                     else:
-                        location = "global"
+                        location = LocationRegistry.GLOBAL
                     
-                    return {
-                        'type': 'command_block',
-                        'timestamp': timestamp,
-                        'location': location,
-                        'message': message,
-                        'raw': line
-                    }
+                    return CommandBlockMessage(timestamp, location, message,
+                                               line if self.keep_raw_lines else None)
         
         # Если не нашли по паттернам, пробуем вручную
         # Ищем время
-        time_match = re.search(r'\[(\d{2}:\d{2}:\d{2})\]', line)
+        time_match = TIMESTAMP_RE.search(line)
         if not time_match:
             return None
         
@@ -274,23 +3110,16 @@ class SFTPChatMonitor:
             return None
         
         # Определяем местоположение
-        location = "unknown"
+        location = LocationRegistry.UNKNOWN
         if line[at_pos:end_pos + 1].strip() == '[@]':
-            location = "global"
+            location = LocationRegistry.GLOBAL
         else:
             # Пробуем извлечь координаты
-            coord_match = re.search(r'([-\d]+)\s+([-\d]+)\s+([-\d]+)', line[at_pos:end_pos + 1])
+            coord_match = COORDS_RE.search(line[at_pos:end_pos + 1])
             if coord_match:
-                x, y, z = coord_match.groups()
-                location = f"X{x}Y{y}Z{z}"
+                location = LOCATIONS.intern(*coord_match.groups())
         
-        return {
-            'type': 'command_block',
-            'timestamp': timestamp,
-            'location': location,
-            'message': message,
-            'raw': line
-        }
+        return CommandBlockMessage(timestamp, location, message, line if self.keep_raw_lines else None)
     
     def process_messages(self, data):
         """Обрабатывает данные и извлекает сообщения только от командных блоков"""
@@ -311,87 +3140,114 @@ class SFTPChatMonitor:
                 if message:
                     messages.append(message)
         
+        if messages:
+            self.last_log_timestamp = messages[-1].timestamp
+            
+            # Время события по метке лога, смещению часов сервера и окну прочтения
+            window_start, window_end = self.read_window
+            event_times = self.event_clock.stamp(
+                [message.timestamp for message in messages],
+                window_start,
+                window_end if window_end is not None else time.time(),
+                sample=self.live_read
+            )
+            for message, event_time in zip(messages, event_times):
+                message.event_time = event_time
+        
         return messages
     
-    def update_stats(self, message):
-        """Обновляет статистику"""
-        location = message['location']
+    def update_stats(self, message, now=None):
+        """
+        Обновляет статистику
+        
+        Args:
+            message: Сообщение командного блока
+            now: Время обработки (datetime), вычисляется один раз на сообщение
+        """
+        if now is None:
+            now = datetime.now()
+        location = message.location_id
         
         # Общая статистика
         self.stats['total_messages'] += 1
-        self.stats['last_message_time'] = datetime.now()
+        self.stats['last_message_time'] = now
         
-        # Статистика по местоположениям
-        if location not in self.stats['locations']:
-            self.stats['locations'][location] = {
+        # Статистика по местоположениям (ключ - номер в LOCATIONS)
+        location_stats = self.stats['locations'].get(location)
+        if location_stats is None:
+            location_stats = self.stats['locations'][location] = {
                 'message_count': 0,
-                'first_seen': datetime.now(),
-                'last_seen': datetime.now(),
-                'messages': []
+                'first_seen': now,
+                'last_seen': now,
+                'messages': deque(maxlen=self.max_location_messages)
             }
         
-        self.stats['locations'][location]['message_count'] += 1
-        self.stats['locations'][location]['last_seen'] = datetime.now()
-        
-        # Сохраняем последние 10 сообщений для каждой локации
-        self.stats['locations'][location]['messages'].append({
-            'timestamp': message['timestamp'],
-            'message': message['message']
-        })
-        if len(self.stats['locations'][location]['messages']) > 10:
-            self.stats['locations'][location]['messages'] = \
-                self.stats['locations'][location]['messages'][-10:]
-    
-    def save_to_history(self, message):
-        """Сохраняет сообщение в историю"""
-        self.chat_history.append({
-            'timestamp': message['timestamp'],
-            'location': message['location'],
-            'message': message['message'],
-            'type': 'command_block',
-            'processed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
-        
-        # Ограничиваем размер истории
-        if len(self.chat_history) > self.max_history:
-            self.chat_history = self.chat_history[-self.max_history:]
-    
-    def print_message(self, message):
+        location_stats['message_count'] += 1
+        location_stats['last_seen'] = now
+        
+        # Последние сообщения для каждой локации (старые вытесняются кольцевым буфером)
+        location_stats['messages'].append(LocationMessage(message.timestamp, message.message))
+    
+    def save_to_history(self, message, now=None):
+        """
+        Сохраняет сообщение в историю
+        
+        Args:
+            message: Сообщение командного блока
+            now: Время обработки (datetime), вычисляется один раз на сообщение
+        """
+        self.chat_history.append(HistoryRecord(
+            message.timestamp,
+            message.location_id,
+            message.message,
+            now or datetime.now()
+        ))
+    
+    def print_message(self, message, now=None):
         """Красиво выводит сообщение от командного блока"""
-        timestamp = message['timestamp']
-        location = message['location']
-        text = message['message']
+        timestamp = message.timestamp
+        location_id = message.location_id
+        location = LOCATIONS.names[location_id]
+        text = message.message
         
         # Специальный цвет для командных блоков (фиолетовый/пурпурный)
         color_code = 35  # ANSI код для пурпурного цвета
         
         # Форматированный вывод с маркером командного блока
-        if location == "global":
+        if location_id == LocationRegistry.GLOBAL:
             print(f"\033[1;{color_code}m[{timestamp}]\033[0m \033[1;35m[@]\033[0m {text}")
         else:
             print(f"\033[1;{color_code}m[{timestamp}]\033[0m \033[1;35m[{location}]\033[0m {text}")
         
         # Также сохраняем в лог файл
-        self.log_to_file(f"[{timestamp}] [{location}] {text}")
+        self.log_to_file(f"[{timestamp}] [{location}] {text}", now)
     
-    def log_to_file(self, text):
-        """Сохраняет сообщения в локальный файл"""
-        try:
-            log_filename = f"command_blocks_history_{datetime.now().strftime('%Y%m%d')}.txt"
-            with open(log_filename, 'a', encoding='utf-8') as f:
-                f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {text}\n")
-        except:
-            pass
+    def log_to_file(self, text, when=None):
+        """Сохраняет сообщения в локальный файл (через фоновый поток записи)"""
+        if self.history_writer is None:
+            self.history_writer = HistoryFileWriter()
+            self.history_writer.start()
+        self.history_writer.write(text, when)
+    
+    def close_history(self):
+        """Дописывает и закрывает файл истории"""
+        if self.history_writer:
+            self.history_writer.close()
+            self.history_writer = None
     
     def monitor(self, interval=0.1):
         """
         Основной цикл мониторинга
         
         Args:
-            interval: Интервал проверки в секундах
+            interval: Базовый интервал проверки в секундах (при простое лога
+                интервал растет до max_poll_interval, при командах - уменьшается)
         """
         print("[SFTP Monitor] Запуск мониторинга командных блоков...")
         
+        self.poll_scheduler.base_interval = interval
+        self.poll_scheduler.interval = interval
+        
         self.stats['start_time'] = datetime.now()
         self.running = True
         
@@ -399,11 +3255,11 @@ class SFTPChatMonitor:
             while self.running:
                 if not self.connected:
                     if not self.reconnect():
-                        print("[SFTP Monitor] Не удалось восстановить соединение, завершение...")
-                        break
+                        break  # Мониторинг остановлен во время переподключения
                 
                 # Читаем новые данные
                 new_data = self.read_new_data()
+                messages = []
                 
                 if new_data:
                     # Обрабатываем сообщения только от командных блоков
@@ -411,13 +3267,17 @@ class SFTPChatMonitor:
                     
                     # Выводим новые сообщения
                     for message in messages:
+                        now = datetime.now()  # Одно время обработки на сообщение
                         self.message_count += 1
-                        self.update_stats(message)
-                        self.save_to_history(message)
-                        self.print_message(message)
+                        self.update_stats(message, now)
+                        self.save_to_history(message, now)
+                        self.print_message(message, now)
                 
-                # Пауза между проверками
-                time.sleep(interval)
+                # Пауза между проверками (в потоковом режиме - до прихода данных)
+                # Пока догоняем отставание - читаем следующую порцию без паузы
+                next_interval = self.poll_scheduler.observe(self.last_read_bytes, len(messages))
+                if not self.catching_up:
+                    self.wait_for_data(next_interval)
                 
         except KeyboardInterrupt:
             print("\n[SFTP Monitor] Получен сигнал остановки...")
@@ -426,5 +3286,6 @@ class SFTPChatMonitor:
         finally:
             self.running = False
             self.disconnect()
+            self.close_history()
             
             print(f"[SFTP Monitor] Мониторинг завершен. Обработано команд: {self.message_count}")
\ No newline at end of file
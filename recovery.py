@@ -0,0 +1,355 @@
+import re
+import time
+from datetime import datetime, timedelta
+
+from parsing import scan_command_lines, StreamDecoder
+from command_templates import should_ignore_command
+
+
+class SkierState:
+    """
+    Состояние секундомера одного лыжника без интерфейса
+    
+    Повторяет расчеты Stopwatch.start/stop/record_lap, но только меняет
+    поля - восстановление не трогает окна и таблицы на каждой команде.
+    """
+    
+    __slots__ = ('name', 'running', 'start_time', 'elapsed_time', 'lap_times')
+    
+    def __init__(self, name):
+        self.name = name
+        self.running = False
+        self.start_time = None
+        self.elapsed_time = 0
+        self.lap_times = []
+    
+    def seconds_since_start(self, at):
+        """Секунды от старта до момента at (не меньше нуля)"""
+        return max(at - self.start_time, timedelta(0)).total_seconds()
+    
+    def start(self, at):
+        if not self.running:
+            self.running = True
+            self.start_time = at
+    
+    def stop(self, at):
+        if self.running:
+            self.running = False
+            if self.start_time:
+                self.elapsed_time += self.seconds_since_start(at)
+    
+    def record_lap(self, at):
+        if self.running and self.start_time:
+            self.lap_times.append(self.elapsed_time + self.seconds_since_start(at))
+    
+    def reset(self):
+        self.running = False
+        self.start_time = None
+        self.elapsed_time = 0
+        self.lap_times = []
+
+
+class CommandRecognizer:
+    """
+    Распознавание команд без побочных эффектов
+    
+    Те же правила, что у ParserIntegration.execute_command_from_text и
+    parse_general_command_with_caution, но выражения компилируются один
+    раз на все восстановление, а результат - действие, а не вызов
+    интерфейса.
+    """
+    
+    def __init__(self, active_commands, skier_names):
+        """
+        Args:
+            active_commands: Команды по шаблонам (ParserIntegration.active_commands)
+            skier_names: Имена лыжников в порядке секундомеров
+        """
+        self.skier_names = list(skier_names)
+        
+        # Команды по шаблонам в том же порядке, что и при живом разборе
+        self.commands = []
+        for command_data in active_commands.values():
+            regex = command_data.get('regex', '')
+            if regex:
+                self.commands.append((
+                    re.compile(regex, re.IGNORECASE),
+                    command_data.get('action', ''),
+                    command_data.get('skier_name', ''),
+                    command_data.get('priority', 0)
+                ))
+        
+        # Осторожный разбор по именам: (имя, граница слова, старт, стоп, круг)
+        self.general = []
+        for skier_name in self.skier_names:
+            name = skier_name.lower()
+            escaped = re.escape(name)
+            self.general.append((
+                skier_name,
+                name,
+                re.compile(r'\b' + escaped + r'\b'),
+                re.compile(r'^' + escaped + r'\s+(?:старт|стартовал|запуск)\b'),
+                re.compile(r'^' + escaped + r'\s+(?:стоп|финиш|финишировал)\b'),
+                re.compile(r'^' + escaped + r'\s+(?:подошел|прошел|вышел)\b')
+            ))
+        
+        self.start_all_re = re.compile(r'^старт\s+всех\b|^все\s+старт\b')
+        self.stop_all_re = re.compile(r'^стоп\s+всех\b|^все\s+стоп\b')
+        self.lap_all_re = re.compile(r'^круг\s+всех\b|^все\s+круг\b')
+    
+    def recognize(self, text):
+        """
+        Определяет действие по тексту сообщения командного блока
+        
+        Returns:
+            tuple: (действие, имя лыжника) или None, если команды нет.
+                   'stop_skier' фиксирует круг и останавливает,
+                   'stop_skier_only' только останавливает (осторожный разбор)
+        """
+        text_lower = text.lower()
+        
+        best_match = None
+        best_priority = -1
+        for regex, action, skier_name, priority in self.commands:
+            if priority > best_priority and regex.search(text_lower):
+                best_priority = priority
+                best_match = (action, skier_name)
+        
+        if best_match:
+            action, skier_name = best_match
+            if skier_name and should_ignore_command(text, skier_name):
+                return None
+            if action == 'select_skier':
+                return None  # Выбор вида не меняет хронометраж
+            if action == 'lap_skier_with_number':
+                action = 'lap_skier'
+            return (action, skier_name)
+        
+        return self.recognize_general(text, text_lower)
+    
+    def recognize_general(self, text, text_lower):
+        """Осторожный разбор сообщения, не подошедшего ни под один шаблон"""
+        if len(text.split()) > 8:
+            return None
+        
+        for skier_name, name, word_re, start_re, stop_re, lap_re in self.general:
+            if name not in text_lower or not word_re.search(text_lower):
+                continue
+            if should_ignore_command(text, name):
+                continue
+            if start_re.search(text_lower):
+                return ('start_skier', skier_name)
+            if stop_re.search(text_lower):
+                return ('stop_skier_only', skier_name)
+            if lap_re.search(text_lower):
+                return ('lap_skier', skier_name)
+        
+        if self.start_all_re.search(text_lower):
+            return ('start_all', '')
+        if self.stop_all_re.search(text_lower):
+            return ('stop_all', '')
+        if self.lap_all_re.search(text_lower):
+            return ('lap_all', '')
+        return None
+
+
+class RaceRecovery:
+    """
+    Восстановление хода гонки по логу сервера после сбоя компьютера
+    
+    Лог читается целиком, строки командных блоков находятся прямо в байтах
+    (scan_command_lines), команды распознаются без побочных эффектов, а
+    старт, круги и финиш каждого лыжника пересчитываются по меткам времени
+    лога. Результат загружается в секундомеры одним вызовом.
+    """
+    
+    def __init__(self, active_commands, skier_names, parse_line, clock_offset=0.0):
+        """
+        Args:
+            active_commands: Команды по шаблонам (ParserIntegration.active_commands)
+            skier_names: Имена лыжников в порядке секундомеров
+            parse_line: Разбор строки лога в CommandBlockMessage
+                (SFTPChatMonitor.parse_command_block_message)
+            clock_offset: Смещение часов сервера относительно этого
+                компьютера в секундах (EventClock.offset)
+        """
+        self.recognizer = CommandRecognizer(active_commands, skier_names)
+        self.parse_line = parse_line
+        self.clock_offset = clock_offset or 0.0
+    
+    @staticmethod
+    def read_log(source):
+        """
+        Читает latest.log источника целиком
+        
+        Вызывается из фонового потока, пока поток чтения опрашивает тот же
+        источник: SFTP источник читает по отдельному каналу (read_whole_log).
+        
+        Args:
+            source: Источник лога (SFTPLogSource или LocalFileLogSource)
+        
+        Returns:
+            bytes: Содержимое файла
+        """
+        return source.read_whole_log()
+    
+    def scan(self, data, start_time=None, start_text=None, from_last_start=False, now=None):
+        """
+        Пересчитывает состояние секундомеров по логу
+        
+        Args:
+            data: Байты лога
+            start_time: Начало гонки 'HH:MM:SS' - команды до него пропускаются
+            start_text: Начало гонки - последнее сообщение, содержащее этот текст
+            from_last_start: Начать с последней команды общего старта
+                (если ее нет - весь файл)
+            now: Текущее время (datetime), по умолчанию datetime.now()
+        
+        Returns:
+            dict: states - список SkierState в порядке лыжников,
+                  lines - строк командных блоков, commands - примененных команд,
+                  encoding и replaced_bytes - кодировка лога и число недекодированных байтов,
+                  first_event, last_event - время первой и последней команды,
+                  seconds - длительность восстановления
+        """
+        started = time.perf_counter()
+        now = now or datetime.now()
+        
+        # Строки командных блоков: (день от начала лога, секунды суток, текст, действие)
+        entries = []
+        day = 0
+        previous_seconds = None
+        lines = 0
+        decoder = StreamDecoder()
+        decoder.sample(data, 0, len(data))  # Кодировка по первым строкам вне ASCII
+        view = memoryview(data)
+        for line_start, line_end in scan_command_lines(data, 0, len(data)):
+            message = self.parse_line(decoder.decode(view[line_start:line_end], final=True))
+            if message is None:
+                continue
+            lines += 1
+            try:
+                hours, minutes, seconds = (int(part) for part in message.timestamp.split(':'))
+            except ValueError:
+                continue
+            seconds_of_day = hours * 3600 + minutes * 60 + seconds
+            # Время ушло назад больше чем на 12 часов - лог перешел через полночь
+            if previous_seconds is not None and previous_seconds - seconds_of_day > 12 * 3600:
+                day += 1
+            previous_seconds = seconds_of_day
+            entries.append((day, seconds_of_day, message.message.strip(),
+                            self.recognizer.recognize(message.message.strip())))
+        
+        first = self.find_race_start(entries, start_time, start_text, from_last_start)
+        
+        # Дата лога: последняя команда не может оказаться в будущем
+        base_date = datetime.combine(now.date(), datetime.min.time()) - timedelta(days=day)
+        if entries and entries[-1][1] + self.clock_offset > now.hour * 3600 + now.minute * 60 + now.second + 3600:
+            base_date -= timedelta(days=1)
+        
+        states = [SkierState(name) for name in self.recognizer.skier_names]
+        by_name = {name.lower(): state for name, state in zip(self.recognizer.skier_names, states)}
+        commands = 0
+        first_event = last_event = None
+        for entry_day, seconds_of_day, text, recognized in entries[first:]:
+            if recognized is None:
+                continue
+            # Середина секунды из метки лога, по часам этого компьютера
+            at = base_date + timedelta(days=entry_day, seconds=seconds_of_day + 0.5 + self.clock_offset)
+            if self.apply(states, by_name, recognized, at):
+                commands += 1
+                first_event = first_event or at
+                last_event = at
+        
+        return {
+            'states': states,
+            'lines': lines,
+            'commands': commands,
+            'first_event': first_event,
+            'last_event': last_event,
+            'encoding': decoder.encoding,
+            'replaced_bytes': decoder.replaced_bytes,
+            'seconds': time.perf_counter() - started
+        }
+    
+    @staticmethod
+    def find_race_start(entries, start_time, start_text, from_last_start):
+        """Номер первой строки гонки в entries"""
+        if start_text:
+            needle = start_text.lower()
+            for index in range(len(entries) - 1, -1, -1):
+                if needle in entries[index][2].lower():
+                    return index
+            raise ValueError(f"Сообщение '{start_text}' не найдено в логе")
+        
+        if start_time:
+            try:
+                hours, minutes, seconds = (int(part) for part in start_time.split(':'))
+            except ValueError:
+                raise ValueError(f"Время начала гонки должно быть в формате ЧЧ:ММ:СС: {start_time}")
+            start_seconds = hours * 3600 + minutes * 60 + seconds
+            for index, (day, seconds_of_day, _, _) in enumerate(entries):
+                if day > 0 or seconds_of_day >= start_seconds:
+                    return index
+            return len(entries)
+        
+        if from_last_start:
+            for index in range(len(entries) - 1, -1, -1):
+                recognized = entries[index][3]
+                if recognized and recognized[0] == 'start_all':
+                    return index
+        return 0
+    
+    @staticmethod
+    def apply(states, by_name, recognized, at):
+        """
+        Применяет распознанную команду к состояниям (как perform_action)
+        
+        Returns:
+            bool: True если команда изменила состояние
+        """
+        action, skier_name = recognized
+        if skier_name:
+            state = by_name.get(skier_name.lower())
+            if state is None:
+                return False
+            if action == 'start_skier' and not state.running:
+                state.start(at)
+                return True
+            if action == 'stop_skier' and state.running:
+                state.record_lap(at)
+                state.stop(at)
+                return True
+            if action == 'stop_skier_only' and state.running:
+                state.stop(at)
+                return True
+            if action == 'lap_skier' and state.running:
+                state.record_lap(at)
+                return True
+            return False
+        
+        if action == 'start_all':
+            # Как StopwatchApp.start_all_stopwatches: общий старт для неактивных
+            started = False
+            for state in states:
+                if not state.running:
+                    state.running = True
+                    state.start_time = at
+                    state.elapsed_time = 0
+                    started = True
+            return started
+        if action == 'stop_all':
+            running = [state for state in states if state.running]
+            for state in running:
+                state.stop(at)
+            return bool(running)
+        if action == 'lap_all':
+            running = [state for state in states if state.running]
+            for state in running:
+                state.record_lap(at)
+            return bool(running)
+        if action == 'reset_all':
+            for state in states:
+                state.reset()
+            return True
+        return False
@@ -1,5 +1,5 @@
 import tkinter as tk
-from datetime import datetime
+from datetime import datetime, timedelta
 
 class Stopwatch:
     def __init__(self, parent, number, app):
@@ -256,11 +256,17 @@ class Stopwatch:
         """Возвращает текущий номер круга для этого лыжника"""
         return len(self.lap_times)
     
-    def start(self):
-        """Запуск лыжника"""
+    def start(self, at=None):
+        """
+        Запуск лыжника
+        
+        Args:
+            at: Момент старта (datetime), по умолчанию - текущее время.
+                Парсер передает сюда время события из лога.
+        """
         if not self.running:
             self.running = True
-            self.start_time = datetime.now()
+            self.start_time = at or datetime.now()
             self.just_completed_lap = False
             self.start_btn.config(state="disabled", bg="#81C784")
             self.stop_btn.config(state="normal", bg="#f44336")
@@ -274,12 +280,17 @@ class Stopwatch:
             # Обновляем статистику
             self.app.update_all_laps_display()
     
-    def stop(self):
-        """Остановка лыжника"""
+    def stop(self, at=None):
+        """
+        Остановка лыжника
+        
+        Args:
+            at: Момент остановки (datetime), по умолчанию - текущее время
+        """
         if self.running:
             self.running = False
             if self.start_time:
-                self.elapsed_time += (datetime.now() - self.start_time).total_seconds()
+                self.elapsed_time += self.seconds_since_start(at)
             self.start_btn.config(state="normal", bg="#4CAF50")
             self.stop_btn.config(state="disabled", bg="#E57373")
             self.lap_btn.config(state="disabled", bg="#FFB74D")
@@ -332,10 +343,20 @@ class Stopwatch:
         if self.app.current_large_view == self:
             self.app.show_large_view(self)
     
-    def record_lap(self):
-        """Запись времени круга"""
+    def seconds_since_start(self, at=None):
+        """Секунды от старта до момента at (по умолчанию - до текущего времени)"""
+        # Событие из лога не может оказаться раньше старта
+        return max((at or datetime.now()) - self.start_time, timedelta(0)).total_seconds()
+    
+    def record_lap(self, at=None):
+        """
+        Запись времени круга
+        
+        Args:
+            at: Момент прохождения круга (datetime), по умолчанию - текущее время
+        """
         if self.running and self.start_time:
-            current_elapsed = self.elapsed_time + (datetime.now() - self.start_time).total_seconds()
+            current_elapsed = self.elapsed_time + self.seconds_since_start(at)
             self.lap_times.append(current_elapsed)
             self.last_lap_time = current_elapsed
             self.lap_indicator.config(text=f"Круги: {len(self.lap_times)}")
@@ -354,6 +375,37 @@ class Stopwatch:
                 # Полностью пересоздаем вид с замороженным кругом
                 self.app.show_large_view(self)
     
+    def load_state(self, running, start_time, elapsed_time, lap_times):
+        """
+        Загружает состояние секундомера целиком (восстановление гонки по логу)
+        
+        Args:
+            running: Идет ли сейчас время
+            start_time: Момент последнего старта (datetime) или None
+            elapsed_time: Время до последнего старта в секундах
+            lap_times: Времена кругов в секундах от старта
+        """
+        was_running = self.running
+        self.running = running
+        self.start_time = start_time
+        self.elapsed_time = elapsed_time
+        self.lap_times = list(lap_times)
+        self.last_lap_time = self.lap_times[-1] if self.lap_times else 0
+        self.just_completed_lap = False
+        self.lap_indicator.config(text=f"Круги: {len(self.lap_times)}")
+        
+        if running:
+            self.start_btn.config(state="disabled", bg="#81C784")
+            self.stop_btn.config(state="normal", bg="#f44336")
+            self.lap_btn.config(state="normal", bg="#FF9800")
+            if not was_running:
+                self.update_time()  # Запущенный секундомер уже обновляется сам
+        else:
+            self.start_btn.config(state="normal", bg="#4CAF50")
+            self.stop_btn.config(state="disabled", bg="#E57373")
+            self.lap_btn.config(state="disabled", bg="#FFB74D")
+            self.display_time(elapsed_time)
+    
     def format_time(self, seconds):
         """Форматирование времени для вывода"""
         hours = int(seconds // 3600)
@@ -0,0 +1,94 @@
+"""
+Контрольная точка чтения (IngestionCheckpoint)
+
+В режиме hold (чтение в дочернем процессе) точка продвигается только
+после того, как родитель подтвердил доставку всех сообщений чтения и
+всех чтений до него: после сбоя процесса чтение не пропустит строки,
+которые родитель так и не получил.
+"""
+
+import pytest
+
+from parsing import IngestionCheckpoint
+
+
+def state(offset):
+    """Состояние чтения, как его отдает LogSource.checkpoint_state()"""
+    return {'path': '/srv/logs/latest.log', 'head_size': 64, 'head_sha1': 'ab' * 20, 'offset': offset}
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    point = IngestionCheckpoint('server:/srv/logs/latest.log', directory=str(tmp_path), min_interval=0)
+    point.hold = True
+    yield point
+    point.close()
+
+
+def test_hold_advances_only_after_delivery(checkpoint):
+    checkpoint.save(state(100), 'aa')
+    assert checkpoint.state is None  # Только запомнено, в очередь еще не поставлено
+    
+    sequence = checkpoint.track(2)
+    assert checkpoint.state is None
+    
+    checkpoint.delivered(sequence)
+    assert checkpoint.state is None  # Одно сообщение из двух еще в пути
+    
+    checkpoint.delivered(sequence)
+    assert checkpoint.state['offset'] == 100
+    assert checkpoint.state['last_line_hash'] == 'aa'
+
+
+def test_hold_waits_for_earlier_reads(checkpoint):
+    checkpoint.save(state(100))
+    first = checkpoint.track(1)
+    checkpoint.save(state(200))
+    second = checkpoint.track(1)
+    
+    checkpoint.delivered(second)
+    assert checkpoint.state is None  # Сообщение первого чтения еще не доставлено
+    
+    checkpoint.delivered(first)
+    assert checkpoint.state['offset'] == 200
+
+
+def test_read_without_messages_follows_delivered_reads(checkpoint):
+    checkpoint.save(state(100))
+    first = checkpoint.track(1)
+    checkpoint.save(state(150))
+    checkpoint.track(0)  # Чтение без сообщений командных блоков
+    assert checkpoint.state is None
+    
+    checkpoint.delivered(first)
+    assert checkpoint.state['offset'] == 150
+
+
+def test_unchanged_state_is_not_tracked(checkpoint):
+    checkpoint.save(state(100))
+    checkpoint.delivered(checkpoint.track(1))
+    checkpoint.save(state(100))
+    
+    assert checkpoint.track(1) is None
+
+
+def test_delivered_state_is_written_on_close(checkpoint):
+    checkpoint.save(state(100), 'aa')
+    sequence = checkpoint.track(1)
+    checkpoint.save(state(200), 'bb')
+    checkpoint.track(1)
+    checkpoint.delivered(sequence)
+    checkpoint.close()
+    
+    saved = checkpoint.load()
+    assert saved['offset'] == 100  # Второе чтение так и не подтверждено
+    assert saved['last_line_hash'] == 'aa'
+
+
+def test_without_hold_state_is_committed_at_once(tmp_path):
+    checkpoint = IngestionCheckpoint('server:/srv/logs/latest.log', directory=str(tmp_path), min_interval=0)
+    checkpoint.save(state(100))
+    assert checkpoint.state['offset'] == 100
+    
+    checkpoint.close()
+    assert checkpoint.load()['offset'] == 100
@@ -0,0 +1,90 @@
+"""
+Нарезка потока байтов лога на полные строки (LineFramer)
+
+Строка, разрезанная границей чтения, должна прийти один раз и целиком,
+а хвост без перевода строки - ждать следующего чтения.
+"""
+
+import random
+
+from parsing import LineFramer
+
+
+LOG = (
+    '[03:18:20] [Server thread/INFO]: [@] Slend37 стартовал\n'
+    '[03:18:21] [Server thread/INFO]: <Steve> привет\n'
+    '[03:18:22] [Server thread/INFO]: [@ 10 64 -20] Slend37 прошел 1\n'
+    '[03:18:23] [Server thread/INFO]: [@] Slend37 финишировал\n'
+).encode('utf-8')
+
+
+def joined(spans):
+    """Байты всех диапазонов подряд"""
+    return b''.join(bytes(buf[start:end]) for buf, start, end in spans)
+
+
+def test_line_split_across_chunks():
+    framer = LineFramer()
+    cut = LOG.index(b'\n') + 10
+    
+    assert joined(framer.feed(LOG[:cut])) == LOG[:LOG.index(b'\n') + 1]
+    assert framer.pending == 9
+    assert joined(framer.feed(LOG[cut:])) == LOG[LOG.index(b'\n') + 1:]
+    assert framer.pending == 0
+
+
+def test_trailing_partial_line_waits_for_newline():
+    framer = LineFramer()
+    line = '[03:18:20] [Server thread/INFO]: [@] Slend37 стартовал\n'.encode('utf-8')
+    
+    assert framer.feed(line[:10]) == []
+    assert framer.feed(line[10:20]) == []
+    assert framer.pending == 20
+    assert joined(framer.feed(line[20:])) == line
+    assert framer.pending == 0
+
+
+def test_completed_line_is_a_single_span():
+    """Достроенная строка отдается одним диапазоном, а не двумя половинками"""
+    framer = LineFramer()
+    framer.feed(LOG[:15])
+    spans = framer.feed(LOG[15:])
+    
+    first_buf, first_start, first_end = spans[0]
+    assert bytes(first_buf[first_start:first_end]) == LOG[:LOG.index(b'\n') + 1]
+
+
+def test_random_chunking_matches_whole_lines():
+    rng = random.Random(0)
+    data = LOG * 50
+    for _ in range(200):
+        framer = LineFramer()
+        out = []
+        pos = 0
+        while pos < len(data):
+            size = rng.randint(1, 200)
+            out.append(joined(framer.feed(data[pos:pos + size])))
+            pos += size
+        assert b''.join(out) == data
+        assert framer.pending == 0
+
+
+def test_skip_partial_drops_cut_first_line():
+    """Чтение с середины файла: остаток первой строки не разбирается"""
+    framer = LineFramer()
+    framer.skip_partial = True
+    start = LOG.index(b'\n') - 5
+    
+    assert framer.feed(LOG[start:start + 3]) == []
+    assert framer.discarded == 3
+    assert joined(framer.feed(LOG[start + 3:])) == LOG[LOG.index(b'\n') + 1:]
+    assert framer.discarded == 3  # Оставшиеся байты обрезанной строки и перевод строки
+
+
+def test_reset_drops_pending_line():
+    framer = LineFramer()
+    framer.feed(b'[03:18:20] [Server thr')
+    framer.reset()
+    
+    assert framer.pending == 0
+    assert joined(framer.feed(b'new line\n')) == b'new line\n'
@@ -0,0 +1,231 @@
+"""
+Ротация latest.log
+
+Строки, дописанные в старый файл между fstat открытого дескриптора и
+проверкой пути, должны быть прочитаны из старого файла до перехода на
+новый (иначе при смене дня теряется круг). Хвост, не прочитанный до
+ротации, достается из архива, в том числе еще не сжатого. Лог целиком
+(восстановление гонки) читается по отдельному SFTP каналу.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+import parsing
+from parsing import SFTPChatMonitor, LocalFileLogSource, SFTPLogSource
+
+
+# Начало старого файла длиннее нового: размер по пути меньше дескриптора
+FILLER = b'[03:18:00] [Server thread/INFO]: Preparing spawn area: 100%' + b' ' * 60 + b'\n'
+
+
+def line(number):
+    """Строка командного блока с номером круга"""
+    return f'[03:18:2{number}] [Server thread/INFO]: [@] Slend37 прошел {number}\n'.encode()
+
+
+def rotate_with_append(path):
+    """Дописывает строку в старый файл, переименовывает его и создает новый latest.log"""
+    with open(path, 'ab') as f:
+        f.write(line(1))
+    os.rename(path, os.path.join(os.path.dirname(path), '2026-10-18-1.log'))
+    with open(path, 'wb') as f:
+        f.write(line(2))
+
+
+def race_rotation(monkeypatch, source, path):
+    """Ротация происходит сразу после fstat, перед первой проверкой пути"""
+    original = source.check_rotation
+    rotated = []
+    
+    def check_rotation(*args):
+        if not rotated:
+            rotate_with_append(path)
+            rotated.append(True)
+        return original(*args)
+    
+    monkeypatch.setattr(source, 'check_rotation', check_rotation)
+
+
+def read_messages(monitor, polls=6):
+    """Тексты сообщений за несколько опросов"""
+    messages = []
+    for _ in range(polls):
+        data = monitor.read_new_data()
+        if data:
+            messages += [monitor.parse_command_block_message(text).message for text in data.split('\n')]
+    return messages
+
+
+class FakeRemoteFile:
+    """Дескриптор SFTP поверх локального файла: fstat видит тот же inode"""
+    
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+    
+    def stat(self):
+        return os.fstat(self.file.fileno())
+    
+    def seek(self, position):
+        self.file.seek(position)
+    
+    def read(self, size=-1):
+        return self.file.read(size)
+    
+    def prefetch(self, *args):
+        pass
+    
+    def close(self):
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
+class FakeSFTPClient:
+    """SFTP клиент поверх локальной файловой системы"""
+    
+    def __init__(self):
+        self.closed = False
+    
+    def stat(self, path):
+        return os.stat(path)
+    
+    def open(self, path, mode):
+        return FakeRemoteFile(path)
+    
+    def close(self):
+        self.closed = True
+
+
+class BusySFTPClient:
+    """SFTP клиент, занятый потоком чтения: из другого потока его трогать нельзя"""
+    
+    def __getattr__(self, name):
+        raise AssertionError(f"SFTP клиент потока чтения использован из другого потока: {name}")
+
+
+class FakeTransport:
+    """SSH транспорт: живой или оборванный"""
+    
+    def __init__(self, active=True):
+        self.active = active
+    
+    def is_active(self):
+        return self.active
+
+
+class FakeSSHClient:
+    """SSH клиент, открывающий отдельные SFTP каналы"""
+    
+    def __init__(self, active=True):
+        self.transport = FakeTransport(active)
+        self.channels = []
+        self.closed = False
+    
+    def get_transport(self):
+        return self.transport
+    
+    def open_sftp(self):
+        self.channels.append(FakeSFTPClient())
+        return self.channels[-1]
+    
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / 'latest.log'
+    path.write_bytes(FILLER + line(0))
+    return str(path)
+
+
+def test_local_append_then_rename(monkeypatch, log_path):
+    monitor = SFTPChatMonitor(source=LocalFileLogSource(log_path), use_checkpoint=False)
+    assert monitor.connect()
+    assert read_messages(monitor, polls=1) == ['Slend37 прошел 0']
+    
+    race_rotation(monkeypatch, monitor.source, log_path)
+    assert read_messages(monitor) == ['Slend37 прошел 1', 'Slend37 прошел 2']
+    monitor.source.disconnect()
+
+
+def test_sftp_append_then_rename(monkeypatch, log_path):
+    source = SFTPLogSource('localhost', 'user', 'password', log_path)
+    source.sftp_client = FakeSFTPClient()
+    source.connected = True
+    source.seek(0)
+    source.rotation_check_interval = 0
+    monitor = SFTPChatMonitor(source=source, use_checkpoint=False)
+    assert read_messages(monitor, polls=1) == ['Slend37 прошел 0']
+    
+    race_rotation(monkeypatch, source, log_path)
+    assert read_messages(monitor) == ['Slend37 прошел 1', 'Slend37 прошел 2']
+    source.close_remote_file()
+
+
+def test_whole_log_is_read_over_separate_channel(log_path):
+    """Восстановление гонки читает лог, пока поток чтения опрашивает свой SFTP клиент"""
+    source = SFTPLogSource('localhost', 'user', 'password', log_path)
+    source.ssh_client = FakeSSHClient()
+    source.sftp_client = BusySFTPClient()
+    
+    assert source.read_whole_log() == FILLER + line(0)
+    assert len(source.ssh_client.channels) == 1
+    assert source.ssh_client.channels[0].closed
+
+
+def test_whole_log_without_transport_uses_own_connection(monkeypatch, log_path):
+    own = FakeSSHClient(), FakeSFTPClient()
+    monkeypatch.setattr(parsing.SSH_SESSIONS, 'open_session', lambda *args: own)
+    source = SFTPLogSource('localhost', 'user', 'password', log_path)
+    source.ssh_client = FakeSSHClient(active=False)
+    
+    assert source.read_whole_log() == FILLER + line(0)
+    assert own[0].closed and own[1].closed
+
+
+def fingerprint(data):
+    """Отпечаток начала файла в формате expected_head"""
+    return (len(data[:64]), hashlib.sha1(data[:64]).hexdigest())
+
+
+def test_recover_tail_from_uncompressed_archive(tmp_path):
+    """До сжатия архив - это переименованный YYYY-MM-DD-N.log"""
+    data = FILLER + line(0) + line(1)
+    (tmp_path / '2026-10-18-1.log').write_bytes(data)
+    (tmp_path / '2026-10-18-1.log.gz').write_bytes(gzip.compress(data)[:20])  # Сжатие только началось
+    source = LocalFileLogSource(str(tmp_path / 'latest.log'))
+    assert source.recover_rotated_tail(len(FILLER), fingerprint(data)) == line(0) + line(1)
+
+
+def test_recover_tail_waits_for_truncated_gzip(tmp_path):
+    data = FILLER + line(0) + line(1)
+    archive = tmp_path / '2026-10-18-1.log.gz'
+    compressed = gzip.compress(data)
+    archive.write_bytes(compressed[:len(compressed) // 2])
+    source = LocalFileLogSource(str(tmp_path / 'latest.log'))
+    source.rotated_retry_delay = 0.2
+    
+    def finish():
+        time.sleep(0.1)
+        archive.write_bytes(compressed)
+    
+    writer = threading.Thread(target=finish)
+    writer.start()
+    assert source.recover_rotated_tail(len(FILLER), fingerprint(data)) == line(0) + line(1)
+    writer.join()
+
+
+def test_recover_tail_without_log_directory(tmp_path):
+    source = LocalFileLogSource(str(tmp_path / 'missing' / 'latest.log'))
+    assert source.recover_rotated_tail(100) is None
@@ -0,0 +1,200 @@
+"""
+Золотой корпус разбора строк командных блоков
+
+Однопроходный COMMAND_BLOCK_RE (с запасным разбором нестандартных строк)
+должен давать ровно то же, что исходный разбор цепочкой паттернов до его
+появления: время, местоположение, текст сообщения и исходную строку.
+Эталонный разбор перенесен сюда без изменений.
+"""
+
+import random
+import re
+
+import pytest
+
+from parsing import SFTPChatMonitor, LocalFileLogSource
+
+
+# Паттерны исходного SFTPChatMonitor.patterns
+BASELINE_PATTERNS = [
+    # Формат: [HH:MM:SS] [Server thread/INFO]: [@] сообщение
+    r'\[(\d{2}:\d{2}:\d{2})\]\s+\[[^\]]+\]:\s*\[\s*@\s*\]\s*(.+)',
+    
+    # Формат с координатами: [HH:MM:SS] [Server thread/INFO]: [@ X Y Z] сообщение
+    r'\[(\d{2}:\d{2}:\d{2})\]\s+\[[^\]]+\]:\s*\[\s*@\s+[^\]]+\]\s*(.+)',
+    
+    # Альтернативный формат: [HH:MM:SS INFO]: [@] сообщение
+    r'\[(\d{2}:\d{2}:\d{2})\][^\]]*INFO[^\]]*]:\s*\[\s*@\s*\]\s*(.+)',
+    
+    # Формат Paper: [HH:MM:SS INFO]: [@] сообщение
+    r'\[(\d{2}:\d{2}:\d{2})\s+INFO\]:\s*\[\s*@\s*\]\s*(.+)',
+]
+
+
+def baseline_parse(line):
+    """Исходный SFTPChatMonitor.parse_command_block_message (эталон)"""
+    line = line.strip()
+    if not line:
+        return None
+    
+    if not ('[@' in line or '[ @' in line):
+        return None
+    
+    for pattern in BASELINE_PATTERNS:
+        match = re.match(pattern, line)
+        if match:
+            groups = match.groups()
+            
+            if len(groups) >= 2:
+                timestamp = groups[0]
+                message = groups[1].strip()
+                
+                coord_match = re.search(r'\[\s*@\s+([-\d]+)\s+([-\d]+)\s+([-\d]+)\s*\]', line)
+                if coord_match:
+                    x, y, z = coord_match.groups()
+                    location = f"X{x}Y{y}Z{z}"
+                else:
+                    location = "global"
+                
+                return {
+                    'type': 'command_block',
+                    'timestamp': timestamp,
+                    'location': location,
+                    'message': message,
+                    'raw': line
+                }
+    
+    time_match = re.search(r'\[(\d{2}:\d{2}:\d{2})\]', line)
+    if not time_match:
+        return None
+    
+    timestamp = time_match.group(1)
+    
+    at_pos = line.find('[@')
+    if at_pos == -1:
+        at_pos = line.find('[ @')
+    
+    if at_pos == -1:
+        return None
+    
+    end_pos = line.find(']', at_pos)
+    if end_pos == -1:
+        return None
+    
+    message = line[end_pos + 1:].strip()
+    if not message:
+        return None
+    
+    location = "unknown"
+    if line[at_pos:end_pos + 1].strip() == '[@]':
+        location = "global"
+    else:
+        coord_match = re.search(r'([-\d]+)\s+([-\d]+)\s+([-\d]+)', line[at_pos:end_pos + 1])
+        if coord_match:
+            x, y, z = coord_match.groups()
+            location = f"X{x}Y{y}Z{z}"
+    
+    return {
+        'type': 'command_block',
+        'timestamp': timestamp,
+        'location': location,
+        'message': message,
+        'raw': line
+    }
+
+
+# Строки из логов серверов (ванильный формат, координаты, Paper)
+REAL_LINES = [
+    '[03:18:20] [Server thread/INFO]: [@] Прошел кт',
+    '[03:18:20] [Server thread/INFO]: [@] Slend37 стартовал',
+    '[03:18:21] [Server thread/INFO]: [@] Slend37 прошел 1',
+    '[03:18:22] [Server thread/INFO]: [@] Slend37 финишировал',
+    '[03:18:23] [Server thread/INFO]: [@] старт всех',
+    '[03:18:24] [Server thread/INFO]: [@ 10 64 -20] Slend37 прошел 1',
+    '[03:18:25] [Server thread/INFO]: [@ -1204 70 388] Slend37 подошел',
+    '[03:18:26] [Server thread/INFO]: [ @ 10 64 -20 ]   Slend37 финишировал  ',
+    '[03:18:27] [Server thread/INFO]: [@] старт Slend37',
+    '[03:18:28 INFO]: [@] Slend37 стартовал',
+    '[03:18:29 INFO]: [@] финиш Slend37',
+    '[23:59:59] [Server thread/INFO]: [@] Slend37 прошел 12',
+    '[00:00:00] [Server thread/INFO]: [@] все старт',
+    '  [03:18:20] [Server thread/INFO]: [@] Slend37 вышел  \r',
+]
+
+# Строки, на которых однопроходному разбору легко разойтись с исходным
+ADVERSARIAL_LINES = [
+    '[03:18:20 INFO]: [@ 1 2 3] Slend37 стартовал',
+    '[03:18:20] [Server thread/INFO]: [@ Steve] hi',
+    '[03:18:20] [Server thread/INFO]: [@] msg [@ 1 2 3] x',
+    '[03:18:20] [Server thread/INFO]: [@] почта user@example.com',
+    '[03:18:20] [Server thread/INFO]: [@ 1 2 3] ответ @Steve',
+    '[03:18:20] [Server thread/INFO]: [@]',
+    '[03:18:20] [Server thread/INFO]: [@]    ',
+    '[03:18:20] [Server thread/INFO]: [@ 1-2 3 4] x',
+    '[03:18:20] [Server thread/INFO]: [@ 1 2] x',
+    '[03:18:20] [Server thread/INFO]: [@ 1 2 3 4] x',
+    '[03:18:20] INFO]: [@] weird',
+    '[03:18:20] [Server thread/WARN]: [@] предупреждение',
+    '[03:18:20] [Server thread/INFO]: <Steve> [@] fake',
+    '[03:18:20] [Server thread/INFO]: <Steve> [@ 5 6 7] fake',
+    '[03:18:20] [[@ 1 2 3]: [@] odd',
+    '[3:18:20] [Server thread/INFO]: [@] короткое время',
+    '[03:18:20] [Server thread/INFO]: [@ ] пустой маркер',
+    '[03:18:20] [Server thread/INFO]: [@',
+    'garbage [@] text',
+    '[@] без времени',
+    '[03:18:20] [Server thread/INFO]: обычный чат',
+    '',
+    '   ',
+]
+
+RANDOM_TOKENS = [
+    '[03:18:20]', ' ', '[Server thread/INFO]:', '[@]', '[ @', ' 1 2 3]', '[@', '@', ']',
+    'INFO]', '[03:18:20 INFO]:', 'msg', 'Slend37 прошел', '  ', '[', '-5', '[@ 1 2 3]'
+]
+
+
+def random_lines(count, seed=0):
+    """Случайные строки из фрагментов реальных форматов (воспроизводимо)"""
+    rng = random.Random(seed)
+    return [''.join(rng.choice(RANDOM_TOKENS) for _ in range(rng.randint(2, 8)))
+            for _ in range(count)]
+
+
+@pytest.fixture(scope='module')
+def monitor():
+    """Монитор без подключения: нужен только разбор строк"""
+    parser = SFTPChatMonitor(source=LocalFileLogSource('latest.log'), use_checkpoint=False)
+    parser.keep_raw_lines = True  # Исходная строка тоже входит в сравнение
+    return parser
+
+
+def parse(monitor, line):
+    """Разбор текущим парсером в формате исходного словаря"""
+    message = monitor.parse_command_block_message(line)
+    if message is None:
+        return None
+    return {
+        'type': message.type,
+        'timestamp': message.timestamp,
+        'location': message.location,
+        'message': message.message,
+        'raw': message.raw
+    }
+
+
+@pytest.mark.parametrize('line', REAL_LINES + ADVERSARIAL_LINES)
+def test_corpus_matches_baseline(monitor, line):
+    assert parse(monitor, line) == baseline_parse(line)
+
+
+def test_random_lines_match_baseline(monitor):
+    mismatches = [line for line in random_lines(50000) if parse(monitor, line) != baseline_parse(line)]
+    assert mismatches == []
+
+
+def test_real_lines_are_parsed(monitor):
+    """Корпус не должен сводиться к сравнению None с None"""
+    assert all(parse(monitor, line) is not None for line in REAL_LINES)
+    assert parse(monitor, REAL_LINES[5])['location'] == 'X10Y64Z-20'
+    assert parse(monitor, REAL_LINES[9])['message'] == 'Slend37 стартовал'
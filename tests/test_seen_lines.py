@@ -0,0 +1,75 @@
+"""
+Отсев уже обработанных строк командных блоков (SeenLineIndex)
+
+Если после переподключения чтение продолжается с более ранней позиции
+того же файла, уже обработанные строки не должны прийти второй раз.
+Одинаковые по тексту строки в разных местах файла - разные события.
+"""
+
+from parsing import SFTPChatMonitor, LocalFileLogSource, SeenLineIndex
+
+
+def line(number, text='прошел 1'):
+    """Строка командного блока"""
+    return f'[03:18:2{number}] [Server thread/INFO]: [@] Slend37 {text}\n'.encode()
+
+
+def read_messages(monitor, polls=3):
+    """Тексты сообщений за несколько опросов"""
+    messages = []
+    for _ in range(polls):
+        data = monitor.read_new_data()
+        if data:
+            messages += [monitor.parse_command_block_message(text).message for text in data.split('\n')]
+    return messages
+
+
+def test_seen_remembers_keys():
+    index = SeenLineIndex()
+    key = ('identity', 120, SeenLineIndex.line_hash(line(0)))
+    
+    assert not index.seen(key)
+    assert index.seen(key)
+    assert not index.seen(('identity', 180, key[2]))  # Та же строка в другом месте файла
+    assert index.duplicates == 1
+
+
+def test_capacity_forgets_oldest_keys():
+    index = SeenLineIndex(capacity=3)
+    for offset in range(5):
+        index.seen(('identity', offset, b''))
+    
+    assert len(index) == 3
+    assert not index.seen(('identity', 0, b''))  # Уже забыт
+    assert index.seen(('identity', 4, b''))
+
+
+def test_duplicates_suppressed_across_reconnect(tmp_path):
+    path = tmp_path / 'latest.log'
+    path.write_bytes(line(0, 'стартовал') + line(1) + line(2, 'прошел 2'))
+    monitor = SFTPChatMonitor(source=LocalFileLogSource(str(path)), use_checkpoint=False)
+    assert monitor.connect()
+    assert read_messages(monitor) == ['Slend37 стартовал', 'Slend37 прошел 1', 'Slend37 прошел 2']
+    
+    # Обрыв: за это время в лог дописана строка, а чтение продолжится с более ранней позиции
+    monitor.source.disconnect()
+    with open(path, 'ab') as f:
+        f.write(line(3, 'финишировал'))
+    monitor.source.position = len(line(0, 'стартовал'))
+    monitor.source.framer.reset()
+    assert monitor.connect()
+    
+    assert read_messages(monitor) == ['Slend37 финишировал']
+    assert monitor.seen_lines.duplicates == 2
+    monitor.source.disconnect()
+
+
+def test_identical_lines_at_different_offsets_are_kept(tmp_path):
+    path = tmp_path / 'latest.log'
+    path.write_bytes(line(0) + line(0))  # Два прохождения в одну секунду
+    monitor = SFTPChatMonitor(source=LocalFileLogSource(str(path)), use_checkpoint=False)
+    assert monitor.connect()
+    
+    assert read_messages(monitor) == ['Slend37 прошел 1', 'Slend37 прошел 1']
+    assert monitor.seen_lines.duplicates == 0
+    monitor.source.disconnect()
@@ -0,0 +1,92 @@
+"""
+Декодирование байтов лога (StreamDecoder)
+
+UTF-8 символ, разрезанный границей порции, не портится; лог в cp1251
+распознается по строкам; недекодируемые байты заменяются на U+FFFD и
+подсчитываются, не задевая соседние символы.
+"""
+
+import pytest
+
+from parsing import LineFramer, StreamDecoder
+
+
+TEXT = '[03:18:20] [Server thread/INFO]: [@] Slend37 прошел 1 — ёлка\n'
+
+
+def decode_lines(decoder, data):
+    """Декодирует полные строки так же, как read_new_data"""
+    spans = LineFramer().feed(data)
+    for buf, start, end in spans:
+        decoder.sample(buf, start, end)
+    return ''.join(decoder.decode(memoryview(buf)[start:end], final=True) for buf, start, end in spans)
+
+
+@pytest.mark.parametrize('cut', range(1, len(TEXT.encode('utf-8'))))
+def test_utf8_character_split_across_chunks(cut):
+    """Поток stderr: порции могут обрываться посреди символа"""
+    data = TEXT.encode('utf-8')
+    decoder = StreamDecoder('utf-8')
+    
+    assert decoder.decode(data[:cut]) + decoder.decode(data[cut:]) == TEXT
+    assert decoder.replaced_bytes == 0
+
+
+def test_utf8_line_split_by_framer():
+    data = (TEXT * 3).encode('utf-8')
+    cut = data.index('прошел'.encode('utf-8')) + 1  # Посреди двухбайтовой буквы
+    decoder = StreamDecoder()
+    framer = LineFramer()
+    
+    text = ''
+    for chunk in (data[:cut], data[cut:]):
+        text += ''.join(decoder.decode(memoryview(buf)[start:end], final=True)
+                        for buf, start, end in framer.feed(chunk))
+    assert text == TEXT * 3
+    assert decoder.encoding == 'utf-8'
+    assert decoder.replaced_bytes == 0
+
+
+def test_cp1251_log_is_detected():
+    lines = [f'[03:18:2{n}] [Server thread/INFO]: [@] Игрок прошел {n}\n' for n in range(5)]
+    decoder = StreamDecoder()
+    
+    assert decode_lines(decoder, ''.join(lines).encode('cp1251')) == ''.join(lines)
+    assert decoder.encoding == 'cp1251'
+    assert decoder.replaced_bytes == 0
+
+
+def test_single_invalid_line_keeps_utf8():
+    """Одиночный мусорный байт не переключает кодировку"""
+    data = (TEXT * 5).encode('utf-8') + b'[03:18:30] \xff\n' + (TEXT * 5).encode('utf-8')
+    decoder = StreamDecoder()
+    
+    assert decode_lines(decoder, data) == TEXT * 5 + '[03:18:30] \ufffd\n' + TEXT * 5
+    assert decoder.encoding == 'utf-8'
+    assert decoder.replaced_bytes == 1
+
+
+def test_invalid_bytes_become_replacement_characters():
+    """Недекодируемые байты (surrogateescape) заменяются по одному и считаются"""
+    decoder = StreamDecoder('utf-8')
+    
+    assert decoder.decode(b'ab\xff\xfe', final=True) == 'ab\ufffd\ufffd'
+    assert decoder.replaced_bytes == 2
+
+
+def test_invalid_byte_at_chunk_boundary_keeps_next_character():
+    data = b'ab\xff' + 'пр'.encode('utf-8')
+    for cut in range(1, len(data)):
+        decoder = StreamDecoder('utf-8')
+        text = decoder.decode(data[:cut]) + decoder.decode(data[cut:], final=True)
+        assert text == 'ab\ufffdпр'
+        assert decoder.replaced_bytes == 1
+
+
+def test_escaped_bytes_do_not_leak_surrogates():
+    """В тексте не остается суррогатов: его можно закодировать обратно в UTF-8"""
+    decoder = StreamDecoder()
+    text = decoder.decode(b'[03:18:20] \xc3\x28 \x80\n', final=True)
+    
+    assert text.encode('utf-8').decode('utf-8') == text
+    assert '\ufffd' in text
@@ -0,0 +1,203 @@
+"""
+Потоковое чтение лога через `tail -F` в exec-канале SSH
+
+Канал и SFTP клиент заменены подделками с заранее заданными ответами:
+проверяется переход на опрос через SFTP, когда exec запрещен или tail
+завершился, сборка строк из порций потока и реакция на сообщения tail
+в stderr.
+"""
+
+import io
+import os
+from collections import deque
+
+import pytest
+
+from parsing import SFTPChatMonitor, SFTPLogSource
+
+
+def line(number):
+    """Строка командного блока с номером круга"""
+    return f'[03:18:2{number}] [Server thread/INFO]: [@] Slend37 прошел {number}\n'.encode()
+
+
+class FakeChannel:
+    """exec-канал paramiko: stdout и stderr отдаются заранее заданными порциями"""
+    
+    def __init__(self, stdout=(), stderr=(), exit_status=None):
+        self.stdout = deque(stdout)
+        self.stderr = deque(stderr)
+        self.exit_status = exit_status  # None - tail еще работает
+        self.command = None
+        self.closed = False
+    
+    def exec_command(self, command):
+        self.command = command
+    
+    def recv_ready(self):
+        return bool(self.stdout)
+    
+    def recv(self, size):
+        return self.stdout.popleft() if self.stdout else b''
+    
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+    
+    def recv_stderr(self, size):
+        return self.stderr.popleft() if self.stderr else b''
+    
+    def exit_status_ready(self):
+        return self.exit_status is not None and not self.stdout
+    
+    def recv_exit_status(self):
+        return self.exit_status
+    
+    def close(self):
+        self.closed = True
+
+
+class FakeTransport:
+    """Транспорт SSH: отдает канал или отказывает в exec"""
+    
+    def __init__(self, channel=None, error=None):
+        self.channel = channel
+        self.error = error
+    
+    def open_session(self):
+        if self.error:
+            raise self.error
+        return self.channel
+
+
+class FakeSSHClient:
+    """SSH клиент с одним транспортом"""
+    
+    def __init__(self, transport):
+        self.transport = transport
+    
+    def get_transport(self):
+        return self.transport
+
+
+class FakeRemoteFile(io.BytesIO):
+    """Дескриптор SFTP над содержимым файла в памяти"""
+    
+    def stat(self):
+        return os.stat_result((0,) * 6 + (len(self.getvalue()),) + (0,) * 3)
+    
+    def prefetch(self, *args):
+        pass
+
+
+class FakeSFTPClient:
+    """SFTP клиент с одним файлом в памяти"""
+    
+    def __init__(self, content=b''):
+        self.content = content
+    
+    def stat(self, path):
+        return FakeRemoteFile(self.content).stat()
+    
+    def open(self, path, mode):
+        return FakeRemoteFile(self.content)
+
+
+def make_source(transport, content=b''):
+    """Подключенный источник в режиме tail с подделанными SSH и SFTP"""
+    source = SFTPLogSource('localhost', 'user', 'password', '/srv/logs/latest.log', source_mode='tail')
+    source.ssh_client = FakeSSHClient(transport)
+    source.sftp_client = FakeSFTPClient(content)
+    source.connected = True
+    source.stream_start_timeout = 0.1
+    source.seek(0)
+    return source
+
+
+def read_messages(monitor):
+    """Тексты сообщений одного опроса"""
+    data = monitor.read_new_data()
+    if not data:
+        return []
+    return [monitor.parse_command_block_message(text).message for text in data.split('\n')]
+
+
+def test_exec_refused_falls_back_to_sftp():
+    source = make_source(FakeTransport(error=Exception("Administratively prohibited")), line(1))
+    
+    assert not source.start_tail_stream()
+    assert source.source_mode == 'sftp'
+    assert source.stream_channel is None
+    assert source.read_chunk() == line(1)  # Дальше - опрос через SFTP
+
+
+def test_tail_exiting_at_start_falls_back_to_sftp():
+    channel = FakeChannel(stderr=[b"tail: cannot open '/srv/logs/latest.log': Permission denied\n"], exit_status=1)
+    source = make_source(FakeTransport(channel), line(1))
+    
+    assert not source.start_tail_stream()
+    assert source.source_mode == 'sftp'
+    assert source.read_chunk() == line(1)
+
+
+def test_closed_stream_continues_with_sftp_from_same_position():
+    channel = FakeChannel(stdout=[line(1)])
+    source = make_source(FakeTransport(channel), line(1) + line(2))
+    
+    assert source.start_tail_stream()
+    assert channel.command == "tail -c +1 -F /srv/logs/latest.log"
+    assert source.read_chunk() == line(1)
+    
+    channel.exit_status = 0  # tail завершился, SSH жив
+    assert source.read_chunk() is None
+    assert channel.closed
+    assert source.source_mode == 'sftp'
+    assert source.read_chunk() == line(2)
+
+
+def test_partial_chunks_are_reassembled():
+    data = line(1) + line(2)
+    split_inside_letter = data.index('прошел'.encode()) + 1  # Посреди двухбайтовой буквы
+    channel = FakeChannel(stdout=[line(0)])
+    source = make_source(FakeTransport(channel))
+    monitor = SFTPChatMonitor(source=source, use_checkpoint=False)
+    assert source.start_tail_stream()
+    assert read_messages(monitor) == ['Slend37 прошел 0']
+    
+    channel.stdout.append(data[:split_inside_letter])
+    assert read_messages(monitor) == []  # Строка еще не закончилась
+    channel.stdout.extend([data[split_inside_letter:len(line(1)) + 5], data[len(line(1)) + 5:]])
+    assert read_messages(monitor) == ['Slend37 прошел 1', 'Slend37 прошел 2']
+    assert source.position == len(line(0) + data)
+
+
+@pytest.mark.parametrize('notice', [
+    b"tail: /srv/logs/latest.log: file truncated\n",
+    b"tail: '/srv/logs/latest.log' has been replaced;  following new file\n",
+    b"tail: '/srv/logs/latest.log' has appeared;  following new file\n",
+])
+def test_truncation_notice_restarts_from_beginning(notice):
+    channel = FakeChannel(stdout=[line(0) + line(1)[:10]])
+    source = make_source(FakeTransport(channel))
+    monitor = SFTPChatMonitor(source=source, use_checkpoint=False)
+    assert source.start_tail_stream()
+    assert read_messages(monitor) == ['Slend37 прошел 0']
+    assert source.framer.pending == 10
+    
+    # Новый файл tail отдает с начала: позиция и незавершенная строка сбрасываются
+    channel.stderr.append(notice)
+    channel.stdout.append(line(2))
+    assert read_messages(monitor) == ['Slend37 прошел 2']
+    assert source.position == len(line(2))
+    assert source.framer.pending == 0
+
+
+def test_other_stderr_notice_keeps_position():
+    channel = FakeChannel(stdout=[line(0)])
+    source = make_source(FakeTransport(channel))
+    assert source.start_tail_stream()
+    source.read_chunk()
+    
+    channel.stderr.append(b"tail: inotify cannot be used, reverting to polling\n")
+    channel.stdout.append(line(1))
+    assert source.read_chunk() == line(1)
+    assert source.position == len(line(0) + line(1))